@@ -3,22 +3,22 @@ import json
 import re
 import psycopg2
 import traceback
+import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from groq import Groq
 from pydantic import BaseModel, Field
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 from dotenv import load_dotenv
 from src.utils.redis_client import get_redis_client
+from src.model_registry import TEXT_MODEL
+from src.embedding_cache import cached_text_vector, cached_text_vectors
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 client = Groq(api_key=GROQ_API_KEY)
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-print("Loading Embedding Model...")
-embed_model = SentenceTransformer("distiluse-base-multilingual-cased-v1")
-
 try:
     r = get_redis_client()
     r.ping()
@@ -83,9 +83,9 @@ def retrieve_faq_context(user_text, top_k=2):
         top_faqs = [f for _, f in keyword_scores[:top_k]]
         return "\n\n".join([f"Q: {f['question']}\nA: {f['answer']}" for f in top_faqs])
     try:
-        user_vec = embed_model.encode(user_text)
+        user_vec = cached_text_vector(user_text, model_name=TEXT_MODEL)
         faq_texts = [f["question"] + " " + f["answer"] for f in faqs]
-        faq_vecs = embed_model.encode(faq_texts)
+        faq_vecs = np.stack(cached_text_vectors(faq_texts, model_name=TEXT_MODEL))
         cos_scores = util.cos_sim(user_vec, faq_vecs)[0]
         top_indices = cos_scores.argsort(descending=True)[:top_k]
         top_faqs = [faqs[i] for i in top_indices if cos_scores[i] > 0.2]
@@ -187,7 +187,7 @@ def search_hotels_rag(intent_obj):
             params.append(_to_vnd(intent_obj.price_max))
     if intent_obj.semantic_query and not intent_obj.target_hotel_name:
         try:
-            vector = embed_model.encode(intent_obj.semantic_query).tolist()
+            vector = cached_text_vector(intent_obj.semantic_query, model_name=TEXT_MODEL).tolist()
             query += ' ORDER BY "policiesVector" <=> %s::vector LIMIT 5'
             params.append(str(vector))
         except:
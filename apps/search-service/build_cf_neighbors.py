@@ -0,0 +1,23 @@
+# build_cf_neighbors.py
+# Build offline bảng láng giềng User-CF / Item-CF (top-K user / user, top-M hotel / hotel)
+# → jsons/cf_neighbors.npz. Serving (recommend.py) chỉ đọc file này, không bao giờ tự build;
+# retrain_worker.py build lại mỗi đêm. User / hotel mới sau lần build → láng giềng tính cục bộ.
+# Usage:
+#   uv run build_cf_neighbors.py
+#   USER_SIM_TOP_K=100 ITEM_SIM_TOP_K=200 uv run build_cf_neighbors.py
+
+import time
+from src import recommend
+
+
+def main():
+    start = time.perf_counter()
+    tables = recommend.build_neighbor_tables(save=True)
+    if tables is None:
+        print("❌ Không có interactions để build bảng láng giềng.")
+        return
+    print(f"✅ Xong trong {time.perf_counter() - start:.2f}s → {recommend.NEIGHBORS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
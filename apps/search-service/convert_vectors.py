@@ -0,0 +1,30 @@
+# convert_vectors.py
+# Chuyển jsons/__hotel_vectors.json (list dict float) sang binary vector store (.npy + manifest)
+# Usage:
+#   uv run convert_vectors.py
+#   uv run convert_vectors.py --dtype float16 --input jsons-fix/__hotel_vectors.json
+
+import os
+import argparse
+from src.vector_store import convert_json_to_store, LEGACY_JSON_FILE, STORE_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert __hotel_vectors.json to binary vector store")
+    parser.add_argument("--input", default=LEGACY_JSON_FILE, help="File JSON nguồn")
+    parser.add_argument("--output", default=STORE_DIR, help="Thư mục store đích")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Không tìm thấy file input: {args.input}")
+        return
+
+    manifest = convert_json_to_store(args.input, args.output, dtype=args.dtype)
+    for name, meta in manifest["fields"].items():
+        print(f"   ✅ {name}: {meta['count']} vectors x {meta['dim']} dims")
+    print(f"✅ Đã ghi vector store ({args.dtype}) vào: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,7 @@ from collections import defaultdict
 import numpy as np
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
+from src.data_loader import load_interactions, load_reviews
 
 # ---------------------------------------------------------
 # CONFIGURATION
@@ -51,6 +52,19 @@ def load_json(filepath):
     with open(filepath, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def rows_from_columns(data, value, keep=None):
+    """
+    Cột từ src.data_loader → list dict {userId, hotelId, value, timestamp} cho các bước đánh giá bên dưới.
+    value: mảng giá trị theo từng dòng; keep: mask dòng giữ lại.
+    """
+    keep = np.ones(len(data), dtype=bool) if keep is None else keep
+    timestamps = np.datetime_as_string(data['timestamp'][keep])
+    return [
+        {'userId': u, 'hotelId': h, 'value': v, 'timestamp': '' if ts == 'NaT' else ts}
+        for u, h, v, ts in zip(data.values('user')[keep].tolist(), data.values('hotel')[keep].tolist(),
+                               value[keep].tolist(), timestamps.tolist())
+    ]
+
 def save_report(report, filename):
     """Save evaluation report to JSON"""
     output_path = os.path.join(BASE_DIR, filename)
@@ -121,18 +135,18 @@ def evaluate_implicit():
     print("="*70)
     
     print("\n[1/7] Loading data...")
-    interactions_raw = load_json(INTERACTIONS_FILE)
+    interactions_data = load_interactions(INTERACTIONS_FILE)  # Cột typed, cache .npz theo hash file
     users_raw = load_json(USERS_FILE)
     hotels_raw = load_json(HOTELS_FILE)
     
-    if not all([interactions_raw, users_raw, hotels_raw]):
+    if interactions_data is None or not all([len(interactions_data), users_raw, hotels_raw]):
         print("❌ Missing data files")
         return None
     
     users = [u['id'] for u in users_raw]
     hotels = [h['id'] for h in hotels_raw]
     
-    print(f"   ✅ Loaded {len(interactions_raw)} interactions")
+    print(f"   ✅ Loaded {len(interactions_data)} interactions")
     print(f"   ✅ Loaded {len(users)} users, {len(hotels)} hotels")
     
     # ---------------------------------------------------------
@@ -149,20 +163,12 @@ def evaluate_implicit():
         "RATE_NEGATIVE": -3.0,
     }
     
-    interactions = []
-    for inter in interactions_raw:
-        signal_type = inter.get('type')
-        if signal_type not in signal_weights:
-            continue
-        
-        rating = signal_weights[signal_type]
-        interactions.append({
-            'userId': inter['userId'],
-            'hotelId': inter['hotelId'],
-            'value': rating,
-            'timestamp': inter.get('timestamp', ''),
-            'type': signal_type
-        })
+    types = interactions_data.values('type')
+    values = np.array([signal_weights.get(t, np.nan) for t in interactions_data.dictionaries['type']])[interactions_data['type']]
+    known = ~np.isnan(values)
+    interactions = rows_from_columns(interactions_data, values, known)
+    for inter, signal_type in zip(interactions, types[known].tolist()):
+        inter['type'] = signal_type
     
     print(f"   ✅ Converted {len(interactions)} interactions")
     
@@ -391,18 +397,18 @@ def evaluate_explicit():
     print("="*70)
     
     print("\n[1/6] Loading data...")
-    reviews_raw = load_json(REVIEWS_FILE)
+    reviews_data = load_reviews(REVIEWS_FILE)  # Cột typed, cache .npz theo hash file
     users_raw = load_json(USERS_FILE)
     hotels_raw = load_json(HOTELS_FILE)
     
-    if not all([reviews_raw, users_raw, hotels_raw]):
+    if reviews_data is None or not all([len(reviews_data), users_raw, hotels_raw]):
         print("❌ Missing data files")
         return None
     
     users = [u['id'] for u in users_raw]
     hotels = [h['id'] for h in hotels_raw]
     
-    print(f"   ✅ Loaded {len(reviews_raw)} reviews")
+    print(f"   ✅ Loaded {len(reviews_data)} reviews")
     print(f"   ✅ Loaded {len(users)} users, {len(hotels)} hotels")
     
     # ---------------------------------------------------------
@@ -410,15 +416,11 @@ def evaluate_explicit():
     # ---------------------------------------------------------
     print("\n[2/6] Preparing explicit rating data...")
     
-    interactions = []
-    for review in reviews_raw:
-        interactions.append({
-            'userId': review['userId'],
-            'hotelId': review['hotelId'],
-            'value': review['rating'],
-            'timestamp': review.get('createdAt', ''),
-            'bookingId': review.get('bookingId', '')
-        })
+    ratings = reviews_data['rating'].astype(np.float64)
+    interactions = rows_from_columns(reviews_data, ratings, ~np.isnan(ratings))
+    for inter in interactions:
+        if inter['value'].is_integer():
+            inter['value'] = int(inter['value'])  # Sao nguyên như trong file (1⭐ … 5⭐)
     
     print(f"   ✅ Prepared {len(interactions)} ratings")
     
@@ -1,8 +1,11 @@
 import json
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 import os
+import sys
 import numpy as np
+from scipy import sparse
+from src.cf_neighbors import topk_cosine_neighbors
+from src.rec_batch import REC_BATCH_CHUNK
+from src.data_loader import load_interactions, load_reviews, merge_ratings
 
 # ---------------------------------------------------------
 # 1. CẤU HÌNH & TRỌNG SỐ
@@ -30,221 +33,165 @@ def load_data():
     Logic merge (giống train_svd.py & recommend.py):
     - Implicit signals → weight theo WEIGHT_MAP
     - Explicit ratings (1-5⭐) → GHI ĐÈ implicit nếu cùng (user, hotel) pair
+    Trả về (user_ids, hotel_ids, weights) — 1 phần tử / cặp (user, hotel), hoặc None.
     """
-    # Load implicit interactions
-    interactions = []
-    if os.path.exists(INPUT_INTERACTIONS_FILE):
-        with open(INPUT_INTERACTIONS_FILE, "r", encoding="utf-8") as f:
-            interactions = json.load(f)
-        print(f"   📥 Loaded {len(interactions)} implicit interactions từ {INPUT_INTERACTIONS_FILE}")
-    else:
+    # Load implicit interactions (loader dùng chung, cache .npz theo hash file)
+    interactions = load_interactions(INPUT_INTERACTIONS_FILE)
+    if interactions is None:
         print(f"❌ Không tìm thấy {INPUT_INTERACTIONS_FILE}")
         return None
+    print(f"   📥 Loaded {len(interactions)} implicit interactions từ {INPUT_INTERACTIONS_FILE}")
 
     # Load explicit reviews (tiếng Việt thật từ CSV)
-    reviews = []
-    if os.path.exists(INPUT_REVIEWS_FILE):
-        with open(INPUT_REVIEWS_FILE, "r", encoding="utf-8") as f:
-            reviews = json.load(f)
+    reviews = load_reviews(INPUT_REVIEWS_FILE)
+    if reviews is not None:
         print(f"   📥 Loaded {len(reviews)} explicit reviews từ {INPUT_REVIEWS_FILE}")
     else:
         print(f"   ⚠️ Không tìm thấy {INPUT_REVIEWS_FILE} (sẽ chỉ dùng implicit)")
 
-    # --- MERGE: Tạo unified (userId, hotelId) → score ---
-    merged = {}  # key=(userId, hotelId) → {type, weight, source}
+    # --- MERGE: (userId, hotelId) → weight, explicit rating GHI ĐÈ implicit ---
+    user_ids, hotel_ids, weights, explicit = merge_ratings(interactions, reviews, WEIGHT_MAP, skip_empty_rating=True)
+    keep = hotel_ids != 0  # hotelId rỗng / 0 không hợp lệ
+    user_ids, hotel_ids, weights, explicit = user_ids[keep], hotel_ids[keep], weights[keep], explicit[keep]
 
-    # 1. Implicit signals
-    for inter in interactions:
-        uid = inter.get("userId")
-        hid = inter.get("hotelId")
-        itype = inter.get("type")
-        if not uid or not hid or itype not in WEIGHT_MAP:
-            continue
-        key = f"{uid}_{hid}"
-        merged[key] = {
-            "userId": uid,
-            "hotelId": hid,
-            "type": itype,
-            "weight": WEIGHT_MAP[itype],
-            "source": "implicit"
-        }
-
-    # 2. Explicit ratings → GHI ĐÈ implicit (explicit takes precedence)
-    for rev in reviews:
-        uid = rev.get("userId")
-        hid = rev.get("hotelId")
-        rating = rev.get("rating")
-        if not uid or not hid or not rating:
-            continue
-        key = f"{uid}_{hid}"
-        # Explicit rating GHI ĐÈ implicit
-        merged[key] = {
-            "userId": uid,
-            "hotelId": hid,
-            "type": "EXPLICIT_RATING",
-            "weight": float(rating),
-            "source": "explicit"
-        }
+    # Stats
+    explicit_count = int(explicit.sum())
+    print(f"   ✅ Merged: {len(weights)} unique (user, hotel) pairs")
+    print(f"      Implicit: {len(weights) - explicit_count} | Explicit (override): {explicit_count}")
 
-    # Convert to list (format như __interactions.json để code bên dưới không đổi)
-    merged_list = list(merged.values())
+    return user_ids, hotel_ids, weights
 
-    # Stats
-    implicit_count = sum(1 for v in merged.values() if v["source"] == "implicit")
-    explicit_count = sum(1 for v in merged.values() if v["source"] == "explicit")
-    print(f"   ✅ Merged: {len(merged_list)} unique (user, hotel) pairs")
-    print(f"      Implicit: {implicit_count} | Explicit (override): {explicit_count}")
+def build_matrix(data):
+    """
+    Ma trận User × Hotel (CSR), giá trị = Σ weight — tương đương pivot_table(aggfunc='sum').fillna(0).
+    data = (user_ids, hotel_ids, weights) từ load_data().
+    Trả về (user_ids theo thứ tự xuất hiện, hotel_ids tăng dần, matrix).
+    """
+    users, hotels, weights = data
+    user_ids = list(dict.fromkeys(users.tolist()))
+    user_index = {u: i for i, u in enumerate(user_ids)}
+    user_codes = np.fromiter((user_index[u] for u in users.tolist()), dtype=np.int64, count=len(users))
+    hotel_ids, hotel_codes = np.unique(np.asarray(hotels, dtype=np.int64), return_inverse=True)
+
+    matrix = sparse.csr_matrix((np.asarray(weights, dtype=np.float64), (user_codes, hotel_codes)),
+                               shape=(len(user_ids), len(hotel_ids)))
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()  # Ô có tổng = 0 coi như chưa tương tác (giống pivot)
+    return user_ids, hotel_ids, matrix
 
-    return merged_list
 
-def get_popular_items(df, top_n=5):
+def get_popular_items(matrix, hotel_ids, top_n=5):
     """
     Hàm Fallback: Lấy ra danh sách các khách sạn phổ biến nhất (dựa trên tổng trọng số interaction)
     Dùng cho trường hợp User mới hoặc User có hành vi quá dị biệt.
     """
-    popular_items = df.groupby('hotelId')['weight'].sum().sort_values(ascending=False).head(top_n)
-    ids = popular_items.index.tolist()
+    totals = np.asarray(matrix.sum(axis=0)).ravel()
+    order = np.lexsort((hotel_ids, -totals))[:top_n]
+    ids = hotel_ids[order].tolist()
     # Score giả lập cho items phổ biến (từ 0.5 -> 0.4) để phân biệt với items được personalize
     scores = {str(hid): round(0.5 - (i * 0.02), 2) for i, hid in enumerate(ids)}
     return ids, scores
 
+
+def predict_top_n(matrix, k_neighbors=10, top_n=5, chunk_size=REC_BATCH_CHUNK):
+    """
+    User-CF cho mọi user theo chunk (sparse matmul thay cho vòng lặp .loc):
+      score[u, i] = Σ_v sim(u, v) · r(v, i) / Σ_v sim(u, v)   (v ∈ top-K láng giềng sim > 0, r(v, i) > 0)
+    chỉ trên hotel user chưa tương tác. Bằng điểm → giữ thứ tự cũ: hotel của láng giềng gần hơn trước, rồi hotelId.
+    Trả về (top int64 (n_users, top_n), -1 = trống; scores tương ứng).
+    """
+    neighbors, sims = topk_cosine_neighbors(matrix, k_neighbors)
+    positive = matrix.multiply(matrix > 0).tocsr()
+    positive_mask = (positive > 0).astype(np.float64).tocsr()
+
+    n_users, n_items = matrix.shape
+    top = np.full((n_users, top_n), -1, dtype=np.int64)
+    top_scores = np.zeros((n_users, top_n))
+    for start in range(0, n_users, chunk_size):
+        stop = min(start + chunk_size, n_users)
+        nb, sm = neighbors[start:stop], sims[start:stop].astype(np.float64)
+        valid = nb >= 0
+        owner = np.repeat(np.arange(stop - start), valid.sum(axis=1))
+        S = sparse.csr_matrix((sm[valid], (owner, nb[valid])), shape=(stop - start, n_users))
+
+        score_sum = (S @ positive).toarray()
+        sim_sum = (S @ positive_mask).toarray()
+        final = np.divide(score_sum, sim_sum, out=np.zeros_like(score_sum), where=sim_sum > 0)
+        candidates = (sim_sum > 0) & (matrix[start:stop].toarray() == 0)
+
+        # Thứ hạng láng giềng đầu tiên có hotel đó (thứ tự chèn vào dict của code cũ)
+        first_rank = np.full(final.shape, nb.shape[1], dtype=np.int64)
+        for r in range(nb.shape[1] - 1, -1, -1):
+            has = valid[:, r]
+            rated = positive_mask[nb[has, r]].toarray() > 0
+            first_rank[has] = np.where(rated, r, first_rank[has])
+
+        key = np.where(candidates, -np.round(final, 9), np.inf)
+        order = np.lexsort((np.broadcast_to(np.arange(n_items), final.shape), first_rank, key), axis=1)[:, :top_n]
+        chosen = np.take_along_axis(candidates, order, axis=1)
+        width = order.shape[1]
+        top[start:stop, :width] = np.where(chosen, order, -1)
+        top_scores[start:stop, :width] = np.where(chosen, np.take_along_axis(final, order, axis=1), 0.0)
+    return top, top_scores
+
+
 def main():
     print("⏳ Đang xử lý Recommendation Engine...")
     
     data = load_data()
-    if not data: return
-
-    # 1. Tạo DataFrame & Tiền xử lý
-    df = pd.DataFrame(data)
-    
-    # Lọc bỏ interaction không hợp lệ
-    original_len = len(df)
-    df = df[df['hotelId'].notna()] # Bỏ dòng không có hotelId
-    
-    # Trọng số đã được tính sẵn từ merge logic:
-    # - Implicit → WEIGHT_MAP[type]
-    # - Explicit → float(rating) (1-5)
-    # Chỉ map nếu weight chưa có sẵn (backward compatible với file cũ)
-    if 'weight' not in df.columns or df['weight'].isna().all():
-        df['weight'] = df['type'].map(WEIGHT_MAP).fillna(1.0)
-    else:
-        # Fill NaN weight bằng WEIGHT_MAP fallback
-        df['weight'] = df['weight'].fillna(df['type'].map(WEIGHT_MAP).fillna(1.0))
-    
-    print(f"📊 Dữ liệu đầu vào: {len(df)} interactions hợp lệ.")
-    print(f"   📊 Weight stats: min={df['weight'].min():.1f}, max={df['weight'].max():.1f}, mean={df['weight'].mean():.2f}")
-
-    # 2. Xây dựng User-Item Matrix
-    # index=UserId, columns=HotelId, values=Sum(Weight)
-    user_item_matrix = df.pivot_table(index='userId', columns='hotelId', values='weight', aggfunc='sum').fillna(0)
-    
+    if data is None: return
+
+    # 1. Xây dựng User-Item Matrix (sparse)
+    user_ids, hotel_ids, user_item_matrix = build_matrix(data)
+    weights = user_item_matrix.data
+    print(f"📊 Dữ liệu đầu vào: {len(data[2])} interactions hợp lệ.")
+    if len(weights):
+        print(f"   📊 Weight stats: min={weights.min():.1f}, max={weights.max():.1f}, mean={weights.mean():.2f}")
     print(f"📐 Kích thước ma trận: {user_item_matrix.shape} (Users x Hotels)")
 
-    # 3. Tính Cosine Similarity (User-User)
-    # Chỉ tính khi ma trận đủ lớn
+    # Chuẩn bị danh sách fallback (Top Popular)
+    popular_ids, popular_scores = get_popular_items(user_item_matrix, hotel_ids)
+
+    # 2. User-CF cho toàn bộ user (chunk + sparse matmul)
     if user_item_matrix.shape[0] > 1:
-        user_similarity = cosine_similarity(user_item_matrix)
-        user_sim_df = pd.DataFrame(user_similarity, index=user_item_matrix.index, columns=user_item_matrix.index)
+        top, top_scores = predict_top_n(user_item_matrix)
     else:
         print("⚠️ Không đủ user để tính tương đồng. Sẽ dùng fallback toàn bộ.")
-        user_sim_df = pd.DataFrame()
+        top = np.full((len(user_ids), 5), -1, dtype=np.int64)
+        top_scores = np.zeros(top.shape)
 
-    # Chuẩn bị danh sách fallback (Top Popular)
-    popular_ids, popular_scores = get_popular_items(df)
-
-    # 4. Hàm tạo gợi ý cá nhân hóa
-    def generate_user_recs(user_id, k_neighbors=10, top_n=5):
-        # Trường hợp 1: User chưa có trong ma trận (Cold Start) -> Trả về Popular
-        if user_id not in user_item_matrix.index:
-            return popular_ids, popular_scores
-
-        # Trường hợp 2: Có lịch sử -> Dùng Collaborative Filtering
-        # Lấy K user giống nhất (bỏ qua chính mình ở index 0 vì sim=1.0)
-        if user_id not in user_sim_df.index:
-             return popular_ids, popular_scores
-             
-        sim_users = user_sim_df[user_id].sort_values(ascending=False).iloc[1:k_neighbors+1]
-        
-        # Dictionary lưu tổng điểm dự đoán: { hotel_id: total_score }
-        item_scores = {}
-        # Dictionary lưu tổng độ tương đồng (để chuẩn hóa): { hotel_id: sum_similarity }
-        sim_sums = {}
-
-        for neighbor_id, similarity in sim_users.items():
-            if similarity <= 0: continue # Bỏ qua nếu không giống hoặc đối nghịch
-
-            # Lấy các item mà hàng xóm đã tương tác (weight > 0)
-            neighbor_ratings = user_item_matrix.loc[neighbor_id]
-            rated_items = neighbor_ratings[neighbor_ratings > 0].index
-            
-            for item_id in rated_items:
-                # Chỉ gợi ý item mà user hiện tại CHƯA xem/mua (weight == 0)
-                if user_item_matrix.loc[user_id, item_id] == 0:
-                    # Dự đoán = Similarity * Rating của hàng xóm
-                    item_scores[item_id] = item_scores.get(item_id, 0) + (similarity * neighbor_ratings[item_id])
-                    sim_sums[item_id] = sim_sums.get(item_id, 0) + similarity
-
-        if not item_scores:
-            return popular_ids, popular_scores # Fallback nếu không tìm được gợi ý nào từ hàng xóm
-
-        # Tính điểm trung bình có trọng số & Sort
-        final_scores = []
-        for item_id, score_sum in item_scores.items():
-            # Normalize: Chia cho tổng độ tương đồng để score về thang điểm gốc (gần đúng)
-            normalized_score = score_sum / sim_sums[item_id] if sim_sums[item_id] > 0 else 0
-            final_scores.append((item_id, normalized_score))
-        
-        # Sort giảm dần
-        final_scores.sort(key=lambda x: x[1], reverse=True)
-        top_recs = final_scores[:top_n]
-
-        # Format output
-        rec_ids = []
-        rec_scores_map = {}
-        
-        if top_recs:
-            # Lấy điểm cao nhất trong danh sách gợi ý này làm chuẩn (100%)
-            max_pred = top_recs[0][1] 
-            
-            for pid, pscore in top_recs:
-                # Logic chuẩn hóa tương đối (Relative Normalization):
-                # Item cao nhất sẽ có ratio = 1.0. Item thấp hơn sẽ < 1.0.
-                ratio = pscore / max_pred if max_pred > 0 else 0
-                
-                # Scale về khoảng 60% -> 99% để hiển thị lên UI cho đẹp
-                # Công thức: 0.6 + (ratio * 0.39)
-                display_score = round(0.60 + (ratio * 0.39), 2)
-                
-                rec_ids.append(int(pid))
-                rec_scores_map[str(pid)] = display_score
-
-        return rec_ids, rec_scores_map
-
-    # 5. Chạy Loop cho tất cả User (kể cả những user có trong User List mà chưa có interaction)
-    # Để đảm bảo đầy đủ, ta nên lấy list user gốc từ file User (nếu có), ở đây ta lấy từ matrix index
+    # 3. Format output (giữ nguyên format __recommendations.json)
     recommendations_export = []
-    
-    # Lấy danh sách user duy nhất từ interaction
-    all_users = df['userId'].unique()
-    
-    count = 0
-    for uid in all_users:
-        ids, scores = generate_user_recs(uid)
-        
+    for uid, row, row_scores in zip(user_ids, top, top_scores):
+        valid = row >= 0
+        if not valid.any():
+            # Cold start / không tìm được gợi ý nào từ hàng xóm → Popular
+            recommendations_export.append({"userId": uid, "hotelIds": popular_ids, "score": popular_scores})
+            continue
+
+        ids = hotel_ids[row[valid]].tolist()
+        preds = row_scores[valid]
+        # Relative Normalization: item cao nhất ratio = 1.0, scale về 60% -> 99% để hiển thị lên UI
+        max_pred = preds[0]
+        ratios = preds / max_pred if max_pred > 0 else np.zeros_like(preds)
         recommendations_export.append({
             "userId": uid,
-            "hotelIds": ids,
-            "score": scores
+            "hotelIds": [int(h) for h in ids],
+            "score": {str(h): round(0.60 + (float(r) * 0.39), 2) for h, r in zip(ids, ratios)}
         })
-        count += 1
 
-    # 6. Xuất file
+    # 4. Xuất file
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(recommendations_export, f, ensure_ascii=False, indent=2)
 
-    print(f"✅ Hoàn tất! Đã tạo gợi ý cho {count} users.")
+    print(f"✅ Hoàn tất! Đã tạo gợi ý cho {len(recommendations_export)} users.")
     print(f"💾 File lưu tại: {OUTPUT_FILE}")
 
+    # 5. Bảng precompute cho /recommend (svd / user_cf / item_cf của recommend.py, mmap int32)
+    if "--no-serving" not in sys.argv:
+        from src.rec_batch import build_batch_recommendations
+        build_batch_recommendations()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
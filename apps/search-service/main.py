@@ -1,28 +1,37 @@
 import os
 import json
-import base64
-import pickle
 import torch
 import requests
+import sys
 import threading
-from io import BytesIO
-from PIL import Image
+import subprocess
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from clerk_backend_api import Clerk
-from sentence_transformers import SentenceTransformer, util
 from pydantic import BaseModel
 from typing import List, Dict
 from datetime import datetime
 
 # Import logic từ các file trong src
-from src.embedding import get_image_vector, get_text_vector
-from src.search import find_top_matches
-from src.recommend import get_recommendations_for_user, get_similar_hotels, algo as recommend_algo
+from src.model_registry import get_model, registry_stats, CLIP_MODEL
+from src.batcher import encode_text_async, batcher_stats
+from src.executors import run_io, limit, executor_stats, shutdown_executors, EndpointOverloaded
+from src.image_fetcher import image_fetcher, ImageTooLarge
+from src.embedding_cache import get_embedding_cache, embedding_cache_stats
+from src.search import find_top_matches, GalleryIndex, MultiVectorIndex
+from src.vector_store import load_vector_store
+from src.ann_index import load_search_index
+from src.recommend import get_recommendations_for_user, get_similar_hotels, get_all_hotels
 import src.recommend as recommend_module
+from src.result_cache import recommendation_cache, REC_CACHE_ENABLED
+from src.rec_batch import batch_recommendations
+from src import model_store
+from src.model_store import ModelWatcher, rollback as rollback_model, load_report
+from src.pipeline import set_visual_index, pipeline_stats
+from src.live_ingest import ingest, ingest_stats, start_stream_consumer, stream_consumer, InvalidInteraction
 from agent import run_agent_logic
 from bi_agent import run_bi_agent_logic
 
@@ -32,35 +41,40 @@ port = int(os.getenv("PORT", 8008))
 
 MODEL_PATH = "jsons/recsys_model.pkl"
 REPORT_PATH = "jsons/svd_training_report.json"
+VECTOR_STORE_DIR = "jsons/hotel_vectors"
+# Multi-vector gallery: điểm khách sạn = max (1) hoặc trung bình top-n ảnh
+SEARCH_POOL_TOP_N = int(os.getenv("SEARCH_POOL_TOP_N", 1))
 
 # =========================================================
 # CRONJOB: AUTO-RETRAIN SVD MODEL
 # =========================================================
+# Train chạy trong process riêng (retrain_worker.py) → serving không bị chặn;
+# model mới publish vào jsons/models, ModelWatcher của MỌI worker tự hot-swap.
 retrain_lock = threading.Lock()
+retrain_process = None
+
+def start_retrain(source):
+    """Spawn retrain_worker.py. Trả về False nếu process trước vẫn đang chạy."""
+    global retrain_process
+    with retrain_lock:
+        if retrain_process is not None and retrain_process.poll() is None:
+            return False
+        print(f"\n{source} SVD retrain started in worker process...")
+        retrain_process = subprocess.Popen([sys.executable, "retrain_worker.py"])
+        return True
 
 def scheduled_retrain():
     """Called by APScheduler at 3:00 AM daily"""
-    print("\n⏰ [CRON] Scheduled SVD retrain started...")
-    try:
-        from train_svd import main as train_main
-        train_main()
-        reload_svd_model()
-        print("⏰ [CRON] SVD retrain completed successfully!")
-    except Exception as e:
-        print(f"⏰ [CRON] SVD retrain failed: {e}")
+    if not start_retrain("⏰ [CRON]"):
+        print("⏰ [CRON] Previous retrain still running, skipped.")
 
-def reload_svd_model():
-    """Reload SVD model into RAM after training"""
-    global recommend_module
-    try:
-        if os.path.exists(MODEL_PATH):
-            with open(MODEL_PATH, "rb") as f:
-                recommend_module.algo = pickle.load(f)
-            print("✅ [Reload] SVD model reloaded into RAM.")
-        else:
-            print("⚠️ [Reload] Model file not found.")
-    except Exception as e:
-        print(f"❌ [Reload] Failed to reload model: {e}")
+def swap_svd_model(model, version):
+    """ModelWatcher callback: đổi model trong RAM + bỏ cache kết quả tier 1"""
+    recommend_module.set_model(model, version)
+    recommendation_cache.clear_local()
+
+model_watcher = ModelWatcher(on_swap=swap_svd_model)
+model_watcher.adopt(recommend_module.algo, recommend_module.algo_version)
 
 # =========================================================
 # LIFESPAN: Startup & Shutdown
@@ -82,6 +96,12 @@ async def lifespan(app: FastAPI):
         print("   Install: uv add apscheduler")
     except Exception as e:
         print(f"⚠️ APScheduler error: {e}")
+
+    # Redis stream consumer cho interaction realtime (INTERACTION_STREAM_ENABLED=1)
+    start_stream_consumer()
+
+    # Hot-swap model SVD khi retrain_worker publish version mới
+    model_watcher.start()
     
     yield
     
@@ -90,6 +110,10 @@ async def lifespan(app: FastAPI):
         scheduler.shutdown()
     except:
         pass
+    stream_consumer.stop()
+    model_watcher.stop()
+    await image_fetcher.aclose()
+    shutdown_executors()
     print("👋 Search Service shutting down...")
 
 app = FastAPI(
@@ -104,21 +128,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(EndpointOverloaded)
+async def endpoint_overloaded_handler(request: Request, exc: EndpointOverloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
 # 2. KHỞI TẠO AI MODEL & CLERK
-print("--- Loading AI Model (CLIP-ViT-B-32) ---")
-model = SentenceTransformer("clip-ViT-B-32")
+# CLIP dùng chung 1 instance qua model registry (src/embedding.py cũng lấy từ đây)
+get_model(CLIP_MODEL)
 
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY", "your_sk_here")
 clerk_client = Clerk(bearer_auth=CLERK_SECRET_KEY)
 
-# 3. LOAD DATABASE VECTOR VÀO RAM
-HOTEL_VECTORS = []
-try:
-    with open("jsons/__hotel_vectors.json", "r", encoding="utf-8") as f:
-        HOTEL_VECTORS = json.load(f)
-    print(f"✅ Loaded {len(HOTEL_VECTORS)} hotel vectors into memory.")
-except FileNotFoundError:
-    print("⚠️ Warning: hotel_vectors.json not found. Search results might be empty.")
+# 3. LOAD DATABASE VECTOR (memmap binary store, fallback JSON cũ)
+HOTEL_STORE = load_vector_store(VECTOR_STORE_DIR)
+if HOTEL_STORE is not None and HOTEL_STORE.has_field("gallery"):
+    # Mọi ảnh gallery đều được index, pooling theo khách sạn
+    HOTEL_INDEX = MultiVectorIndex.from_store(HOTEL_STORE, "gallery", pool_top_n=SEARCH_POOL_TOP_N)
+    row_index = load_search_index(HOTEL_INDEX.rows, VECTOR_STORE_DIR, "gallery")
+    if row_index is not HOTEL_INDEX.rows:
+        HOTEL_INDEX.row_index = row_index
+    print(f"✅ Mapped {len(HOTEL_INDEX.rows)} gallery vectors ({len(HOTEL_INDEX)} hotels) from {VECTOR_STORE_DIR}.")
+elif HOTEL_STORE is not None and HOTEL_STORE.has_field("image"):
+    HOTEL_INDEX = GalleryIndex.from_store(HOTEL_STORE, "image")
+    print(f"✅ Mapped {len(HOTEL_INDEX)} hotel vectors from {VECTOR_STORE_DIR}.")
+    # ANN backend (SEARCH_INDEX_BACKEND=ivf|hnsw), file index lưu cạnh store
+    HOTEL_INDEX = load_search_index(HOTEL_INDEX, VECTOR_STORE_DIR, "image")
+else:
+    HOTEL_VECTORS = []
+    try:
+        with open("jsons/__hotel_vectors.json", "r", encoding="utf-8") as f:
+            HOTEL_VECTORS = json.load(f)
+        print(f"✅ Loaded {len(HOTEL_VECTORS)} hotel vectors from JSON (chạy convert_vectors.py để dùng binary store).")
+    except FileNotFoundError:
+        print("⚠️ Warning: hotel_vectors.json not found. Search results might be empty.")
+    HOTEL_INDEX = GalleryIndex.from_items(HOTEL_VECTORS)
+
+# Index 1 vector / khách sạn cho nguồn ứng viên 'clip' của strategy pipeline
+if HOTEL_STORE is not None and HOTEL_STORE.has_field("image"):
+    set_visual_index(GalleryIndex.from_store(HOTEL_STORE, "image"))
+elif isinstance(HOTEL_INDEX, GalleryIndex):
+    set_visual_index(HOTEL_INDEX)
 
 class ChatRequest(BaseModel):
     message: str
@@ -130,7 +180,16 @@ def health_check():
     return {
         "status": "online",
         "service": "Stazy Search Service",
-        "vectors_loaded": len(HOTEL_VECTORS),
+        "vectors_loaded": len(HOTEL_INDEX),
+        "search_index": getattr(HOTEL_INDEX, "kind", "exact"),
+        "search_row_index": getattr(getattr(HOTEL_INDEX, "row_index", None), "kind", None),
+        "models": registry_stats(),
+        "encode_batching": batcher_stats(),
+        **executor_stats(),
+        "image_fetcher": image_fetcher.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "live_ingest": ingest_stats(),
+        "recommend_pipeline": pipeline_stats(),
     }
 
 
@@ -144,23 +203,23 @@ async def search_base64(data: dict):
     if not base64_data:
         raise HTTPException(status_code=400, detail="Missing image data")
 
-    try:
-        # Giải mã Base64
-        if "," in base64_data:
-            base64_str = base64_data.split(",")[1]
-        else:
-            base64_str = base64_data
+    async with limit("search"):
+        try:
+            # Giải mã Base64
+            if "," in base64_data:
+                base64_str = base64_data.split(",")[1]
+            else:
+                base64_str = base64_data
 
-        img_bytes = base64.b64decode(base64_str)
-        img = Image.open(BytesIO(img_bytes)).convert("RGB")
+            # AI trích xuất vector (chặn size trước khi decode, cache theo hash ảnh, decode chạy trong thread pool)
+            query_vector = await image_fetcher.embed_base64(base64_str)
 
-        # AI trích xuất vector
-        query_vector = model.encode(img)
-
-        # Tìm kiếm tương đồng
-        return find_top_matches(query_vector, HOTEL_VECTORS)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI Processing Error: {str(e)}")
+            # Tìm kiếm tương đồng
+            return find_top_matches(query_vector, HOTEL_INDEX)
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"AI Processing Error: {str(e)}")
 
 
 # B. TÌM KIẾM BẰNG MÔ TẢ VĂN BẢN
@@ -173,11 +232,12 @@ async def search_text(data: dict):
     if not description:
         raise HTTPException(status_code=400, detail="Missing description")
 
-    try:
-        query_vector = get_text_vector(description)
-        return find_top_matches(query_vector, HOTEL_VECTORS)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    async with limit("search"):
+        try:
+            query_vector = await get_embedding_cache(CLIP_MODEL).aget(description, encode_text_async)
+            return find_top_matches(query_vector, HOTEL_INDEX)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 # C. GỢI Ý KHÁCH SẠN CHO NGƯỜI DÙNG (RECOMMENDATION)
@@ -186,21 +246,35 @@ async def recommend(user_id: str, strategy: str = "svd", top_k: int = 5):
     """
     Gợi ý dựa trên hành vi tương tác.
     Query params:
-      - strategy: svd (default) | user_cf | item_cf | content | popular
+      - strategy: svd (default) | user_cf | item_cf | content | popular | hybrid | pipeline
       - top_k: số lượng kết quả (default=5)
     """
-    try:
-        results = get_recommendations_for_user(
-            user_id, "mock_interactions.json", HOTEL_VECTORS,
-            top_k=top_k, strategy=strategy
-        )
-
-        if not results:
-            return HOTEL_VECTORS[:top_k]
-
-        return results
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Recommendation Error: {str(e)}")
+    async with limit("recommend"):
+        try:
+            def compute():
+                return get_recommendations_for_user(
+                    user_id, "mock_interactions.json", None,
+                    top_k=top_k, strategy=strategy
+                )
+
+            def cached():
+                # Key gồm version model + generation của user (counter Redis chung + số event local)
+                # → tự invalidate khi reload / có interaction mới ở bất kỳ worker nào
+                generation = recommendation_cache.user_generation(
+                    user_id, recommend_module.user_generation(user_id))
+                key = recommendation_cache.make_key(
+                    recommend_module.algo_version, user_id, generation, strategy, top_k
+                )
+                return recommendation_cache.get_or_compute(key, compute)
+
+            results = await run_io(cached if REC_CACHE_ENABLED else compute)
+
+            if not results:
+                return get_all_hotels()[:top_k]
+
+            return results
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Recommendation Error: {str(e)}")
 
 
 # C2. KHÁCH SẠN TƯƠNG TỰ (SIMILAR HOTELS)
@@ -210,11 +284,31 @@ async def similar_hotels(hotel_id: int, top_k: int = 5):
     Tìm khách sạn tương tự dựa trên Item-CF similarity.
     Dùng cho trang chi tiết khách sạn.
     """
-    try:
-        results = get_similar_hotels(hotel_id, HOTEL_VECTORS, top_k=top_k)
-        return results
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Similar Hotels Error: {str(e)}")
+    async with limit("recommend"):
+        try:
+            results = await run_io(get_similar_hotels, hotel_id, get_all_hotels(), top_k=top_k)
+            return results
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Similar Hotels Error: {str(e)}")
+
+
+# C3. GHI NHẬN INTERACTION REALTIME
+@app.post("/interactions")
+async def post_interactions(data: dict):
+    """
+    Nhận: { "userId": "...", "hotelId": 12, "type": "VIEW", "timestamp": "..." }
+       hoặc { "events": [ {...}, {...} ] }
+    Cập nhật user-item matrix / profile / popularity ngay → /recommend phản ánh sau vài giây.
+    """
+    raw_events = data.get("events") if "events" in data else [data]
+    if not isinstance(raw_events, list):
+        raise HTTPException(status_code=400, detail="events phải là list")
+    async with limit("ingest"):
+        try:
+            accepted, mode = await run_io(ingest, raw_events)
+        except InvalidInteraction as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {"accepted": accepted, "mode": mode}
 
 
 # D. TÌM KIẾM BẰNG URL ẢNH (Nếu cần)
@@ -223,11 +317,15 @@ async def search_url(data: dict):
     url = data.get("image_url")
     if not url:
         raise HTTPException(status_code=400, detail="Missing image URL")
-    try:
-        query_vector = get_image_vector(url)
-        return find_top_matches(query_vector, HOTEL_VECTORS)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    async with limit("search"):
+        try:
+            # Connection pool + giới hạn dung lượng + cache URL/hash → bỏ qua network và CLIP khi hit
+            query_vector = await image_fetcher.embed_url(url)
+            return find_top_matches(query_vector, HOTEL_INDEX)
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/agent/chat")
 async def agent_chat(data: ChatRequest):
@@ -238,17 +336,18 @@ async def agent_chat(data: ChatRequest):
     if not data.message:
         raise HTTPException(status_code=400, detail="Missing message")
 
-    try:
-        print(f"📩 Chat request from {data.user_id}: {data.message}")
-        
-        # ✅ SỬA LỖI Ở ĐÂY: Gọi hàm run_agent_logic thay vì analyze_user_query
-        response_data = run_agent_logic(data.message, data.user_id)
-        
-        return response_data
+    async with limit("agent_chat"):
+        try:
+            print(f"📩 Chat request from {data.user_id}: {data.message}")
+            
+            # Groq HTTP + psycopg2 + encode đều blocking → chạy trong thread pool I/O
+            response_data = await run_io(run_agent_logic, data.message, data.user_id)
+            
+            return response_data
 
-    except Exception as e:
-        print(f"❌ Agent Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            print(f"❌ Agent Error: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 # =========================================================
@@ -258,19 +357,24 @@ async def agent_chat(data: ChatRequest):
 @app.get("/api/admin/ai/status")
 async def ai_status():
     """
-    Đọc SVD training report và trả về trạng thái model hiện tại.
+    Đọc SVD training report của version đang chạy và trả về trạng thái model hiện tại.
     """
     try:
-        if not os.path.exists(REPORT_PATH):
+        version = model_watcher.active_version
+        report = load_report(version)
+        if report is None:
             return {
                 "status": "no_report",
                 "message": "Chưa có báo cáo训练. Hãy chạy train_svd.py trước.",
-                "model_loaded": recommend_module.algo is not None
+                "model_loaded": recommend_module.algo is not None,
+                "model_store": model_watcher.stats(),
+                "recommendation_cache": recommendation_cache.stats(),
+                "batch_recommendations": batch_recommendations.stats()
             }
         
-        with open(REPORT_PATH, "r", encoding="utf-8") as f:
-            report = json.load(f)
-        
+        # Chưa có version nào (None) / model cũ ngoài model store → file legacy
+        model_file = MODEL_PATH if version is None or version.startswith("legacy-") \
+            else model_store.model_path(version)
         return {
             "status": "ready",
             "model_loaded": recommend_module.algo is not None,
@@ -279,19 +383,24 @@ async def ai_status():
             "best_params": report.get("best_params"),
             "data_stats": report.get("data_stats"),
             "evaluation": report.get("evaluation"),
-            "model_file_exists": os.path.exists(MODEL_PATH),
-            "model_file_size_mb": round(os.path.getsize(MODEL_PATH) / 1024 / 1024, 2) if os.path.exists(MODEL_PATH) else 0
+            "model_file_exists": os.path.exists(model_file),
+            "model_file_size_mb": round(os.path.getsize(model_file) / 1024 / 1024, 2) if os.path.exists(model_file) else 0,
+            "model_version": recommend_module.algo_version,
+            "model_store": model_watcher.stats(),
+            "retrain_running": retrain_process is not None and retrain_process.poll() is None,
+            "recommendation_cache": recommendation_cache.stats(),
+            "batch_recommendations": batch_recommendations.stats()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading status: {str(e)}")
 
 
 @app.post("/api/admin/ai/force-retrain")
-async def force_retrain(background_tasks: BackgroundTasks):
+async def force_retrain():
     """
-    Kích hoạt train SVD thủ công qua BackgroundTasks (không block request).
+    Kích hoạt train SVD thủ công trong process riêng (không block request / serving).
     """
-    if retrain_lock.locked():
+    if not start_retrain("🔧 [MANUAL]"):
         return JSONResponse(
             status_code=202,
             content={
@@ -300,25 +409,25 @@ async def force_retrain(background_tasks: BackgroundTasks):
             }
         )
     
-    def do_retrain():
-        with retrain_lock:
-            try:
-                print("\n🔧 [MANUAL] Force retrain triggered by admin...")
-                from train_svd import main as train_main
-                train_main()
-                reload_svd_model()
-                print("🔧 [MANUAL] Force retrain completed!")
-            except Exception as e:
-                print(f"🔧 [MANUAL] Force retrain failed: {e}")
-    
-    background_tasks.add_task(do_retrain)
-    
     return {
         "status": "started",
         "message": "Quá trình huấn luyện đã bắt đầu chạy ngầm. Kiểm tra lại sau vài phút."
     }
 
 
+@app.post("/api/admin/ai/rollback")
+async def rollback_svd_model():
+    """
+    Quay về version model SVD trước đó. Worker hiện tại swap ngay (model cũ còn trong RAM),
+    các worker khác nhận qua ModelWatcher trong vòng MODEL_CHECK_S giây.
+    """
+    version = await run_io(rollback_model)
+    if version is None:
+        raise HTTPException(status_code=409, detail="Không có version trước đó để rollback.")
+    await run_io(model_watcher.check)
+    return {"status": "rolled_back", "model_version": recommend_module.algo_version}
+
+
 class AdminChatRequest(BaseModel):
     message: str
 
@@ -332,10 +441,11 @@ async def admin_chat(data: AdminChatRequest):
     if not data.message:
         raise HTTPException(status_code=400, detail="Missing message")
 
-    try:
-        print(f"📊 [Admin BI] Request: {data.message}")
-        response = run_bi_agent_logic(data.message, user_id="admin")
-        return response
-    except Exception as e:
-        print(f"❌ [Admin BI] Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    async with limit("admin_chat"):
+        try:
+            print(f"📊 [Admin BI] Request: {data.message}")
+            response = await run_io(run_bi_agent_logic, data.message, user_id="admin")
+            return response
+        except Exception as e:
+            print(f"❌ [Admin BI] Error: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,13 @@
 import json
 import torch
-from sentence_transformers import SentenceTransformer
 from PIL import Image
 import requests
 from io import BytesIO
 import os
+import argparse
+import numpy as np
+from src.vector_store import write_vector_store, records_to_fields, STORE_DIR
+from src.model_registry import get_model, encode_image, encode_text, CLIP_MODEL, TEXT_MODEL
 
 # ---------------------------------------------------------
 # 1. KHỞI TẠO MODELS AI
@@ -13,12 +16,12 @@ print("⏳ Đang tải models AI...")
 
 # Model 1: CLIP (Xử lý ảnh) - Output: 512 dims
 # Dùng để: Tìm khách sạn bằng hình ảnh tương đồng
-img_model = SentenceTransformer("clip-ViT-B-32")
+get_model(CLIP_MODEL)
 
 # Model 2: Multilingual Text (Xử lý văn bản tiếng Việt) - Output: 512 dims
 # Dùng để: RAG, tìm kiếm ngữ nghĩa (vd: "tìm chỗ ở cho gia đình có bếp")
 # distiluse-base-multilingual-cased-v1 hỗ trợ 50+ ngôn ngữ gồm Tiếng Việt
-text_model = SentenceTransformer("distiluse-base-multilingual-cased-v1")
+get_model(TEXT_MODEL)
 
 print("✅ Models đã sẵn sàng!")
 
@@ -65,7 +68,7 @@ def get_image_vector(path_or_url):
             img = Image.open(full_local_path).convert("RGB")
 
         # Encode ảnh bằng CLIP
-        vector = img_model.encode(img).tolist()
+        vector = encode_image(img).tolist()
         return vector
 
     except Exception as e:
@@ -83,7 +86,7 @@ def get_text_embedding(text):
         return None
     try:
         # Encode văn bản bằng Multilingual Model
-        vector = text_model.encode(text).tolist()
+        vector = encode_text(text, model_name=TEXT_MODEL).tolist()
         return vector
     except Exception as e:
         print(f"❌ Lỗi xử lý text: {e}")
@@ -93,6 +96,13 @@ def get_text_embedding(text):
 # 4. MAIN PROGRAM
 # ---------------------------------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Tạo vector ảnh + text cho khách sạn")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"],
+                        help="Kiểu dữ liệu của binary vector store")
+    parser.add_argument("--no-json", action="store_true",
+                        help="Không xuất __hotel_vectors.json (file này chỉ còn dùng cho prisma seed)")
+    args = parser.parse_args()
+
     input_file = "jsons/__homeStay.json"
     output_file = "jsons/__hotel_vectors.json"
 
@@ -104,6 +114,7 @@ def main():
         stays = json.load(f)
 
     processed_data = []
+    gallery_ids, gallery_vecs, gallery_urls = [], [], []
     total = len(stays)
     print(f"🚀 Bắt đầu tạo vector cho {total} khách sạn...")
 
@@ -112,6 +123,18 @@ def main():
         
         # 1. Tạo Image Vector (cho featuredImage)
         img_vec = get_image_vector(item.get("featuredImage"))
+
+        # 1b. Vector cho từng ảnh gallery (multi-vector search: ảnh phòng tắm, hồ bơi...)
+        # featuredImage đứng đầu, bỏ URL trùng (galleryImgs hay chứa lại featuredImage)
+        image_urls = list(dict.fromkeys(
+            [item.get("featuredImage")] + list(item.get("galleryImgs") or [])
+        ))
+        for url in image_urls:
+            vec = img_vec if url == item.get("featuredImage") else get_image_vector(url)
+            if vec:
+                gallery_ids.append(item["id"])
+                gallery_vecs.append(vec)
+                gallery_urls.append(url)
         
         # 2. Tạo Policies Vector (Context cho RAG)
         # Mẹo: Kết hợp nhiều trường text lại để AI hiểu ngữ cảnh tốt hơn
@@ -134,12 +157,22 @@ def main():
                 "policiesVector": text_vec   # Map vào schema: policiesVector
             })
 
-    # Lưu kết quả
+    # Lưu binary store cho search service (memmap)
     os.makedirs("jsons", exist_ok=True)
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(processed_data, f) # Không cần indent để file nhẹ hơn
+    fields = records_to_fields(processed_data)
+    if gallery_vecs:
+        fields["gallery"] = (gallery_ids, np.array(gallery_vecs, dtype=np.float32), gallery_urls)
+    manifest = write_vector_store(STORE_DIR, fields, dtype=args.dtype, source=os.path.basename(input_file))
+    for name, meta in manifest["fields"].items():
+        print(f"   💾 {name}: {meta['count']} vectors x {meta['dim']} dims → {STORE_DIR}/{meta['file']}")
+
+    # JSON cũ vẫn xuất cho prisma seed (ghi vector vào Postgres)
+    if not args.no_json:
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(processed_data, f) # Không cần indent để file nhẹ hơn
     
-    print(f"\n✅ HOÀN THÀNH! Đã xuất {len(processed_data)} vectors ra file: {output_file}")
+    print(f"\n✅ HOÀN THÀNH! Đã xuất {len(processed_data)} vectors ra: {STORE_DIR}" +
+          ("" if args.no_json else f" và {output_file}"))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,287 @@
+# src/als.py
+# Implicit-feedback ALS (Hu, Koren & Volinsky) trên ma trận sparse user × hotel dựng từ __interactions.json:
+# - Ô (u, i): w = Σ trọng số signal (SIGNAL_WEIGHTS); preference p = 1 nếu w > 0, ngược lại 0
+#   (RATE_NEGATIVE → "không thích" có độ tin cao), confidence c = 1 + ALS_ALPHA·|w|; ô trống: p = 0, c = 1
+# - Mỗi nửa vòng giải (YᵀCᵤY + λI)·xᵤ = YᵀCᵤ·p(u) bằng vài bước conjugate gradient cho MỌI user cùng lúc:
+#     A·X = X @ (YᵀY + λI)  (dense, BLAS đa luồng)  +  D @ Y  (sparse, D_ui = (c_ui − 1)·xᵤ·yᵢ)
+#   → không lặp Python theo user, nghiệm vòng trước làm điểm bắt đầu (warm start)
+# - ALSScorer: cùng giao diện SVDScorer (knows_user / fold_in / score_items / score_items_many) → dùng được
+#   trong các đường chấm điểm vector hóa; đánh giá bằng metric xếp hạng (precision / recall / NDCG / MAP @K).
+
+import os
+import numpy as np
+from scipy import sparse
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+ALS_FACTORS = int(os.getenv("ALS_FACTORS", 64))
+ALS_REGULARIZATION = float(os.getenv("ALS_REGULARIZATION", 0.1))
+ALS_ALPHA = float(os.getenv("ALS_ALPHA", 2.0))          # Confidence = 1 + alpha·|Σ trọng số|
+ALS_ITERATIONS = int(os.getenv("ALS_ITERATIONS", 15))
+ALS_CG_STEPS = int(os.getenv("ALS_CG_STEPS", 3))        # Bước CG mỗi nửa vòng (warm start → 2-3 là đủ)
+
+
+# ---------------------------------------------------------
+# MA TRẬN
+# ---------------------------------------------------------
+def interaction_matrix(store, events=None):
+    """
+    Ma trận w (n_users, n_hotels) csr từ InteractionStore: hàng = store.users, cột = store.hotel_list.
+    events: mask bool theo event (None = tất cả) — dùng để tách train / test trên cùng hệ chỉ số.
+    """
+    hotel_codes = np.searchsorted(store.hotel_list, store.hotel_ids)
+    keep = store.type_known[store.type_codes]
+    if events is not None:
+        keep &= events
+    return sparse.csr_matrix(
+        (store.weights[keep], (store.user_codes[keep], hotel_codes[keep])),
+        shape=(len(store.users), len(store.hotel_list)),
+    )  # csr_matrix cộng dồn các cặp trùng
+
+
+def temporal_holdout(store, test_share=0.2):
+    """Mask event test: test_share event MỚI NHẤT của từng user (user có ≥ 2 event)."""
+    test = np.zeros(len(store), dtype=bool)
+    ts = store.timestamps.astype(np.int64)  # NaT → min int64 → xếp đầu
+    for user_id in store.users:
+        events = store.user_events(user_id)
+        n_test = int(len(events) * test_share)
+        if len(events) >= 2 and n_test:
+            order = events[np.argsort(ts[events], kind="stable")]
+            test[order[-n_test:]] = True
+    return test
+
+
+def _confidence(W, alpha):
+    """(C − 1) và C·P cùng cấu trúc sparse với W."""
+    W = W.tocsr()
+    W.eliminate_zeros()
+    conf_minus_one = W.copy()
+    conf_minus_one.data = alpha * np.abs(W.data)
+    conf_pref = W.copy()
+    conf_pref.data = np.where(W.data > 0, 1.0 + conf_minus_one.data, 0.0)
+    return conf_minus_one, conf_pref
+
+
+# ---------------------------------------------------------
+# TRAINER
+# ---------------------------------------------------------
+def _apply_a(X, Y, gram, cm1):
+    """A·X cho mọi hàng: X @ (YᵀY + λI) + Σ_i (c_ui − 1)(xᵤ·yᵢ)·yᵢ."""
+    rows = np.repeat(np.arange(cm1.shape[0]), np.diff(cm1.indptr))
+    d = sparse.csr_matrix(
+        (cm1.data * np.einsum("ij,ij->i", X[rows], Y[cm1.indices]), cm1.indices, cm1.indptr), shape=cm1.shape
+    )
+    return X @ gram + d @ Y
+
+
+def _cg_update(X, Y, cm1, cp, reg, steps):
+    """Vài bước CG (theo lô, mỗi hàng 1 hệ độc lập) cho X, warm start từ X hiện tại. Cập nhật tại chỗ."""
+    gram = Y.T @ Y + reg * np.eye(Y.shape[1])
+    r = cp @ Y - _apply_a(X, Y, gram, cm1)
+    p = r.copy()
+    rs_old = np.einsum("ij,ij->i", r, r)
+    for _ in range(steps):
+        active = rs_old > 1e-20
+        if not active.any():
+            break
+        ap = _apply_a(p, Y, gram, cm1)
+        denom = np.einsum("ij,ij->i", p, ap)
+        step = np.where(active, rs_old / np.where(denom > 0, denom, 1.0), 0.0)
+        X += step[:, None] * p
+        r -= step[:, None] * ap
+        rs_new = np.einsum("ij,ij->i", r, r)
+        p = r + np.where(active, rs_new / np.where(rs_old > 0, rs_old, 1.0), 0.0)[:, None] * p
+        rs_old = rs_new
+
+
+class ImplicitALS:
+    def __init__(self, factors=ALS_FACTORS, regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA,
+                 iterations=ALS_ITERATIONS, cg_steps=ALS_CG_STEPS, random_state=42):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.random_state = random_state
+        self.user_factors = None
+        self.item_factors = None
+
+    def fit(self, W):
+        """W: ma trận trọng số (n_users, n_items) sparse. Trả về self."""
+        rng = np.random.RandomState(self.random_state)
+        n_users, n_items = W.shape
+        self.user_factors = rng.normal(0, 0.01, (n_users, self.factors))
+        self.item_factors = rng.normal(0, 0.01, (n_items, self.factors))
+        cm1, cp = _confidence(W, self.alpha)
+        cm1_t, cp_t = cm1.T.tocsr(), cp.T.tocsr()
+        for _ in range(self.iterations):
+            _cg_update(self.user_factors, self.item_factors, cm1, cp, self.regularization, self.cg_steps)
+            _cg_update(self.item_factors, self.user_factors, cm1_t, cp_t, self.regularization, self.cg_steps)
+        return self
+
+    def loss(self, W):
+        """
+        Σ_ui c·(p − xᵤ·yᵢ)² + λ(|X|² + |Y|²), chỉ duyệt ô khác 0:
+        Σ_mọi ô (xᵤ·yᵢ)² = tr(XᵀX·YᵀY), phần còn lại chỉ khác 0 trên ô có tương tác.
+        """
+        X, Y = self.user_factors, self.item_factors
+        cm1, cp = _confidence(W, self.alpha)
+        rows = np.repeat(np.arange(cm1.shape[0]), np.diff(cm1.indptr))
+        pred = np.einsum("ij,ij->i", X[rows], Y[cm1.indices])
+        pref = (cp.data > 0).astype(np.float64)
+        observed = ((1.0 + cm1.data) * (pref - pred) ** 2 - pred ** 2).sum()
+        return float(observed + np.trace((X.T @ X) @ (Y.T @ Y))
+                     + self.regularization * ((X ** 2).sum() + (Y ** 2).sum()))
+
+
+# ---------------------------------------------------------
+# SCORER
+# ---------------------------------------------------------
+class ALSScorer:
+    """Điểm = xᵤ·yᵢ (không clip — chỉ dùng để xếp hạng). Hotel ngoài model → 0; user lạ chưa fold-in → 0."""
+
+    def __init__(self, user_ids, hotel_ids, user_factors, item_factors,
+                 regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA):
+        self.user_factors = np.asarray(user_factors, dtype=np.float64)
+        self.item_factors = np.asarray(item_factors, dtype=np.float64)
+        self.user_index = {u: i for i, u in enumerate(user_ids)}
+        self.item_index = {int(h): i for i, h in enumerate(np.asarray(hotel_ids).tolist())}
+        self.regularization = regularization
+        self.alpha = alpha
+        self.folded = {}
+        self._gram = None
+        self._rows_for = None
+        self._rows = None
+
+    @classmethod
+    def from_model(cls, model, user_ids, hotel_ids):
+        return cls(user_ids, hotel_ids, model.user_factors, model.item_factors, model.regularization, model.alpha)
+
+    def save(self, path):
+        users = [None] * len(self.user_index)
+        for u, i in self.user_index.items():
+            users[i] = u
+        hotels = np.empty(len(self.item_index), dtype=np.int64)
+        for h, i in self.item_index.items():
+            hotels[i] = h
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, user_ids=np.array(users, dtype=object).astype(str), hotel_ids=hotels,
+                 user_factors=self.user_factors.astype(np.float32), item_factors=self.item_factors.astype(np.float32),
+                 regularization=self.regularization, alpha=self.alpha)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["user_ids"].tolist(), data["hotel_ids"], data["user_factors"], data["item_factors"],
+                       float(data["regularization"]), float(data["alpha"]))
+
+    def knows_user(self, user_id):
+        return user_id in self.user_index or user_id in self.folded
+
+    def fold_in(self, user_id, weights):
+        """
+        Vector ẩn cho user chưa có trong model từ [(hotel_id, Σ trọng số), ...]: 1 lần giải đúng
+        (YᵀY + Yᵤᵀ(Cᵤ − I)Yᵤ + λI)·x = YᵤᵀCᵤp(u). Trả về False nếu không có hotel nào trong model.
+        """
+        rows, values = [], []
+        for hotel_id, w in weights:
+            i = self.item_index.get(hotel_id)
+            if i is not None and w != 0:
+                rows.append(i)
+                values.append(w)
+        if not rows:
+            self.folded.pop(user_id, None)
+            return False
+        if self._gram is None:
+            self._gram = self.item_factors.T @ self.item_factors
+        Yu = self.item_factors[rows]
+        w = np.asarray(values, dtype=np.float64)
+        cm1 = self.alpha * np.abs(w)
+        b = Yu.T @ np.where(w > 0, 1.0 + cm1, 0.0)
+        A = self._gram + (Yu.T * cm1) @ Yu + self.regularization * np.eye(Yu.shape[1])
+        self.folded[user_id] = np.linalg.solve(A, b)
+        return True
+
+    def forget(self, user_id):
+        self.folded.pop(user_id, None)
+
+    def _user_vector(self, user_id):
+        u = self.user_index.get(user_id)
+        return self.user_factors[u] if u is not None else self.folded.get(user_id)
+
+    def item_rows(self, items):
+        """Chỉ số item của từng hotel (-1 = không có trong model). Cache theo object list hotels."""
+        if self._rows_for is not items:
+            self._rows = np.fromiter(
+                (self.item_index.get(h.get("id"), -1) for h in items), dtype=np.int64, count=len(items)
+            )
+            self._rows_for = items
+        return self._rows
+
+    def score_items(self, user_id, items):
+        rows = self.item_rows(items)
+        scores = np.zeros(len(rows), dtype=np.float64)
+        x = self._user_vector(user_id)
+        if x is not None:
+            known = rows >= 0
+            scores[known] = self.item_factors[rows[known]] @ x
+        return scores
+
+    def score_items_many(self, user_ids, items):
+        rows = self.item_rows(items)
+        known = rows >= 0
+        scores = np.zeros((len(user_ids), len(rows)), dtype=np.float64)
+        vectors = [self._user_vector(u) for u in user_ids]
+        have = np.array([v is not None for v in vectors], dtype=bool)
+        if have.any():
+            P = np.vstack([v for v in vectors if v is not None])
+            scores[np.ix_(have, known)] = P @ self.item_factors[rows[known]].T
+        return scores
+
+
+# ---------------------------------------------------------
+# METRIC XẾP HẠNG
+# ---------------------------------------------------------
+def ranking_metrics(scores, train, test, k=10):
+    """
+    scores: (n_users, n_items) dense; train / test: ma trận trọng số sparse cùng shape.
+    Hotel đã tương tác trong train bị loại khỏi danh sách gợi ý; relevant = ô test có w > 0.
+    Chỉ tính trên user có ít nhất 1 hotel relevant.
+    """
+    from src.rec_batch import top_n_rows
+
+    test = test.tocsr()
+    relevant = test.multiply(test > 0).tocsr()
+    users = np.nonzero(np.diff(relevant.indptr))[0]
+    if len(users) == 0:
+        return {"users": 0}
+    seen = train.tocsr()[users]
+    valid = np.ones((len(users), scores.shape[1]), dtype=bool)
+    valid[seen.nonzero()] = False
+    top = top_n_rows(scores[users], valid, k)
+
+    rel = relevant[users]
+    hits = np.zeros(top.shape, dtype=bool)
+    for r in range(len(users)):
+        cols = rel.indices[rel.indptr[r]:rel.indptr[r + 1]]
+        hits[r] = np.isin(top[r], cols) & (top[r] >= 0)
+    n_rel = np.diff(rel.indptr)
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (hits * discounts).sum(axis=1)
+    idcg = np.array([discounts[:min(k, n)].sum() for n in n_rel])
+    precision_at = np.cumsum(hits, axis=1) / np.arange(1, k + 1)
+    ap = (precision_at * hits).sum(axis=1) / np.minimum(n_rel, k)
+    recommended = top[top >= 0]
+    return {
+        "users": int(len(users)),
+        f"precision@{k}": float(hits.sum(axis=1).mean() / k),
+        f"recall@{k}": float((hits.sum(axis=1) / n_rel).mean()),
+        f"hit_rate@{k}": float(hits.any(axis=1).mean()),
+        f"ndcg@{k}": float((dcg / idcg).mean()),
+        f"map@{k}": float(ap.mean()),
+        "coverage": float(len(np.unique(recommended)) / scores.shape[1]),
+    }
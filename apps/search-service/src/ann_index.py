@@ -0,0 +1,295 @@
+# src/ann_index.py
+# Approximate Nearest Neighbour index cho image/text search
+# Backends: exact (GalleryIndex), ivf (IVF-flat thuần NumPy), hnsw (hnswlib - optional)
+# Knob recall/latency: nprobe (IVF) hoặc ef (HNSW). Kiểm tra bằng recall_at_k() / tune_ann.py
+
+import os
+import json
+import time
+import tempfile
+import numpy as np
+from src.search import GalleryIndex, normalize_vector, top_k_indices
+from src.vector_store import MANIFEST_FILE
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+SEARCH_INDEX_BACKEND = os.getenv("SEARCH_INDEX_BACKEND", "exact")  # exact | ivf | hnsw
+IVF_NLIST = int(os.getenv("SEARCH_IVF_NLIST", 0))    # 0 = tự chọn ~4*sqrt(n)
+IVF_NPROBE = int(os.getenv("SEARCH_IVF_NPROBE", 8))  # Số cluster quét mỗi truy vấn
+HNSW_M = int(os.getenv("SEARCH_HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv("SEARCH_HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF = int(os.getenv("SEARCH_HNSW_EF", 64))       # ef lúc query (>= top_k)
+
+KMEANS_ITERATIONS = 20
+KMEANS_CHUNK = 65536
+
+
+def _tmp_path(path):
+    """File tạm tên riêng cạnh path → nhiều worker cùng lưu không đè / xóa file tạm của nhau."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".")
+    os.close(fd)
+    return tmp_path
+
+
+# =========================================================
+# IVF-FLAT (thuần NumPy)
+# =========================================================
+class IVFFlatIndex:
+    """
+    Chia gallery thành nlist cluster (spherical k-means trên vector đã chuẩn hóa).
+    Truy vấn: chấm điểm centroid → quét nprobe cluster gần nhất → top-k chính xác trong đó.
+    Vector không bị copy: các cluster chỉ là slice trên mảng `order` trỏ vào ma trận gốc (memmap).
+    """
+    kind = "ivf"
+
+    def __init__(self, exact: GalleryIndex, centroids, order, offsets, nprobe=IVF_NPROBE):
+        self.exact = exact
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.order = np.asarray(order, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.exact)
+
+    @classmethod
+    def build(cls, exact: GalleryIndex, nlist=IVF_NLIST, nprobe=IVF_NPROBE, seed=42):
+        n = len(exact)
+        if nlist <= 0:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, max(n, 1))
+
+        centroids, assign = _spherical_kmeans(exact.matrix, nlist, seed=seed)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(exact, centroids, order, offsets, nprobe=nprobe)
+
+    def save(self, path, fingerprint=""):
+        tmp_path = _tmp_path(path)
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, centroids=self.centroids, order=self.order,
+                         offsets=self.offsets, count=np.int64(len(self.exact)),
+                         fingerprint=np.str_(fingerprint))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path, exact: GalleryIndex, nprobe=IVF_NPROBE, fingerprint=""):
+        """Trả về None nếu file không khớp với gallery hiện tại (cần build lại)."""
+        with np.load(path) as data:
+            if "fingerprint" not in data.files or str(data["fingerprint"]) != fingerprint:
+                return None  # Store đã được ghi lại (embed lại / đổi thứ tự) sau khi build index
+            if int(data["count"]) != len(exact) or data["centroids"].shape[1] != exact.matrix.shape[1]:
+                return None
+            return cls(exact, data["centroids"], data["order"], data["offsets"], nprobe=nprobe)
+
+    def search_rows(self, query_vector, top_k=10):
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = normalize_vector(query_vector)
+        probe = top_k_indices(self.centroids @ q, self.nprobe)
+        candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.exact.matrix[candidates] @ q
+        top = top_k_indices(scores, top_k)
+        return candidates[top], scores[top]
+
+    def search(self, query_vector, top_k=10):
+        rows, scores = self.search_rows(query_vector, top_k)
+        return self.exact.format_results(rows, scores)
+
+
+def _spherical_kmeans(matrix, k, n_iter=KMEANS_ITERATIONS, seed=42):
+    """K-means trên mặt cầu đơn vị (cosine). Gán cluster theo từng chunk để giới hạn RAM."""
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    centroids = np.array(matrix[np.sort(rng.choice(n, size=k, replace=False))], dtype=np.float32)
+    assign = np.zeros(n, dtype=np.int64)
+
+    for _ in range(n_iter):
+        for start in range(0, n, KMEANS_CHUNK):
+            block = np.asarray(matrix[start:start + KMEANS_CHUNK], dtype=np.float32)
+            assign[start:start + KMEANS_CHUNK] = np.argmax(block @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids)
+        for start in range(0, n, KMEANS_CHUNK):
+            block = np.asarray(matrix[start:start + KMEANS_CHUNK], dtype=np.float32)
+            np.add.at(sums, assign[start:start + KMEANS_CHUNK], block)
+
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        if empty.any():
+            # Cluster rỗng → lấy ngẫu nhiên 1 vector làm centroid mới
+            sums[empty] = matrix[rng.choice(n, size=int(empty.sum()), replace=False)]
+            norms[empty] = np.linalg.norm(sums[empty], axis=1)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms[:, None]
+
+    return centroids, assign
+
+
+# =========================================================
+# HNSW (optional: pip install hnswlib)
+# =========================================================
+class HNSWIndex:
+    """Graph index qua hnswlib (inner product trên vector đã chuẩn hóa = cosine)."""
+    kind = "hnsw"
+
+    def __init__(self, exact: GalleryIndex, graph, ef=HNSW_EF):
+        self.exact = exact
+        self.graph = graph
+        self.ef = ef
+
+    @property
+    def ef(self):
+        return self._ef
+
+    @ef.setter
+    def ef(self, value):
+        self._ef = value
+        self.graph.set_ef(value)
+
+    def __len__(self):
+        return len(self.exact)
+
+    @classmethod
+    def build(cls, exact: GalleryIndex, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef=HNSW_EF):
+        import hnswlib
+        n, dim = exact.matrix.shape
+        graph = hnswlib.Index(space="ip", dim=dim)
+        graph.init_index(max_elements=max(n, 1), ef_construction=ef_construction, M=m)
+        if n:
+            graph.add_items(np.asarray(exact.matrix, dtype=np.float32), np.arange(n))
+        return cls(exact, graph, ef=ef)
+
+    def save(self, path, fingerprint=""):
+        # File hnswlib không chứa metadata → fingerprint ghi sidecar, sau file index
+        tmp_index, tmp_meta = _tmp_path(path), _tmp_path(path + ".meta.json")
+        try:
+            self.graph.save_index(tmp_index)
+            os.replace(tmp_index, path)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "count": len(self.exact)}, f)
+            os.replace(tmp_meta, path + ".meta.json")
+        finally:
+            for tmp_path in (tmp_index, tmp_meta):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path, exact: GalleryIndex, ef=HNSW_EF, fingerprint=""):
+        import hnswlib
+        try:
+            with open(path + ".meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("fingerprint") != fingerprint:
+            return None
+        n, dim = exact.matrix.shape
+        graph = hnswlib.Index(space="ip", dim=dim)
+        graph.load_index(path, max_elements=max(n, 1))
+        if graph.get_current_count() != n:
+            return None
+        return cls(exact, graph, ef=ef)
+
+    def search_rows(self, query_vector, top_k=10):
+        k = min(top_k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self.ef < k:
+            self.ef = k
+        labels, distances = self.graph.knn_query(normalize_vector(query_vector), k=k)
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def search(self, query_vector, top_k=10):
+        rows, scores = self.search_rows(query_vector, top_k)
+        return self.exact.format_results(rows, scores)
+
+
+# =========================================================
+# FACTORY + PERSISTENCE (cạnh vector store)
+# =========================================================
+ANN_BACKENDS = {
+    "ivf": (IVFFlatIndex, "ivf.npz"),
+    "hnsw": (HNSWIndex, "hnsw.bin"),
+}
+
+
+def index_path(store_dir, field, backend):
+    return os.path.join(store_dir, f"{field}.{ANN_BACKENDS[backend][1]}")
+
+
+def store_fingerprint(store_dir, field):
+    """
+    Định danh nội dung field trong vector store: created_at của manifest (đổi mỗi lần write_vector_store)
+    + count / dim. Cùng số dòng nhưng đã embed lại / đổi thứ tự → fingerprint khác → index cũ bị bỏ.
+    """
+    try:
+        with open(os.path.join(store_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    meta = manifest.get("fields", {}).get(field, {})
+    return f"{manifest.get('created_at')}|{meta.get('count')}|{meta.get('dim')}"
+
+
+def load_search_index(exact: GalleryIndex, store_dir=None, field="image", backend=SEARCH_INDEX_BACKEND):
+    """
+    Trả về index cho endpoint search theo backend.
+    Đọc file index đã lưu cạnh store nếu build từ đúng nội dung store hiện tại, không thì build và lưu lại.
+    File hỏng / không đọc được = chưa có → build lại; lưu lỗi (vd: worker khác đang ghi) vẫn dùng index vừa build.
+    Backend lỗi (vd: chưa cài hnswlib) → quay về exact scan.
+    """
+    if backend not in ANN_BACKENDS or len(exact) == 0:
+        return exact
+
+    index_cls, _ = ANN_BACKENDS[backend]
+    fingerprint = store_fingerprint(store_dir, field) if store_dir else None
+    path = index_path(store_dir, field, backend) if fingerprint else None  # Không định danh được → không cache
+    try:
+        index = None
+        if path and os.path.exists(path):
+            try:
+                index = index_cls.load(path, exact, fingerprint=fingerprint)
+            except ImportError:
+                raise
+            except Exception as e:
+                print(f"⚠️ [ANN] Không đọc được {path} ({e}), build lại.")
+        if index is None:
+            start = time.perf_counter()
+            index = index_cls.build(exact)
+            print(f"✅ [ANN] Built {backend} index for '{field}' in {time.perf_counter() - start:.2f}s")
+            if path:
+                try:
+                    index.save(path, fingerprint=fingerprint)
+                except Exception as e:
+                    print(f"⚠️ [ANN] Không lưu được {path}: {e}")
+        return index
+    except ImportError:
+        print(f"⚠️ [ANN] Backend '{backend}' chưa cài thư viện, dùng exact scan.")
+    except Exception as e:
+        print(f"⚠️ [ANN] Backend '{backend}' lỗi ({e}), dùng exact scan.")
+    return exact
+
+
+def recall_at_k(index, exact: GalleryIndex, queries, k=10):
+    """Recall@k trung bình của index so với exact scan trên tập query."""
+    recalls = []
+    for q in queries:
+        truth, _ = exact.search_rows(q, k)
+        if len(truth) == 0:
+            continue
+        found, _ = index.search_rows(q, k)
+        recalls.append(len(np.intersect1d(truth, found)) / len(truth))
+    return float(np.mean(recalls)) if recalls else 0.0
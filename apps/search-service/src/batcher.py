@@ -0,0 +1,124 @@
+# src/batcher.py
+# Micro-batching cho CLIP encode: gom request trong vài ms (hoặc tới N phần tử)
+# → 1 lần model.encode(batch) → trả kết quả về từng request đang await.
+# Trên CPU, 1 forward pass batch 16 rẻ hơn nhiều so với 16 forward pass lẻ.
+
+import os
+import time
+import asyncio
+from collections import Counter
+from src.model_registry import encode, CLIP_MODEL
+from src.executors import inference_executor
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+ENCODE_MAX_BATCH = int(os.getenv("ENCODE_MAX_BATCH", 16))        # Tối đa N phần tử / batch
+ENCODE_MAX_WAIT_MS = float(os.getenv("ENCODE_MAX_WAIT_MS", 5))   # Chờ gom tối đa (ms)
+
+
+class MicroBatcher:
+    """
+    Hàng đợi asyncio trước 1 hàm encode theo batch.
+    encode_fn(list_items) -> list/ndarray kết quả cùng thứ tự; chạy trong executor để không block event loop.
+    """
+
+    def __init__(self, name, encode_fn, max_batch=ENCODE_MAX_BATCH, max_wait_ms=ENCODE_MAX_WAIT_MS, executor=None):
+        self.name = name
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+        # Metrics
+        self.batch_sizes = Counter()
+        self.total_items = 0
+        self.total_batches = 0
+        self.total_encode_seconds = 0.0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item):
+        """Encode 1 phần tử, chờ tới khi batch chứa nó chạy xong."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = await self._loop.run_in_executor(self.executor, self.encode_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.total_encode_seconds += time.perf_counter() - start
+                self.batch_sizes[len(batch)] += 1
+                self.total_batches += 1
+                self.total_items += len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.total_batches,
+            "items": self.total_items,
+            "avg_batch_size": round(self.total_items / self.total_batches, 2) if self.total_batches else 0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            "avg_encode_ms": round(self.total_encode_seconds / self.total_batches * 1000, 2) if self.total_batches else 0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+# ---------------------------------------------------------
+# CLIP BATCHERS (ảnh và text tách riêng: 1 batch encode chỉ chứa 1 loại input)
+# ---------------------------------------------------------
+def _encode_batch(items):
+    return encode(items, model_name=CLIP_MODEL, batch_size=len(items))
+
+
+image_batcher = MicroBatcher("clip_image", _encode_batch, executor=inference_executor)
+text_batcher = MicroBatcher("clip_text", _encode_batch, executor=inference_executor)
+
+
+async def encode_image_async(image):
+    return await image_batcher.submit(image)
+
+
+async def encode_text_async(text):
+    return await text_batcher.submit(text)
+
+
+def batcher_stats():
+    return {b.name: b.stats() for b in (image_batcher, text_batcher)}
@@ -0,0 +1,143 @@
+# src/cf_neighbors.py
+# Bảng láng giềng precompute cho User-CF / Item-CF:
+# - neighbors[i, :] = K chỉ số gần nhất (int32, giảm dần theo sim, -1 = trống)
+# - sims[i, :]      = cosine tương ứng (float32, 0 = trống)
+# Build offline (build_cf_neighbors.py / retrain_worker.py) → jsons/cf_neighbors.npz kèm id user / hotel của từng hàng;
+# online chỉ đọc (map lại theo chỉ số hiện tại) rồi gather + cộng dồn, không bao giờ build trong request.
+
+import os
+import numpy as np
+from scipy import sparse
+
+SIM_CHUNK_SIZE = int(os.getenv("SIM_CHUNK_SIZE", 1024))  # Số hàng / lần nhân (RAM tạm: chunk × N)
+
+
+def _l2_normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(inv) @ matrix
+
+
+def topk_cosine_neighbors(matrix, k, chunk_size=SIM_CHUNK_SIZE):
+    """
+    Cosine similarity giữa các hàng của ma trận sparse, chỉ giữ top-k láng giềng (sim > 0, bỏ chính nó).
+    Tính theo chunk hàng → không bao giờ tạo ma trận N×N dense.
+    Trả về (neighbors int32 (n, k), sims float32 (n, k)).
+    """
+    normed = _l2_normalize_rows(sparse.csr_matrix(matrix, dtype=np.float64))
+    normed_t = normed.T.tocsc()
+    n = normed.shape[0]
+    k = max(0, min(k, n - 1))
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    sims = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return neighbors, sims
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        block = (normed[start:stop] @ normed_t).toarray()
+        block[np.arange(stop - start), np.arange(start, stop)] = 0.0  # Bỏ self-similarity
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_vals = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_vals, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_vals = np.take_along_axis(top_vals, order, axis=1)
+        keep = top_vals > 0
+        neighbors[start:stop] = np.where(keep, top, -1)
+        sims[start:stop] = np.where(keep, top_vals, 0.0)
+
+    return neighbors, sims
+
+
+def gather_rows(matrix, rows):
+    """Các phần tử khác 0 của matrix[rows] (CSR) → (vị trí trong rows, cột, giá trị). O(nnz các hàng đó)."""
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[rows + 1] - starts
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.repeat(starts, lengths) + offsets
+    return owner, matrix.indices[positions], matrix.data[positions]
+
+
+def accumulate(cols, weights, values):
+    """Σ weight·value và Σ weight theo cột (chỉ trên các cột xuất hiện) → (cols_unique, score_sum, weight_sum)."""
+    if len(cols) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    unique, inverse = np.unique(cols, return_inverse=True)
+    score_sum = np.bincount(inverse, weights=weights * values, minlength=len(unique))
+    weight_sum = np.bincount(inverse, weights=weights, minlength=len(unique))
+    return unique, score_sum, weight_sum
+
+
+def save_neighbor_tables(path, user_ids, hotel_ids, user_neighbors, user_sims, item_neighbors, item_sims,
+                         event_ids=()):
+    """
+    user_ids / hotel_ids: id của từng hàng bảng → lúc load map lại theo chỉ số của ma trận đang chạy.
+    event_ids: id các event live (src/live_log.py) đã có trong ma trận lúc build.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        user_ids=np.asarray(user_ids, dtype=str), hotel_ids=np.asarray(hotel_ids, dtype=np.int64),
+        user_neighbors=user_neighbors, user_sims=user_sims,
+        item_neighbors=item_neighbors, item_sims=item_sims,
+        event_ids=np.asarray(list(event_ids), dtype=str),
+    )
+    os.replace(tmp_path, path)
+
+
+def _remap_table(neighbors, sims, saved_ids, current_index, n_current, k):
+    """
+    Bảng theo thứ tự id lúc build → bảng (n_current, k) theo chỉ số hiện tại.
+    Trả về (neighbors, sims, missing): missing = chỉ số hiện tại không có hàng trong bảng (cần tính cục bộ).
+    """
+    to_current = np.array([current_index.get(i, -1) for i in saved_ids.tolist()], dtype=np.int64)
+    k = min(k, neighbors.shape[1])
+    if len(to_current) == n_current and (to_current == np.arange(n_current)).all():
+        return neighbors[:, :k], sims[:, :k], set()  # Cùng thứ tự (trường hợp thường gặp) → không copy
+
+    remapped = np.where(neighbors[:, :k] >= 0, to_current[np.maximum(neighbors[:, :k], 0)], -1)
+    out_neighbors = np.full((n_current, k), -1, dtype=np.int32)
+    out_sims = np.zeros((n_current, k), dtype=np.float32)
+    present = to_current >= 0
+    out_neighbors[to_current[present]] = remapped[present]
+    out_sims[to_current[present]] = np.where(remapped[present] >= 0, sims[present, :k], 0.0)
+    has_row = np.zeros(n_current, dtype=bool)
+    has_row[to_current[present]] = True
+    return out_neighbors, out_sims, set(np.nonzero(~has_row)[0].tolist())
+
+
+def load_neighbor_tables(path, user_index, hotel_index, user_k, item_k):
+    """
+    Bảng đã build offline, map theo user_index / hotel_index ({id: chỉ số} của ma trận hiện tại).
+    None nếu không có file / file hỏng / K cấu hình lớn hơn K đã build.
+    tables['missing_users'] / ['missing_items']: hàng không có trong bảng (user / hotel mới sau lần build).
+    tables['event_ids']: set id event live đã tính trong bảng.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            tables = {name: data[name] for name in data.files}
+    except Exception as e:
+        print(f"⚠️ [CF] Không đọc được {path}: {e}")
+        return None
+    if "user_ids" not in tables:
+        return None  # Định dạng cũ (chưa lưu id) → build lại bằng build_cf_neighbors.py
+    n_users, n_items = len(tables["user_neighbors"]), len(tables["item_neighbors"])
+    if tables["user_neighbors"].shape[1] < min(user_k, n_users - 1) or \
+            tables["item_neighbors"].shape[1] < min(item_k, n_items - 1):
+        return None
+
+    user_neighbors, user_sims, missing_users = _remap_table(
+        tables["user_neighbors"], tables["user_sims"], tables["user_ids"], user_index, len(user_index), user_k)
+    item_neighbors, item_sims, missing_items = _remap_table(
+        tables["item_neighbors"], tables["item_sims"], tables["hotel_ids"], hotel_index, len(hotel_index), item_k)
+    return {
+        "user_neighbors": user_neighbors, "user_sims": user_sims,
+        "item_neighbors": item_neighbors, "item_sims": item_sims,
+        "missing_users": missing_users, "missing_items": missing_items,
+        "event_ids": set(tables["event_ids"].tolist()) if "event_ids" in tables else set(),
+    }
@@ -0,0 +1,280 @@
+# src/content_features.py
+# Content-based scoring dạng vector:
+# - HotelFeatures: ma trận đặc trưng hotel precompute 1 lần từ __homeStay.json
+#   (giá, location one-hot, amenity multi-hot đã dedupe, category one-hot)
+# - UserProfiles: vector sở thích dense theo user (location / category / amenity đã nhân trọng số signal, giá TB)
+# - content_scores(): điểm content cho mọi hotel bằng 1 biểu thức NumPy, giống hệt compute_content_score
+
+import numpy as np
+from scipy import sparse
+
+# Trọng số thành phần (đồng bộ với recommend.py)
+PRICE_WEIGHT = 0.3
+LOCATION_WEIGHT = 0.3
+AMENITY_WEIGHT = 0.2
+CATEGORY_WEIGHT = 0.2
+NEUTRAL_SCORE = 0.3  # Không đủ thông tin để so khớp → điểm trung tính
+
+
+def parse_location(address):
+    """'699 Đường Cần Thơ, Việt Nam' → 'Cần Thơ' ('' nếu không có ' Đường ')."""
+    address = address or ''
+    return address.split(' Đường ')[-1].split(',')[0] if ' Đường ' in address else ''
+
+
+class _Vocab:
+    def __init__(self, values=()):
+        self.index = {}
+        for v in values:
+            self.add(v)
+
+    def add(self, value):
+        return self.index.setdefault(value, len(self.index))
+
+    def get(self, value):
+        return self.index.get(value, -1)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class HotelFeatures:
+    """
+    Đặc trưng của 1 danh sách hotel, theo thứ tự list.
+    vocab=None → tự build từ chính list (catalogue); truyền vocab của catalogue để encode list khác
+    (giá trị lạ → -1, vẫn giữ cờ has_* như code gốc).
+    """
+
+    def __init__(self, hotels, vocabs=None):
+        build = vocabs is None
+        self.locations, self.categories, self.amenities = vocabs or (_Vocab(), _Vocab(), _Vocab())
+        encode = (lambda vocab, v: vocab.add(v)) if build else (lambda vocab, v: vocab.get(v))
+        n = len(hotels)
+
+        self.ids = [h.get('id') for h in hotels]
+        self.row_of = {hid: i for i, hid in enumerate(self.ids)}
+        self.price = np.zeros(n)
+        self.has_price = np.zeros(n, dtype=bool)
+        self.profile_price = np.zeros(n)   # h.get('price', 0) — dùng khi tính giá TB của user
+        self.loc_idx = np.full(n, -1, dtype=np.int64)
+        self.has_loc = np.zeros(n, dtype=bool)
+        self.cat_idx = np.full(n, -1, dtype=np.int64)
+        self.has_cat = np.zeros(n, dtype=bool)
+        self.amenity_count = np.zeros(n)   # Số amenity khác nhau (mẫu số overlap)
+        amen_rows, amen_cols, amen_list_rows, amen_list_cols = [], [], [], []
+
+        for i, h in enumerate(hotels):
+            if 'price' in h:
+                self.price[i] = h['price']
+                self.has_price[i] = True
+            self.profile_price[i] = h.get('price', 0)
+
+            location = parse_location(h.get('address', ''))
+            if location:
+                self.has_loc[i] = True
+                self.loc_idx[i] = encode(self.locations, location)
+
+            category = h.get('category', '')
+            if category:
+                self.has_cat[i] = True
+                self.cat_idx[i] = encode(self.categories, category)
+
+            amenities = h.get('amenities', []) or []
+            # Profile đếm theo list (kể cả trùng), overlap tính trên set
+            for a in amenities:
+                j = encode(self.amenities, a)
+                if j >= 0:
+                    amen_list_rows.append(i)
+                    amen_list_cols.append(j)
+            unique = set(amenities)
+            self.amenity_count[i] = len(unique)
+            for a in unique:
+                j = encode(self.amenities, a)
+                if j >= 0:
+                    amen_rows.append(i)
+                    amen_cols.append(j)
+
+        shape = (n, max(1, len(self.amenities)))
+        # Multi-hot (dedupe) cho phía hotel; ma trận đếm (giữ trùng lặp) cho phía profile
+        self.amenity_onehot = sparse.csr_matrix(
+            (np.ones(len(amen_rows)), (amen_rows, amen_cols)), shape=shape)
+        self.amenity_multi = sparse.csr_matrix(
+            (np.ones(len(amen_list_rows)), (amen_list_rows, amen_list_cols)), shape=shape)
+        self.has_amen = self.amenity_count > 0
+
+    @property
+    def vocabs(self):
+        return self.locations, self.categories, self.amenities
+
+    def __len__(self):
+        return len(self.ids)
+
+    def take(self, rows):
+        """Tập con theo hàng (cùng vocab) → chấm điểm content chỉ trên các hotel ứng viên."""
+        sub = object.__new__(HotelFeatures)
+        sub.locations, sub.categories, sub.amenities = self.vocabs
+        sub.ids = [self.ids[r] for r in rows.tolist()]
+        sub.row_of = {hid: i for i, hid in enumerate(sub.ids)}
+        for name in ("price", "has_price", "profile_price", "loc_idx", "has_loc", "cat_idx", "has_cat",
+                     "amenity_count", "has_amen"):
+            setattr(sub, name, getattr(self, name)[rows])
+        sub.amenity_onehot = self.amenity_onehot[rows]
+        sub.amenity_multi = self.amenity_multi[rows]
+        return sub
+
+    def one_hot(self, idx, size):
+        valid = idx >= 0
+        rows = np.nonzero(valid)[0]
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, idx[valid])), shape=(len(idx), max(1, size)))
+
+
+class UserProfiles:
+    """
+    Profile dạng vector cho mọi user, build 1 lần từ (user, hotel, weight) của interactions:
+      loc[u] = Σ w · onehot(location), cat[u] = Σ w · onehot(category), amen[u] = Σ w · amenities
+      avg_price[u] = giá TB các hotel đã tương tác; *_seen: key đã xuất hiện trong dict profile gốc.
+    """
+
+    def __init__(self, features, user_ids, hotel_ids, weights):
+        self.features = features
+        self.user_index = {}
+        user_codes = np.fromiter((self.user_index.setdefault(u, len(self.user_index)) for u in user_ids),
+                                 dtype=np.int64, count=len(user_ids))
+        n_users = len(self.user_index)
+        self.total_interactions = np.bincount(user_codes, minlength=n_users)
+
+        rows = np.fromiter((features.row_of.get(h, -1) for h in hotel_ids), dtype=np.int64, count=len(hotel_ids))
+        known = rows >= 0
+        user_codes, rows, weights = user_codes[known], rows[known], np.asarray(weights, dtype=np.float64)[known]
+        shape = (n_users, len(features))
+        W = sparse.csr_matrix((weights, (user_codes, rows)), shape=shape)          # Σ trọng số / (user, hotel)
+        N = sparse.csr_matrix((np.ones(len(rows)), (user_codes, rows)), shape=shape)  # Số event / (user, hotel)
+
+        loc_onehot = features.one_hot(features.loc_idx, len(features.locations))
+        cat_onehot = features.one_hot(features.cat_idx, len(features.categories))
+        self.loc = (W @ loc_onehot).toarray()
+        self.cat = (W @ cat_onehot).toarray()
+        self.amen = (W @ features.amenity_multi).toarray()
+        self.loc_seen = (N @ loc_onehot).toarray() > 0
+        self.cat_seen = (N @ cat_onehot).toarray() > 0
+        self.amen_seen = (N @ features.amenity_multi).toarray() > 0
+
+        self._n_events = np.asarray(N.sum(axis=1)).ravel()
+        self._price_sum = N @ features.profile_price
+        self.avg_price = np.divide(self._price_sum, self._n_events, out=np.zeros(n_users), where=self._n_events > 0)
+
+        self.loc_max = self._seen_max(self.loc, self.loc_seen)
+        self.cat_max = self._seen_max(self.cat, self.cat_seen)
+        self.amen_max = self._seen_max(self.amen, self.amen_seen)
+
+    @staticmethod
+    def _seen_max(values, seen):
+        """max(dict.values()) của profile gốc: chỉ tính trên key đã xuất hiện (NaN nếu dict rỗng)."""
+        masked = np.where(seen, values, -np.inf)
+        out = masked.max(axis=1) if values.shape[1] else np.full(len(values), -np.inf)
+        return np.where(np.isfinite(out), out, np.nan)
+
+    def has_user(self, user_id):
+        return user_id in self.user_index
+
+    _ROW_ARRAYS = ("loc", "cat", "amen", "loc_seen", "cat_seen", "amen_seen", "total_interactions",
+                   "_n_events", "_price_sum", "avg_price", "loc_max", "cat_max", "amen_max")
+
+    def _ensure_user(self, user_id):
+        u = self.user_index.get(user_id)
+        if u is not None:
+            return u
+        u = len(self.user_index)
+        if u >= len(self.loc):
+            # Tăng capacity x2 cho mọi mảng theo user (append khấu hao O(1))
+            capacity = max(16, 2 * len(self.loc))
+            for name in self._ROW_ARRAYS:
+                old = getattr(self, name)
+                fill = np.nan if name.endswith("_max") else 0
+                new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+        self.user_index[user_id] = u  # Publish sau khi mảng đủ chỗ: reader (không lock) thấy u thì hàng u đã có
+        return u
+
+    def add_event(self, user_id, hotel_id, weight):
+        """Cập nhật profile của 1 user với 1 event mới — O(số đặc trưng của hotel)."""
+        u = self._ensure_user(user_id)
+        self.total_interactions[u] += 1
+        f = self.features
+        row = f.row_of.get(hotel_id)
+        if row is None:
+            return u  # Hotel ngoài catalogue: chỉ tính vào total_interactions (như code gốc)
+
+        if f.loc_idx[row] >= 0:
+            self.loc[u, f.loc_idx[row]] += weight
+            self.loc_seen[u, f.loc_idx[row]] = True
+        if f.cat_idx[row] >= 0:
+            self.cat[u, f.cat_idx[row]] += weight
+            self.cat_seen[u, f.cat_idx[row]] = True
+        start, stop = f.amenity_multi.indptr[row], f.amenity_multi.indptr[row + 1]
+        cols, counts = f.amenity_multi.indices[start:stop], f.amenity_multi.data[start:stop]
+        self.amen[u, cols] += weight * counts
+        self.amen_seen[u, cols] = True
+
+        self._n_events[u] += 1
+        self._price_sum[u] += f.profile_price[row]
+        self.avg_price[u] = self._price_sum[u] / self._n_events[u]
+        for values, seen, out in ((self.loc, self.loc_seen, self.loc_max),
+                                  (self.cat, self.cat_seen, self.cat_max),
+                                  (self.amen, self.amen_seen, self.amen_max)):
+            out[u] = self._seen_max(values[u:u + 1], seen[u:u + 1])[0]
+        return u
+
+
+def _ratio(counts, denom):
+    """counts / max, max = 0 → 0 (code gốc sẽ ZeroDivisionError)."""
+    return np.divide(counts, denom, out=np.zeros_like(counts, dtype=np.float64), where=denom != 0)
+
+
+def content_scores(profiles, user_id, features=None):
+    """
+    Điểm content cho mọi hotel trong `features` (mặc định: catalogue của profiles).
+    Tương đương [compute_content_score(build_user_profile(user_id), h) for h in hotels].
+    """
+    return content_scores_many(profiles, [user_id], features)[0]
+
+
+def content_scores_many(profiles, user_ids, features=None):
+    """Như content_scores cho nhiều user 1 lần → ma trận (len(user_ids), số hotel); user lạ → 0.5."""
+    if features is None:
+        features = profiles.features
+    n = len(features)
+    codes = np.fromiter((profiles.user_index.get(u, -1) for u in user_ids), dtype=np.int64, count=len(user_ids))
+    scores = np.full((len(codes), n), 0.5)
+    known = codes >= 0
+    if not known.any():
+        return scores
+    u = codes[known]
+
+    # Price match
+    avg_price = profiles.avg_price[u][:, None]
+    hotel_price = np.where(features.has_price, features.price, avg_price)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.minimum(avg_price, hotel_price) / np.maximum(avg_price, hotel_price) * PRICE_WEIGHT
+    price = np.where(avg_price > 0, ratio, 0.5 * PRICE_WEIGHT)
+
+    # Location match (idx -1 = location lạ → cột 0 thêm vào cuối)
+    loc_w = np.hstack([profiles.loc[u], np.zeros((len(u), 1))])
+    loc_on = profiles.loc_seen[u].any(axis=1)[:, None] & features.has_loc
+    loc = np.where(loc_on, _ratio(loc_w[:, features.loc_idx], profiles.loc_max[u][:, None]), NEUTRAL_SCORE)
+
+    # Amenity overlap
+    n_amen = features.amenity_onehot.shape[1]
+    overlap = (features.amenity_onehot @ profiles.amen[u][:, :n_amen].T).T
+    denom = features.amenity_count * profiles.amen_max[u][:, None]
+    amen_on = profiles.amen_seen[u].any(axis=1)[:, None] & features.has_amen
+    amen = np.where(amen_on, np.minimum(1.0, _ratio(overlap, denom)), NEUTRAL_SCORE)
+
+    # Category match
+    cat_w = np.hstack([profiles.cat[u], np.zeros((len(u), 1))])
+    cat_on = profiles.cat_seen[u].any(axis=1)[:, None] & features.has_cat
+    cat = np.where(cat_on, _ratio(cat_w[:, features.cat_idx], profiles.cat_max[u][:, None]), NEUTRAL_SCORE)
+
+    scores[known] = price + loc * LOCATION_WEIGHT + amen * AMENITY_WEIGHT + cat * CATEGORY_WEIGHT
+    return scores
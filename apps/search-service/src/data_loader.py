@@ -0,0 +1,324 @@
+# src/data_loader.py
+# Loader dùng chung cho train_svd.py / evaluate.py / generate_recommendations.py:
+# - Stream file JSON (mảng top-level hoặc NDJSON 1 object / dòng) → không dựng list dict của cả file:
+#   ijson nếu đã cài, không thì json.JSONDecoder.raw_decode theo từng chunk
+# - Cột typed: user (int32, dictionary-encoded), hotel (int32, dictionary-encoded), type (int8),
+#   timestamp (datetime64[s]), rating (float32, NaN = không có)
+# - Cache .npz theo hash nội dung file nguồn (jsons/.cache) → lần chạy sau (script nào cũng vậy) bỏ qua bước parse
+# - merge_ratings: implicit (theo trọng số) + explicit (ghi đè cùng cặp user–hotel), vector hóa
+# - load_interactions(..., live_path): cộng event realtime (src/live_log.py) chưa có trong export, dedupe theo id
+
+import os
+import json
+import hashlib
+import numpy as np
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR", os.path.join(BASE_DIR, "jsons", ".cache"))  # Không phụ thuộc cwd
+DATA_CACHE_ENABLED = os.getenv("DATA_CACHE_ENABLED", "1") == "1"
+CACHE_SCHEMA = 2            # Tăng khi đổi định dạng cột → cache cũ tự bị bỏ qua
+READ_CHUNK = 1 << 20
+
+# Cột → field JSON
+INTERACTION_FIELDS = {"user": "userId", "hotel": "hotelId", "type": "type", "timestamp": "timestamp", "rating": "rating",
+                      "id": "id"}
+REVIEW_FIELDS = {"user": "userId", "hotel": "hotelId", "rating": "rating", "timestamp": "createdAt"}
+DICTIONARY_DTYPES = {"user": np.int32, "hotel": np.int32, "type": np.int8}
+
+
+# ---------------------------------------------------------
+# STREAMING PARSE
+# ---------------------------------------------------------
+def _iter_raw_decode(f):
+    """Object JSON lần lượt từ mảng top-level hoặc NDJSON, đọc theo chunk."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    while True:
+        # Bỏ khoảng trắng / dấu phân cách mảng
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                return
+            buffer, pos = f.read(READ_CHUNK), 0
+            eof = not buffer
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(READ_CHUNK)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield obj
+        pos = end
+
+
+def iter_records(path):
+    """Stream từng record (dict) của file JSON / NDJSON."""
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+    if ijson is None:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from _iter_raw_decode(f)
+        return
+
+    with open(path, "rb") as f:
+        head = f.read(64).lstrip()[:1]
+        f.seek(0)
+        if head == b"[":
+            yield from ijson.items(f, "item", use_float=True)
+        else:
+            yield from ijson.items(f, "", multiple_values=True, use_float=True)
+
+
+# ---------------------------------------------------------
+# CỘT
+# ---------------------------------------------------------
+class ColumnarData:
+    """
+    columns[name]: mảng cùng độ dài (user / hotel / type là mã; timestamp; rating).
+    dictionaries[name]: giá trị thật của mã (user → str, hotel → int64, type → str).
+    """
+
+    def __init__(self, columns, dictionaries, source=None):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.source = source
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def values(self, name):
+        """Cột đã giải mã (user → mảng str, hotel → int64, ...)."""
+        if name in self.dictionaries:
+            return self.dictionaries[name][self.columns[name]]
+        return self.columns[name]
+
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **{f"col_{k}": v for k, v in self.columns.items()},
+                 **{f"dict_{k}": v for k, v in self.dictionaries.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, source=None):
+        with np.load(path, allow_pickle=False) as data:
+            columns = {k[4:]: data[k] for k in data.files if k.startswith("col_")}
+            dictionaries = {k[5:]: data[k] for k in data.files if k.startswith("dict_")}
+        return cls(columns, dictionaries, source)
+
+
+def _parse_timestamps(values):
+    try:
+        return np.array([v or None for v in values], dtype="datetime64[s]")
+    except (ValueError, TypeError):
+        out = np.full(len(values), np.datetime64("NaT", "s"), dtype="datetime64[s]")
+        for i, v in enumerate(values):
+            try:
+                out[i] = np.datetime64(str(v).replace("Z", ""), "s")
+            except (ValueError, TypeError):
+                pass
+        return out
+
+
+def _id_hash(value):
+    """id event → int64 (blake2b 8 byte) để dedupe; 0 = không có id."""
+    if value in (None, ""):
+        return 0
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def _build_columns(records, fields):
+    """Record → cột typed; record thiếu user / hotel bị bỏ qua."""
+    codes = {name: [] for name in DICTIONARY_DTYPES if name in fields}
+    lookups = {name: {} for name in codes}
+    raw = {name: [] for name in fields if name not in codes}
+    for rec in records:
+        if rec.get(fields["user"]) in (None, "") or rec.get(fields["hotel"]) is None:
+            continue
+        for name, lookup in lookups.items():
+            value = rec.get(fields[name])
+            if name == "hotel":
+                value = int(value)
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes[name].append(code)
+        for name, values in raw.items():
+            values.append(rec.get(fields[name]))
+
+    columns, dictionaries = {}, {}
+    for name, lookup in lookups.items():
+        columns[name] = np.asarray(codes[name], dtype=DICTIONARY_DTYPES[name])
+        keys = list(lookup)
+        if name == "hotel":
+            # Dictionary hotel sắp tăng dần → mã hotel so sánh được giữa các file cùng tập id
+            ids = np.asarray(keys, dtype=np.int64)
+            order = np.argsort(ids, kind="stable")
+            remap = np.empty(len(ids), dtype=DICTIONARY_DTYPES[name])
+            remap[order] = np.arange(len(ids))
+            columns[name] = remap[columns[name]] if len(ids) else columns[name]
+            dictionaries[name] = ids[order]
+        else:
+            dictionaries[name] = np.asarray([str(k) for k in keys])
+    if "timestamp" in raw:
+        columns["timestamp"] = _parse_timestamps(raw["timestamp"])
+    if "rating" in raw:
+        columns["rating"] = np.array([np.nan if v is None else float(v) for v in raw["rating"]], dtype=np.float32)
+    if "id" in raw:
+        columns["id"] = np.array([_id_hash(v) for v in raw["id"]], dtype=np.int64)
+    return columns, dictionaries
+
+
+def _concat(a, b):
+    """Nối 2 ColumnarData cùng cột; mã dictionary của b được map sang dictionary chung."""
+    columns, dictionaries = {}, {}
+    for name, col in a.columns.items():
+        if name not in a.dictionaries:
+            columns[name] = np.concatenate([col, b.columns[name]])
+            continue
+        a_dict, b_dict = a.dictionaries[name], b.dictionaries[name]
+        if name == "hotel":
+            merged = np.union1d(a_dict, b_dict)  # Giữ dictionary hotel sắp tăng dần
+            a_codes = np.searchsorted(merged, a_dict)[col] if len(a_dict) else col
+        else:
+            merged = np.concatenate([a_dict, b_dict[~np.isin(b_dict, a_dict)]])
+            a_codes = col
+        lookup = {v: i for i, v in enumerate(merged.tolist())}
+        b_remap = np.array([lookup[v] for v in b_dict.tolist()], dtype=np.int64)
+        b_codes = b_remap[b.columns[name]] if len(b_dict) else b.columns[name]
+        columns[name] = np.concatenate([a_codes, b_codes]).astype(DICTIONARY_DTYPES[name])
+        dictionaries[name] = merged
+    return ColumnarData(columns, dictionaries, a.source)
+
+
+# ---------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_path(path, kind, digest):
+    base = os.path.splitext(os.path.basename(path))[0].lstrip("_")
+    return os.path.join(DATA_CACHE_DIR, f"{base}-{kind}-v{CACHE_SCHEMA}-{digest}.npz")
+
+
+def load_columns(path, fields, kind):
+    """Cột của file `path` (None nếu file không tồn tại), qua cache .npz theo hash nội dung."""
+    if not os.path.exists(path):
+        return None
+    if not DATA_CACHE_ENABLED:
+        return ColumnarData(*_build_columns(iter_records(path), fields), source=path)
+
+    cache = _cache_path(path, kind, file_hash(path))
+    if os.path.exists(cache):
+        try:
+            return ColumnarData.load(cache, source=path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ [DataLoader] Cache hỏng {cache}: {e} → parse lại")
+
+    data = ColumnarData(*_build_columns(iter_records(path), fields), source=path)
+    try:
+        os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+        prefix = os.path.basename(cache).rsplit("-", 1)[0] + "-"
+        for name in os.listdir(DATA_CACHE_DIR):
+            if name.startswith(prefix) and name.endswith(".npz"):
+                os.remove(os.path.join(DATA_CACHE_DIR, name))  # Bản cache của nội dung cũ
+        data.save(cache)
+    except OSError as e:
+        print(f"⚠️ [DataLoader] Không ghi được cache: {e}")
+    return data
+
+
+def load_interactions(path, live_path=None):
+    """
+    live_path: log NDJSON của src/live_log.py — nối thêm event chưa có trong `path` (so theo id, mỗi id 1 lần).
+    Log live không qua cache .npz (đã được compact ở mỗi lần retrain nên nhỏ).
+    """
+    data = load_columns(path, INTERACTION_FIELDS, "interactions")
+    if live_path is None:
+        return data
+    from src.live_log import read, pending
+    events = pending(read(live_path))
+    if not events:
+        return data
+    live = ColumnarData(*_build_columns(events, INTERACTION_FIELDS), source=live_path)
+    if data is None or not len(data):
+        return live
+    keep = (live["id"] == 0) | ~np.isin(live["id"], data["id"])
+    print(f"   📥 [DataLoader] Live log: {int(keep.sum())}/{len(live)} events chưa có trong {os.path.basename(path)}")
+    if not keep.any():
+        return data
+    live = ColumnarData({k: v[keep] for k, v in live.columns.items()}, live.dictionaries, live_path)
+    return _concat(data, live)
+
+
+def load_reviews(path):
+    return load_columns(path, REVIEW_FIELDS, "reviews")
+
+
+# ---------------------------------------------------------
+# MERGE IMPLICIT + EXPLICIT
+# ---------------------------------------------------------
+def merge_ratings(interactions, reviews, signal_weights, skip_empty_rating=False):
+    """
+    1 điểm / cặp (user, hotel): implicit = trọng số signal (type lạ bị bỏ), explicit (review rating) ghi đè.
+    Giống vòng lặp dict cũ: cặp giữ vị trí lần xuất hiện ĐẦU, giá trị của lần xuất hiện CUỐI.
+    Review không có rating (NaN) luôn bị bỏ — không để NaN lọt vào trainset.
+    skip_empty_rating: bỏ thêm review rating 0 (generate_recommendations.py).
+    Trả về (user_ids: mảng str, hotel_ids: int64, scores: float64, explicit: bool).
+    """
+    users, hotels, scores, explicit = [], [], [], []
+    if interactions is not None and len(interactions):
+        types = interactions.dictionaries["type"]
+        type_weight = np.array([signal_weights.get(t, np.nan) for t in types], dtype=np.float64)
+        w = type_weight[interactions["type"]]
+        known = ~np.isnan(w)
+        users.append(interactions.values("user")[known])
+        hotels.append(interactions.values("hotel")[known])
+        scores.append(w[known])
+        explicit.append(np.zeros(int(known.sum()), dtype=bool))
+    if reviews is not None and len(reviews):
+        rating = reviews["rating"].astype(np.float64)
+        keep = ~np.isnan(rating)
+        if skip_empty_rating:
+            keep &= rating != 0
+        users.append(reviews.values("user")[keep])
+        hotels.append(reviews.values("hotel")[keep])
+        scores.append(rating[keep])
+        explicit.append(np.ones(int(keep.sum()), dtype=bool))
+    if not users:
+        return np.empty(0, dtype=str), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=bool)
+
+    users = np.concatenate(users)
+    hotels = np.concatenate(hotels)
+    scores = np.concatenate(scores)
+    explicit = np.concatenate(explicit)
+
+    user_dict, user_codes = np.unique(users, return_inverse=True)
+    hotel_dict, hotel_codes = np.unique(hotels, return_inverse=True)
+    keys = user_codes.astype(np.int64) * len(hotel_dict) + hotel_codes
+    _, first = np.unique(keys, return_index=True)
+    _, last_rev = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - last_rev
+    order = np.argsort(first, kind="stable")
+    first, last = first[order], last[order]
+    return users[first], hotels[first], scores[last], explicit[last]
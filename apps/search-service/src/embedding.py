@@ -1,19 +1,21 @@
-from sentence_transformers import SentenceTransformer
 from PIL import Image
 import requests
 from io import BytesIO
+from src.model_registry import encode_image
+from src.embedding_cache import cached_text_vector
 
-# Load model CLIP
-model = SentenceTransformer("clip-ViT-B-32")
+
+def fetch_image(url: str):
+    """Tải ảnh từ URL → PIL.Image (RGB)"""
+    response = requests.get(url, timeout=10)
+    return Image.open(BytesIO(response.content)).convert("RGB")
 
 
 def get_image_vector(url: str):
     """Tải ảnh từ URL và chuyển thành vector"""
-    response = requests.get(url, timeout=10)
-    img = Image.open(BytesIO(response.content))
-    return model.encode(img).tolist()
+    return encode_image(fetch_image(url)).tolist()
 
 
 def get_text_vector(text: str):
     """Chuyển mô tả văn bản thành vector (cho search bằng chữ)"""
-    return model.encode(text).tolist()
+    return cached_text_vector(text).tolist()
@@ -0,0 +1,196 @@
+# src/embedding_cache.py
+# Cache embedding cho text query (search-by-text, agent semantic_query, FAQ):
+# - Tier 1: LRU trong process (float32, giới hạn số phần tử)
+# - Tier 2 (tùy chọn): Redis, vector lưu dạng bytes float16 thô + TTL → dùng chung giữa các worker
+# Key = text đã chuẩn hóa (NFC, lowercase, gộp khoảng trắng) + tên model; thứ được encode vẫn là text gốc
+# (lần đầu gặp key) → vector của model cased không bị đổi so với encode trực tiếp.
+# Redis lỗi / không chạy → tự tắt tier 2 một lúc, không làm hỏng request.
+
+import os
+import time
+import hashlib
+import unicodedata
+import numpy as np
+from src.utils.lru import LRUCache
+from src.model_registry import encode_text, CLIP_MODEL
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+EMB_CACHE_SIZE = int(os.getenv("EMB_CACHE_SIZE", 10000))             # ~20MB với vector 512 float32
+EMB_CACHE_REDIS = os.getenv("EMB_CACHE_REDIS", "1") == "1"
+EMB_CACHE_TTL = int(os.getenv("EMB_CACHE_TTL", 7 * 24 * 3600))       # 7 ngày
+EMB_CACHE_REDIS_RETRY = float(os.getenv("EMB_CACHE_REDIS_RETRY", 30))  # Redis lỗi → tắt tier 2 trong N giây
+REDIS_KEY_PREFIX = "emb"
+
+
+def normalize_text(text):
+    """'  Villa  ven BIỂN ' → 'villa ven biển' (NFC để 'ể' dựng sẵn / tổ hợp ra cùng key)."""
+    return " ".join(unicodedata.normalize("NFC", str(text)).lower().split())
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, max_items=EMB_CACHE_SIZE, use_redis=EMB_CACHE_REDIS, ttl=EMB_CACHE_TTL):
+        self.model_name = model_name
+        self.memory = LRUCache(max_items)
+        self.use_redis = use_redis
+        self.ttl = ttl
+        self._redis = None
+        self._redis_down_until = 0.0
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+        self.encoded = 0
+
+    # ---------- Redis tier ----------
+    def _redis_key(self, norm):
+        digest = hashlib.sha1(norm.encode("utf-8")).hexdigest()
+        return f"{REDIS_KEY_PREFIX}:{self.model_name}:{digest}"
+
+    def _get_redis(self):
+        if not self.use_redis or time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            try:
+                from src.utils.redis_client import get_redis_binary_client
+                self._redis = get_redis_binary_client()
+            except Exception as e:
+                self._redis_failed(e)
+                return None
+        return self._redis
+
+    def _redis_failed(self, error):
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + EMB_CACHE_REDIS_RETRY
+        print(f"⚠️ [EmbCache] Redis không khả dụng ({error}), tắt tier 2 trong {EMB_CACHE_REDIS_RETRY:.0f}s")
+
+    def _redis_get_many(self, norms):
+        client = self._get_redis()
+        if client is None:
+            return [None] * len(norms)
+        try:
+            raw = client.mget([self._redis_key(n) for n in norms])
+        except Exception as e:
+            self._redis_failed(e)
+            return [None] * len(norms)
+        vectors = []
+        for blob in raw:
+            if blob:
+                self.redis_hits += 1
+                vectors.append(np.frombuffer(blob, dtype=np.float16).astype(np.float32))
+            else:
+                self.redis_misses += 1
+                vectors.append(None)
+        return vectors
+
+    def _redis_put_many(self, norms, vectors):
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for norm, vec in zip(norms, vectors):
+                pipe.set(self._redis_key(norm), np.asarray(vec, dtype=np.float16).tobytes(), ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    # ---------- API ----------
+    def lookup_many(self, texts):
+        """Trả về (norms, vectors) — vectors[i] = None nếu miss cả 2 tier."""
+        norms = [normalize_text(t) for t in texts]
+        vectors = [self.memory.get(n) for n in norms]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            for i, vec in zip(missing, self._redis_get_many([norms[i] for i in missing])):
+                if vec is not None:
+                    self.memory.put(norms[i], vec)
+                    vectors[i] = vec
+        return norms, vectors
+
+    def store_many(self, norms, vectors):
+        vectors = [np.asarray(v, dtype=np.float32) for v in vectors]
+        for norm, vec in zip(norms, vectors):
+            self.memory.put(norm, vec)
+        self._redis_put_many(norms, vectors)
+        return vectors
+
+    def get_many(self, texts, encode_fn=None):
+        """Vector cho list text; chỉ encode (1 batch) những text miss cả 2 tier."""
+        encode_fn = encode_fn or (lambda items: encode_text(items, model_name=self.model_name))
+        texts = list(texts)
+        norms, vectors = self.lookup_many(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # Dedupe: cùng 1 key lặp lại trong batch chỉ encode 1 lần — encode text GỐC gặp đầu tiên của key
+            # (model cased như distiluse / CLIP cho vector khác nếu encode bản đã lowercase)
+            first_text = {}
+            for i in missing:
+                first_text.setdefault(norms[i], texts[i])
+            unique = list(first_text)
+            encoded = dict(zip(unique, self.store_many(unique, encode_fn(list(first_text.values())))))
+            self.encoded += len(unique)
+            for i in missing:
+                vectors[i] = encoded[norms[i]]
+        return vectors
+
+    def get(self, text):
+        return self.get_many([text])[0]
+
+    async def aget(self, text, encode_async):
+        """Bản async cho main.py: Redis đi qua io_executor, encode qua micro-batcher."""
+        from src.executors import run_io
+        norm = normalize_text(text)
+        vec = self.memory.get(norm)
+        if vec is not None:
+            return vec
+        (vec,) = await run_io(self._redis_get_many, [norm])
+        if vec is not None:
+            self.memory.put(norm, vec)
+            return vec
+        vec = await encode_async(text)  # Key chuẩn hóa, nhưng encode đúng text người dùng gửi
+        self.encoded += 1
+        (vec,) = await run_io(self.store_many, [norm], [vec])
+        return vec
+
+    def stats(self):
+        memory = self.memory.stats()
+        redis_total = self.redis_hits + self.redis_misses
+        # Tổng: tính trên số lookup ở tier 1 (mỗi lookup hoặc trúng RAM, trúng Redis, hoặc phải encode)
+        lookups = memory["hits"] + memory["misses"]
+        return {
+            "memory": memory,
+            "redis": {
+                "enabled": self.use_redis,
+                "available": self.use_redis and time.monotonic() >= self._redis_down_until,
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "errors": self.redis_errors,
+                "hit_ratio": round(self.redis_hits / redis_total, 4) if redis_total else 0.0,
+            },
+            "encoded": self.encoded,
+            "overall_hit_ratio": round((memory["hits"] + self.redis_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_caches = {}
+
+
+def get_embedding_cache(model_name=CLIP_MODEL):
+    cache = _caches.get(model_name)
+    if cache is None:
+        cache = _caches.setdefault(model_name, EmbeddingCache(model_name))
+    return cache
+
+
+def cached_text_vector(text, model_name=CLIP_MODEL):
+    return get_embedding_cache(model_name).get(text)
+
+
+def cached_text_vectors(texts, model_name=CLIP_MODEL):
+    return get_embedding_cache(model_name).get_many(texts)
+
+
+def embedding_cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
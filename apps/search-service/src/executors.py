@@ -0,0 +1,163 @@
+# src/executors.py
+# Executor layer: đẩy việc blocking (HTTP, psycopg2, Groq, CLIP) ra khỏi asyncio event loop.
+# - io_executor: thread pool cho I/O (download ảnh, DB, LLM API, recommend)
+# - inference_executor: thread riêng cho model (torch nhả GIL khi forward; dùng process pool
+#   sẽ nhân đôi RAM model mỗi process nên không dùng)
+# - EndpointLimiter: giới hạn số request đồng thời + độ dài hàng đợi cho từng endpoint
+
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+IO_WORKERS = int(os.getenv("IO_WORKERS", 16))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 1))
+
+# name: (max đồng thời, max đang chờ) — override: LIMIT_<NAME>_CONCURRENCY / LIMIT_<NAME>_QUEUE
+DEFAULT_LIMITS = {
+    "search": (8, 64),
+    "recommend": (16, 128),
+    "agent_chat": (4, 32),
+    "admin_chat": (2, 16),
+    "ingest": (8, 256),
+}
+
+
+class TrackedExecutor:
+    """
+    ThreadPoolExecutor + đếm số job đang chờ / đang chạy (queue depth).
+    Có .submit() nên dùng được với loop.run_in_executor (vd: MicroBatcher).
+    """
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.max_pending = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        future = self.executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, _):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+        }
+
+
+io_executor = TrackedExecutor("io", IO_WORKERS)
+inference_executor = TrackedExecutor("inference", INFERENCE_WORKERS)
+
+
+async def run_io(fn, *args, **kwargs):
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+async def run_inference(fn, *args, **kwargs):
+    return await inference_executor.run(fn, *args, **kwargs)
+
+
+# ---------------------------------------------------------
+# PER-ENDPOINT CONCURRENCY LIMITS
+# ---------------------------------------------------------
+class EndpointOverloaded(Exception):
+    """Hàng đợi endpoint đã đầy → main.py trả 503."""
+
+
+class EndpointLimiter:
+    def __init__(self, name, max_concurrent, max_queue):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise EndpointOverloaded(f"Endpoint '{self.name}' quá tải, thử lại sau.")
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+def _make_limiter(name, default):
+    prefix = f"LIMIT_{name.upper()}"
+    return EndpointLimiter(
+        name,
+        int(os.getenv(f"{prefix}_CONCURRENCY", default[0])),
+        int(os.getenv(f"{prefix}_QUEUE", default[1])),
+    )
+
+
+_limiters = {name: _make_limiter(name, default) for name, default in DEFAULT_LIMITS.items()}
+
+
+def limit(name):
+    """async with limit("search"): ..."""
+    if name not in _limiters:
+        _limiters[name] = _make_limiter(name, (8, 64))
+    return _limiters[name].acquire()
+
+
+def executor_stats():
+    return {
+        "executors": {e.name: e.stats() for e in (io_executor, inference_executor)},
+        "endpoints": {name: lim.stats() for name, lim in _limiters.items()},
+    }
+
+
+def shutdown_executors():
+    io_executor.shutdown()
+    inference_executor.shutdown()
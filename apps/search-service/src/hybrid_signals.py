@@ -0,0 +1,120 @@
+# src/hybrid_signals.py
+# Vector điểm theo hotel cho strategy 'hybrid' (4 pillars), build 1 lần rồi cập nhật tăng dần:
+# - Sentiment: trung bình aspect sentiment (explicitSentiments trong __reviews.json, POSITIVE=1 / NEUTRAL=0.5 /
+#   NEGATIVE=0), làm mượt Bayes về NEUTRAL → hotel ít review không bị đẩy lên/xuống quá tay
+# - Popularity: rating TB Bayes (reviewStar × reviewCount của catalogue) + lượng interaction (log, chuẩn hóa theo max)
+# Review mới / interaction mới → chỉ cập nhật hàng của hotel đó.
+
+import os
+import numpy as np
+
+SENTIMENT_VALUES = {"POSITIVE": 1.0, "NEUTRAL": 0.5, "NEGATIVE": 0.0}
+NEUTRAL_SENTIMENT = 0.5
+SENTIMENT_PRIOR = float(os.getenv("SENTIMENT_PRIOR", 5))  # Số aspect "ảo" trung tính cộng thêm cho mỗi hotel
+RATING_PRIOR = float(os.getenv("RATING_PRIOR", 20))       # Số review "ảo" ở mức rating TB toàn catalogue
+RATING_SHARE = 0.5                                        # Popularity = 50% rating an toàn + 50% interaction
+
+
+def _review_key(review):
+    return review.get("id") or (review.get("userId"), review.get("hotelId"), review.get("createdAt"))
+
+
+class HotelSignals:
+    def __init__(self, hotels, reviews=(), interaction_popularity=None):
+        self.ids = [h.get("id") for h in hotels]
+        self.row_of = {hid: i for i, hid in enumerate(self.ids)}
+        n = len(hotels)
+
+        # Sentiment: Σ giá trị aspect và số aspect theo hotel
+        self._sent_sum = np.zeros(n)
+        self._sent_count = np.zeros(n)
+        self.seen_reviews = set()
+        for review in reviews:
+            self._add_review(review)
+        self.sentiment = self._smoothed_sentiment(slice(None))
+
+        # Rating an toàn: (Σ sao + prior·TB) / (số review + prior), về [0, 1]
+        stars = np.array([float(h.get("reviewStar", 0) or 0) for h in hotels])
+        counts = np.array([float(h.get("reviewCount", 0) or 0) for h in hotels])
+        mean_star = (stars * counts).sum() / counts.sum() if counts.sum() > 0 else 0.0
+        self.rating_score = (stars * counts + RATING_PRIOR * mean_star) / (counts + RATING_PRIOR) / 5.0
+
+        # Interaction: log1p(Σ trọng số dương), chuẩn hóa theo max
+        self._interactions = np.zeros(n)
+        for hid, value in (interaction_popularity or {}).items():
+            row = self.row_of.get(hid)
+            if row is not None:
+                self._interactions[row] = value
+        self._log_interactions = np.log1p(self._interactions)
+        self._log_max = float(self._log_interactions.max()) if n else 0.0
+        self.popularity = self._popularity(slice(None))
+
+        self._rows_for = None
+        self._rows = None
+
+    # ---------- Sentiment ----------
+    def _add_review(self, review):
+        key = _review_key(review)
+        row = self.row_of.get(review.get("hotelId"))
+        if key in self.seen_reviews or row is None:
+            return None
+        self.seen_reviews.add(key)
+        values = [SENTIMENT_VALUES[v] for v in (review.get("explicitSentiments") or {}).values()
+                  if v in SENTIMENT_VALUES]
+        self._sent_sum[row] += sum(values)
+        self._sent_count[row] += len(values)
+        return row
+
+    def _smoothed_sentiment(self, rows):
+        return ((self._sent_sum[rows] + SENTIMENT_PRIOR * NEUTRAL_SENTIMENT)
+                / (self._sent_count[rows] + SENTIMENT_PRIOR))
+
+    def add_reviews(self, reviews):
+        """Áp các review chưa thấy (theo id) → chỉ tính lại sentiment của hotel liên quan. Trả về số review mới."""
+        rows = [row for row in (self._add_review(r) for r in reviews) if row is not None]
+        if rows:
+            rows = np.unique(rows)
+            self.sentiment[rows] = self._smoothed_sentiment(rows)
+        return len(rows)
+
+    # ---------- Popularity ----------
+    def _popularity(self, rows):
+        interaction = self._log_interactions[rows] / self._log_max if self._log_max > 0 else 0.0
+        return RATING_SHARE * self.rating_score[rows] + (1 - RATING_SHARE) * interaction
+
+    def add_interaction(self, hotel_id, weight):
+        row = self.row_of.get(hotel_id)
+        if row is None or weight <= 0:
+            return
+        self._interactions[row] += weight
+        self._log_interactions[row] = np.log1p(self._interactions[row])
+        if self._log_interactions[row] > self._log_max:
+            # Max đổi → chuẩn hóa lại cả vector (hiếm: chỉ khi hotel đứng đầu tăng tiếp)
+            self._log_max = float(self._log_interactions[row])
+            self.popularity[:] = self._popularity(slice(None))
+        else:
+            self.popularity[row] = self._popularity(row)
+
+    # ---------- Theo list hotels ----------
+    def rows_for(self, hotels):
+        """Hàng của từng hotel trong catalogue (-1 = không có). Cache theo object list hotels."""
+        if self._rows_for is not hotels:
+            self._rows = np.fromiter((self.row_of.get(h.get("id"), -1) for h in hotels),
+                                     dtype=np.int64, count=len(hotels))
+            self._rows_for = hotels
+        return self._rows
+
+    def vectors_for(self, hotels):
+        """(sentiment, popularity) theo thứ tự list hotels; hotel lạ → sentiment trung tính, popularity 0."""
+        rows = self.rows_for(hotels)
+        known = rows >= 0
+        safe = np.maximum(rows, 0)
+        return (np.where(known, self.sentiment[safe], NEUTRAL_SENTIMENT),
+                np.where(known, self.popularity[safe], 0.0))
+
+    def stats(self):
+        return {
+            "hotels": len(self.ids),
+            "reviews": len(self.seen_reviews),
+            "hotels_with_sentiment": int((self._sent_count > 0).sum()),
+        }
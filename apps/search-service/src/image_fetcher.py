@@ -0,0 +1,158 @@
+# src/image_fetcher.py
+# Async image fetcher cho /search-by-image-url (và /search-by-base64):
+# - httpx.AsyncClient dùng chung (connection pool, keep-alive tới Cloudinary)
+# - Stream body, cắt ngay khi vượt IMAGE_MAX_BYTES
+# - Cache content-addressed: URL → sha256(bytes) → (thumbnail đã decode, embedding CLIP)
+#   Ảnh hot bỏ qua cả network lẫn CLIP; cùng 1 ảnh ở 2 URL khác nhau vẫn dùng chung embedding.
+
+import os
+import base64
+import hashlib
+from io import BytesIO
+from dataclasses import dataclass
+from typing import Any, Optional
+import httpx
+from PIL import Image
+from src.utils.lru import LRUCache
+from src.executors import run_io
+from src.batcher import encode_image_async
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))  # 10 MB
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", 10))
+IMAGE_MAX_CONNECTIONS = int(os.getenv("IMAGE_MAX_CONNECTIONS", 20))
+IMAGE_URL_CACHE_SIZE = int(os.getenv("IMAGE_URL_CACHE_SIZE", 4096))      # URL → hash (nhẹ)
+IMAGE_CONTENT_CACHE_SIZE = int(os.getenv("IMAGE_CONTENT_CACHE_SIZE", 512))  # hash → thumbnail + vector
+# CLIP resize cạnh ngắn về 224 rồi center-crop → giữ thumbnail ở cỡ này không đổi kết quả encode
+THUMBNAIL_MIN_SIDE = 224
+
+USER_AGENT = "Mozilla/5.0 (compatible; StazySearchService/1.0)"
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class CachedImage:
+    digest: str
+    thumbnail: Image.Image
+    embedding: Optional[Any] = None
+
+
+def _decode_thumbnail(img_bytes):
+    img = Image.open(BytesIO(img_bytes)).convert("RGB")
+    short_side = min(img.size)
+    if short_side > THUMBNAIL_MIN_SIDE:
+        scale = THUMBNAIL_MIN_SIDE / short_side
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BICUBIC)
+    return img
+
+
+class ImageFetcher:
+    def __init__(self, max_bytes=IMAGE_MAX_BYTES, timeout=IMAGE_FETCH_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._client = None
+        self.url_cache = LRUCache(IMAGE_URL_CACHE_SIZE)
+        self.content_cache = LRUCache(IMAGE_CONTENT_CACHE_SIZE)
+        self.downloads = 0
+        self.bytes_downloaded = 0
+        self.rejected_too_large = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=IMAGE_MAX_CONNECTIONS,
+                                    max_keepalive_connections=IMAGE_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _download(self, url):
+        async with self.client.stream("GET", url) as response:
+            response.raise_for_status()
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                self.rejected_too_large += 1
+                raise ImageTooLarge(f"Ảnh quá lớn ({int(declared)} bytes > {self.max_bytes})")
+
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > self.max_bytes:
+                    self.rejected_too_large += 1
+                    raise ImageTooLarge(f"Ảnh vượt quá {self.max_bytes} bytes")
+                chunks.append(chunk)
+
+        self.downloads += 1
+        self.bytes_downloaded += size
+        return b"".join(chunks)
+
+    async def _from_bytes(self, img_bytes):
+        digest = hashlib.sha256(img_bytes).hexdigest()
+        cached = self.content_cache.get(digest)
+        if cached is None:
+            thumbnail = await run_io(_decode_thumbnail, img_bytes)
+            cached = CachedImage(digest=digest, thumbnail=thumbnail)
+            self.content_cache.put(digest, cached)
+        return cached
+
+    async def fetch(self, url) -> CachedImage:
+        """Ảnh theo URL: cache hit → không gọi network."""
+        digest = self.url_cache.get(url)
+        if digest is not None:
+            cached = self.content_cache.get(digest)
+            if cached is not None:
+                return cached
+
+        img_bytes = await self._download(url)
+        cached = await self._from_bytes(img_bytes)
+        self.url_cache.put(url, cached.digest)
+        return cached
+
+    async def _embed(self, cached: CachedImage):
+        if cached.embedding is None:
+            cached.embedding = await encode_image_async(cached.thumbnail)
+        return cached.embedding
+
+    async def embed_url(self, url):
+        return await self._embed(await self.fetch(url))
+
+    async def embed_bytes(self, img_bytes):
+        """Cho ảnh upload (base64): cache theo hash nội dung."""
+        if len(img_bytes) > self.max_bytes:
+            self.rejected_too_large += 1
+            raise ImageTooLarge(f"Ảnh vượt quá {self.max_bytes} bytes")
+        return await self._embed(await self._from_bytes(img_bytes))
+
+    async def embed_base64(self, base64_str):
+        """Ảnh upload dạng base64: chặn theo kích thước ước tính TRƯỚC khi decode, decode trong thread pool."""
+        if len(base64_str) * 3 // 4 > self.max_bytes:
+            self.rejected_too_large += 1
+            raise ImageTooLarge(f"Ảnh vượt quá {self.max_bytes} bytes")
+        img_bytes = await run_io(base64.b64decode, base64_str)
+        return await self.embed_bytes(img_bytes)
+
+    def stats(self):
+        return {
+            "max_bytes": self.max_bytes,
+            "downloads": self.downloads,
+            "bytes_downloaded": self.bytes_downloaded,
+            "rejected_too_large": self.rejected_too_large,
+            "url_cache": self.url_cache.stats(),
+            "content_cache": self.content_cache.stats(),
+        }
+
+
+image_fetcher = ImageFetcher()
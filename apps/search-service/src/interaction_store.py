@@ -0,0 +1,291 @@
+# src/interaction_store.py
+# Interaction store dạng cột: build 1 lần lúc load __interactions.json
+# - Cột: user (int32 code), hotel (int64 id), type (int8 code), timestamp (datetime64[s]), weight (float32)
+# - Nhóm sẵn theo user và theo hotel (offsets kiểu CSR) → lịch sử 1 user / 1 hotel lấy O(1) + O(số event)
+#   thay vì quét toàn bộ list interactions mỗi request.
+
+import numpy as np
+from collections import defaultdict
+from typing import NamedTuple
+
+# Implicit signal → điểm (đồng bộ với train_svd.py / evaluate.py)
+SIGNAL_WEIGHTS = {
+    "VIEW": 0.5,
+    "CLICK_BOOK_NOW": 2.0,
+    "ADD_TO_WISHLIST": 3.0,
+    "RATE_POSITIVE": 4.5,
+    "BOOK": 5.0,
+    "RATE_NEGATIVE": -3.0,
+}
+UNKNOWN_TYPE_WEIGHT = 1.0  # Type lạ: build_user_profile gốc dùng weight_map.get(type, 1.0)
+
+
+def _parse_timestamps(values):
+    try:
+        return np.array(values, dtype="datetime64[s]")
+    except (ValueError, TypeError):
+        out = np.full(len(values), np.datetime64("NaT", "s"), dtype="datetime64[s]")
+        for i, v in enumerate(values):
+            try:
+                out[i] = np.datetime64(str(v).replace("Z", ""), "s")
+            except (ValueError, TypeError):
+                pass
+        return out
+
+
+def _hotel_id(inter):
+    """hotelId dạng int, None nếu thiếu / không phải số nguyên (dòng đó bị bỏ qua)."""
+    try:
+        return int(inter.get('hotelId'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _group(codes, n_groups):
+    """order: chỉ số event sắp theo nhóm (ổn định theo thứ tự gốc); offsets[g]:offsets[g+1] = event của nhóm g."""
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=n_groups)
+    offsets = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return order, offsets
+
+
+class _Columns(NamedTuple):
+    """Buffer cột + số event hợp lệ: đổi cùng nhau trong 1 phép gán."""
+    user: np.ndarray
+    type: np.ndarray
+    hotel: np.ndarray
+    ts: np.ndarray
+    n: int
+
+
+class _Groups(NamedTuple):
+    hotel_list: np.ndarray
+    hotel_index: dict
+    user_order: np.ndarray
+    user_offsets: np.ndarray
+    n_grouped_users: int
+    hotel_order: np.ndarray
+    hotel_offsets: np.ndarray
+    new_by_user: defaultdict
+    new_by_hotel: defaultdict
+
+
+class InteractionStore:
+    """
+    Cột lưu trong buffer tăng dần (capacity x2) → append() O(1) khấu hao.
+    Nhóm theo user/hotel: phần base (offsets CSR) + phần mới (dict list chỉ số), gộp lại khi đủ COMPACT_EVERY event.
+    Ghi do caller tuần tự hóa; đọc không lock: buffer + n (_Columns) và kết quả nhóm (_Groups) là ảnh chụp
+    thay bằng 1 phép gán — cấp phát lại buffer / _regroup không làm hỏng reader đang giữ bản cũ.
+    """
+
+    COMPACT_EVERY = 5000
+
+    def __init__(self, interactions):
+        interactions = [inter for inter in interactions if _hotel_id(inter) is not None]
+        n = len(interactions)
+        self.users = []
+        self.user_index = {}
+        self.types = list(SIGNAL_WEIGHTS)
+        self.type_index = {t: i for i, t in enumerate(self.types)}
+
+        capacity = max(16, n)
+        user_buf = np.empty(capacity, dtype=np.int32)
+        type_buf = np.empty(capacity, dtype=np.int8)
+        hotel_buf = np.empty(capacity, dtype=np.int64)
+        ts_buf = np.full(capacity, np.datetime64("NaT", "s"), dtype="datetime64[s]")
+        timestamps = []
+        for i, inter in enumerate(interactions):
+            user_buf[i] = self._user_code(inter.get('userId'))
+            type_buf[i] = self._type_code(inter.get('type'))
+            hotel_buf[i] = _hotel_id(inter)
+            timestamps.append(inter.get('timestamp'))
+        ts_buf[:n] = _parse_timestamps(timestamps)
+        self._cols = _Columns(user_buf, type_buf, hotel_buf, ts_buf, n)
+        self._index()
+
+    @classmethod
+    def from_columns(cls, data):
+        """Store từ ColumnarData (src/data_loader.py) — dùng lại cột đã parse / cache .npz, không dựng list dict."""
+        store = cls([])
+        n = len(data) if data is not None else 0
+        if not n:
+            return store
+        store.users = data.dictionaries["user"].tolist()
+        store.user_index = {uid: code for code, uid in enumerate(store.users)}
+        type_remap = np.array([store._type_code(t) for t in data.dictionaries["type"].tolist()], dtype=np.int8)
+
+        capacity = max(16, n)
+        user_buf = np.empty(capacity, dtype=np.int32)
+        type_buf = np.empty(capacity, dtype=np.int8)
+        hotel_buf = np.empty(capacity, dtype=np.int64)
+        ts_buf = np.full(capacity, np.datetime64("NaT", "s"), dtype="datetime64[s]")
+        user_buf[:n] = data["user"]
+        type_buf[:n] = type_remap[data["type"]]
+        hotel_buf[:n] = data.values("hotel")
+        ts_buf[:n] = data["timestamp"]
+        store._cols = _Columns(user_buf, type_buf, hotel_buf, ts_buf, n)
+        store._index()
+        return store
+
+    def _index(self):
+        """Popularity + nhóm theo user / hotel từ cột đã có."""
+        n = len(self)
+        # Popularity: Σ trọng số dương + số event theo hotel (cập nhật khi append)
+        self.hotel_popularity = defaultdict(float)
+        self.hotel_event_count = defaultdict(int)
+        if n:
+            ids, inverse = np.unique(self.hotel_ids, return_inverse=True)
+            pop = np.bincount(inverse, weights=np.maximum(self.weights, 0.0), minlength=len(ids))
+            cnt = np.bincount(inverse, minlength=len(ids))
+            for hid, p, c in zip(ids.tolist(), pop.tolist(), cnt.tolist()):
+                self.hotel_popularity[hid] = p
+                self.hotel_event_count[hid] = c
+
+        self._regroup()
+
+    # ---------- Cột ----------
+    @property
+    def user_codes(self):
+        cols = self._cols
+        return cols.user[:cols.n]
+
+    @property
+    def type_codes(self):
+        cols = self._cols
+        return cols.type[:cols.n]
+
+    @property
+    def hotel_ids(self):
+        cols = self._cols
+        return cols.hotel[:cols.n]
+
+    @property
+    def timestamps(self):
+        cols = self._cols
+        return cols.ts[:cols.n]
+
+    @property
+    def type_weights(self):
+        return np.array([SIGNAL_WEIGHTS.get(t, UNKNOWN_TYPE_WEIGHT) for t in self.types], dtype=np.float64)
+
+    @property
+    def type_known(self):
+        """Type có trong SIGNAL_WEIGHTS hay không (user-item matrix chỉ lấy type đã biết)."""
+        return np.array([t in SIGNAL_WEIGHTS for t in self.types], dtype=bool)
+
+    @property
+    def weights(self):
+        return self.type_weights[self.type_codes]
+
+    def __len__(self):
+        return self._cols.n
+
+    def _user_code(self, uid):
+        code = self.user_index.get(uid)
+        if code is None:
+            code = len(self.users)
+            self.users.append(uid)  # List trước, index sau: reader thấy code thì users[code] đã có
+            self.user_index[uid] = code
+        return code
+
+    def _type_code(self, itype):
+        code = self.type_index.get(itype)
+        if code is None:
+            code = len(self.types)
+            self.types.append(itype)
+            self.type_index[itype] = code
+        return code
+
+    # ---------- Nhóm theo user / hotel ----------
+    def _regroup(self):
+        hotel_list, hotel_codes = np.unique(self.hotel_ids, return_inverse=True)
+        n_users = len(self.users)
+        user_order, user_offsets = _group(self.user_codes, n_users)
+        hotel_order, hotel_offsets = _group(hotel_codes, len(hotel_list))
+        self._groups = _Groups(
+            hotel_list=hotel_list,
+            hotel_index={h: i for i, h in enumerate(hotel_list.tolist())},
+            user_order=user_order, user_offsets=user_offsets, n_grouped_users=n_users,
+            hotel_order=hotel_order, hotel_offsets=hotel_offsets,
+            new_by_user=defaultdict(list), new_by_hotel=defaultdict(list),
+        )
+        self._n_new = 0
+
+    @property
+    def hotel_list(self):
+        return self._groups.hotel_list
+
+    @property
+    def hotel_index(self):
+        return self._groups.hotel_index
+
+    def _grouped(self, order, offsets, code, n_grouped, new_events):
+        base = order[offsets[code]:offsets[code + 1]] if code is not None and code < n_grouped else None
+        if not new_events:
+            return base if base is not None else np.empty(0, dtype=np.int64)
+        new = np.asarray(new_events, dtype=np.int64)
+        return new if base is None else np.concatenate([base, new])
+
+    def has_user(self, user_id):
+        return user_id in self.user_index
+
+    def user_events(self, user_id):
+        """Chỉ số event của user (theo thứ tự thời gian nhận)."""
+        code = self.user_index.get(user_id)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        g = self._groups
+        return self._grouped(g.user_order, g.user_offsets, code, g.n_grouped_users, g.new_by_user.get(code))
+
+    def hotel_events(self, hotel_id):
+        g = self._groups
+        return self._grouped(g.hotel_order, g.hotel_offsets, g.hotel_index.get(hotel_id),
+                             len(g.hotel_list), g.new_by_hotel.get(hotel_id))
+
+    def user_history(self, user_id):
+        """[(hotelId, type, timestamp), ...] của 1 user."""
+        idx = self.user_events(user_id)
+        cols = self._cols
+        return [(int(h), self.types[t], ts) for h, t, ts in
+                zip(cols.hotel[idx], cols.type[idx], cols.ts[idx])]
+
+    def column_users(self, idx=None):
+        codes = self.user_codes if idx is None else self.user_codes[idx]
+        return np.asarray(self.users, dtype=object)[codes]
+
+    # ---------- Ghi (caller giữ lock) ----------
+    def _writable(self, n):
+        """Buffer đủ chỗ cho n event; cấp phát lại thì trả về bản mới (chưa publish) → reader giữ bản cũ."""
+        cols = self._cols
+        if n <= len(cols.user):
+            return cols
+        capacity = max(n, 2 * len(cols.user))
+        grown = []
+        for buf in cols[:4]:
+            fill = np.datetime64("NaT", "s") if buf.dtype.kind == "M" else 0
+            new = np.full(capacity, fill, dtype=buf.dtype)
+            new[:cols.n] = buf[:cols.n]
+            grown.append(new)
+        return _Columns(*grown, cols.n)
+
+    def append(self, user_id, hotel_id, itype, timestamp=None):
+        """Thêm 1 event, trả về chỉ số event."""
+        cols = self._writable(self._cols.n + 1)
+        i = cols.n
+        code = self._user_code(user_id)
+        cols.user[i] = code  # Ô i nằm ngoài view đã publish (n = i) → reader chưa thấy
+        cols.type[i] = self._type_code(itype)
+        cols.hotel[i] = hotel_id
+        cols.ts[i] = _parse_timestamps([timestamp])[0] if timestamp is not None else np.datetime64("NaT", "s")
+        self._cols = cols._replace(n=i + 1)
+
+        self.hotel_popularity[hotel_id] += max(0.0, SIGNAL_WEIGHTS.get(itype, UNKNOWN_TYPE_WEIGHT))
+        self.hotel_event_count[hotel_id] += 1
+        g = self._groups
+        g.new_by_user[code].append(i)
+        g.new_by_hotel[hotel_id].append(i)
+        self._n_new += 1
+        if self._n_new >= self.COMPACT_EVERY:
+            self._regroup()
+        return i
@@ -0,0 +1,151 @@
+# src/live_ingest.py
+# Ingest interaction realtime (view / wishlist / booking...) cho recommend:
+# - POST /interactions → validate (gắn id) → ghi log NDJSON (src/live_log.py: replay khi restart, retrain đọc) → áp dụng
+# - Nhiều worker: nếu Redis stream consumer đang chạy, event được XADD vào stream và MỌI worker
+#   (kể cả worker nhận request) áp dụng qua consumer của mình → các worker thấy cùng dữ liệu.
+#   Không có Redis → áp dụng trực tiếp trong worker hiện tại.
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from src import recommend, live_log
+from src.interaction_store import SIGNAL_WEIGHTS
+from src.result_cache import recommendation_cache
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+INTERACTION_STREAM = os.getenv("INTERACTION_STREAM", "stazy:interactions")
+INTERACTION_STREAM_ENABLED = os.getenv("INTERACTION_STREAM_ENABLED", "0") == "1"
+INTERACTION_STREAM_MAXLEN = int(os.getenv("INTERACTION_STREAM_MAXLEN", 100000))
+INTERACTION_STREAM_BLOCK_MS = int(os.getenv("INTERACTION_STREAM_BLOCK_MS", 5000))
+
+
+class InvalidInteraction(ValueError):
+    pass
+
+
+def validate_event(raw):
+    """Chuẩn hóa 1 event: {id, userId, hotelId, type, timestamp} — raise InvalidInteraction nếu sai."""
+    if not isinstance(raw, dict):
+        raise InvalidInteraction("Event phải là object JSON")
+    user_id = raw.get("userId")
+    if not user_id or not isinstance(user_id, str):
+        raise InvalidInteraction("Thiếu userId")
+    try:
+        hotel_id = int(raw.get("hotelId"))
+    except (TypeError, ValueError):
+        raise InvalidInteraction("hotelId không hợp lệ")
+    itype = raw.get("type")
+    if itype not in SIGNAL_WEIGHTS:
+        raise InvalidInteraction(f"type phải là một trong {list(SIGNAL_WEIGHTS)}")
+    timestamp = raw.get("timestamp") or datetime.now().isoformat(timespec="seconds")
+    # id: dedupe với export __interactions.json khi event đã về DB (client gửi id của DB nếu có)
+    event_id = str(raw.get("id") or live_log.new_event_id())
+    return {"id": event_id, "userId": user_id, "hotelId": hotel_id, "type": itype, "timestamp": str(timestamp)}
+
+
+def apply_events(events):
+    for event in events:
+        recommend.record_interaction(event["userId"], event["hotelId"], event["type"], event["timestamp"])
+    return len(events)
+
+
+# ---------------------------------------------------------
+# REDIS STREAM CONSUMER
+# ---------------------------------------------------------
+class StreamConsumer:
+    """XREAD (không consumer group) → mỗi worker nhận đủ mọi event, bắt đầu từ event mới ('$')."""
+
+    def __init__(self, stream=INTERACTION_STREAM):
+        self.stream = stream
+        self.last_id = "$"
+        self.applied = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="interaction-stream", daemon=True)
+        self._thread.start()
+        print(f"✅ [Ingest] Listening on Redis stream '{self.stream}'")
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self, events):
+        from src.utils.redis_client import get_redis_client
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream, {"event": json.dumps(event, ensure_ascii=False)},
+                      maxlen=INTERACTION_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+
+    def _run(self):
+        from src.utils.redis_client import get_redis_client
+        client = get_redis_client()
+        recommend.prepare_live_state()
+        while not self._stop.is_set():
+            try:
+                response = client.xread({self.stream: self.last_id}, block=INTERACTION_STREAM_BLOCK_MS, count=500)
+                for _, messages in response or []:
+                    events = []
+                    for message_id, fields in messages:
+                        self.last_id = message_id
+                        try:
+                            events.append(validate_event(json.loads(fields.get("event", "{}"))))
+                        except (ValueError, InvalidInteraction):
+                            self.errors += 1
+                    self.applied += apply_events(events)
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ [Ingest] Stream error: {e}")
+                self._stop.wait(2)
+
+    def stats(self):
+        return {"stream": self.stream, "running": self.running, "applied": self.applied,
+                "errors": self.errors, "last_id": self.last_id}
+
+
+stream_consumer = StreamConsumer()
+
+
+def start_stream_consumer():
+    if INTERACTION_STREAM_ENABLED:
+        stream_consumer.start()
+
+
+def ingest(raw_events):
+    """Validate + ghi log + áp dụng (qua stream nếu có). Trả về (số event, mode)."""
+    events = [validate_event(e) for e in raw_events]
+    if not events:
+        return 0, "noop"
+    recommend.prepare_live_state()
+    live_log.append(events)
+    if stream_consumer.running:
+        try:
+            stream_consumer.publish(events)
+            recommendation_cache.bump_generations(e["userId"] for e in events)
+            return len(events), "stream"
+        except Exception as e:
+            print(f"⚠️ [Ingest] Publish failed, applying locally: {e}")
+    start = time.perf_counter()
+    apply_events(events)
+    # Worker khác (không bật stream) không thấy event nhưng phải bỏ entry Redis cũ của user
+    recommendation_cache.bump_generations(e["userId"] for e in events)
+    print(f"📥 [Ingest] Applied {len(events)} events locally in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return len(events), "local"
+
+
+def ingest_stats():
+    return {"consumer": stream_consumer.stats(), **recommend.live_stats()}
@@ -0,0 +1,102 @@
+# src/live_log.py
+# Log NDJSON các event realtime (POST /interactions) — replay khi restart và đưa vào retrain:
+# - Mỗi event có "id" (client gửi hoặc uuid4), cùng kiểu id với __interactions.json export từ DB
+#   → event đã có trong export bị bỏ qua (dedupe theo id), không bị tính 2 lần
+# - compact(): retrain_worker.py gọi trước khi train — bỏ event đã có trong export / trùng id / quá
+#   LIVE_LOG_MAX_AGE_DAYS ngày rồi ghi lại file (tmp + os.replace) → log không phình vô hạn
+# - Ghi / compact giữ flock trên file .lock → nhiều uvicorn worker + process retrain không ghi đè nhau
+
+import os
+import json
+import uuid
+import fcntl
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIVE_LOG_FILE = os.getenv("LIVE_LOG_FILE", os.path.join(BASE_DIR, "jsons", "__interactions_live.ndjson"))
+LIVE_LOG_MAX_AGE_DAYS = float(os.getenv("LIVE_LOG_MAX_AGE_DAYS", 30))  # Export vẫn chưa có sau N ngày → bỏ
+
+
+def new_event_id():
+    return str(uuid.uuid4())
+
+
+@contextmanager
+def _locked(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def append(events, path=LIVE_LOG_FILE):
+    with _locked(path), open(path, "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def read(path=LIVE_LOG_FILE):
+    """Mọi event trong log (bỏ qua dòng hỏng, vd. dòng ghi dở khi process bị kill)."""
+    events = []
+    if not os.path.exists(path):
+        return events
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                events.append(event)
+    return events
+
+
+def pending(events, base_ids=()):
+    """Event chưa có trong export (theo id), mỗi id 1 lần; event không có id (log cũ) giữ nguyên."""
+    seen = set()
+    out = []
+    for event in events:
+        event_id = event.get("id")
+        if event_id is not None:
+            if event_id in base_ids or event_id in seen:
+                continue
+            seen.add(event_id)
+        out.append(event)
+    return out
+
+
+def merge(base, path=LIVE_LOG_FILE):
+    """List interaction của export + event live chưa có trong export."""
+    base_ids = {inter.get("id") for inter in base if isinstance(inter, dict)}
+    base_ids.discard(None)
+    return base + pending(read(path), base_ids)
+
+
+def _event_time(event):
+    try:
+        return datetime.fromisoformat(str(event.get("timestamp")).replace("Z", "")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def compact(base_ids, max_age_days=LIVE_LOG_MAX_AGE_DAYS, path=LIVE_LOG_FILE):
+    """Ghi lại log chỉ với event còn pending và chưa quá hạn. Trả về (số event trước, sau)."""
+    with _locked(path):
+        events = read(path)
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        keep = [e for e in pending(events, base_ids) if (_event_time(e) or cutoff) >= cutoff]
+        if len(keep) == len(events):
+            return len(events), len(keep)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for event in keep:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+    return len(events), len(keep)
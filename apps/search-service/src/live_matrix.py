@@ -0,0 +1,279 @@
+# src/live_matrix.py
+# User-item matrix nhận event realtime mà không build lại toàn bộ:
+# - Base: CSR (+ CSC) build 1 lần từ file; hàng bị event chạm → overlay dict {hotel: value} cho riêng hàng đó
+# - Norm hàng / cột cập nhật theo delta → cosine cho các hàng "bẩn" tính lại cục bộ (chỉ đụng các hàng/cột liên quan)
+# - Overlay quá COMPACT_ROWS hàng → gộp lại thành CSR mới (O(nnz), vectorized)
+# - Trạng thái là 1 ảnh chụp bất biến, writer thay cả ảnh bằng 1 phép gán → đọc song song không cần lock
+
+import os
+import numpy as np
+from typing import NamedTuple
+from scipy import sparse
+from src.cf_neighbors import gather_rows, accumulate
+
+LIVE_COMPACT_ROWS = int(os.getenv("LIVE_COMPACT_ROWS", 1000))
+
+
+class _State(NamedTuple):
+    """Ảnh chụp bất biến: writer dựng bản mới (copy-on-write) rồi gán 1 lần → reader không cần lock."""
+    base: sparse.csr_matrix
+    base_csc: sparse.csc_matrix
+    rows: dict              # u → {h: value}: hàng đã bị sửa (thay thế hoàn toàn hàng base)
+    col_overlay: dict       # h → frozenset(u) các hàng overlay có cột h
+    overlay_users: np.ndarray
+    row_sq: np.ndarray
+    col_sq: np.ndarray
+
+
+class LiveUserItemMatrix:
+    """
+    Ghi (ensure_* / set_value / compact) do caller tuần tự hóa (recommend._live_lock).
+    Đọc không lock: mỗi hàm đọc lấy self._state 1 lần rồi chỉ dùng ảnh chụp đó — dict overlay không bao giờ bị
+    sửa tại chỗ sau khi đã publish. Riêng row_sq / col_sq cập nhật tại chỗ (1 phần tử float) → reader có thể
+    thấy norm mới hơn hàng 1 event, chỉ lệch similarity thoáng qua.
+    """
+
+    def __init__(self, matrix, user_list, hotel_list, explicit_pairs=()):
+        self.user_list = list(user_list)
+        self.hotel_list = list(hotel_list)
+        self.user_idx = {u: i for i, u in enumerate(self.user_list)}
+        self.hotel_idx = {h: i for i, h in enumerate(self.hotel_list)}
+        self.explicit = set(explicit_pairs)  # (u, h) đã có rating explicit → implicit không ghi đè
+        self.updates = 0
+        self._set_base(sparse.csr_matrix(matrix, dtype=np.float64))
+
+    def _set_base(self, base):
+        self._state = self._grown(_State(
+            base=base,
+            base_csc=base.tocsc(),
+            rows={},
+            col_overlay={},
+            overlay_users=np.empty(0, dtype=np.int64),
+            row_sq=np.asarray(base.multiply(base).sum(axis=1)).ravel(),
+            col_sq=np.asarray(base.multiply(base).sum(axis=0)).ravel(),
+        ))
+
+    def _grown(self, st):
+        n_users, n_items = len(self.user_list), len(self.hotel_list)
+        if len(st.row_sq) < n_users:
+            st = st._replace(row_sq=np.concatenate([st.row_sq, np.zeros(n_users - len(st.row_sq))]))
+        if len(st.col_sq) < n_items:
+            st = st._replace(col_sq=np.concatenate([st.col_sq, np.zeros(n_items - len(st.col_sq))]))
+        return st
+
+    @property
+    def base(self):
+        return self._state.base
+
+    @property
+    def shape(self):
+        return len(self.user_list), len(self.hotel_list)
+
+    @property
+    def overlay_rows(self):
+        return len(self._state.rows)
+
+    @property
+    def nnz(self):
+        st = self._state
+        overlay_nnz = sum(len(r) for r in st.rows.values())
+        replaced = sum(self._base_row_len(st.base, u) for u in st.rows)
+        return st.base.nnz - replaced + overlay_nnz
+
+    @staticmethod
+    def _base_row_len(base, u):
+        return int(base.indptr[u + 1] - base.indptr[u]) if u < base.shape[0] else 0
+
+    # ---------- Đọc ----------
+    @staticmethod
+    def _row(st, u):
+        overlay = st.rows.get(u)
+        if overlay is not None:
+            cols = np.fromiter(sorted(overlay), dtype=np.int64, count=len(overlay))
+            return cols, np.array([overlay[c] for c in cols.tolist()], dtype=np.float64)
+        if u >= st.base.shape[0]:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        start, stop = st.base.indptr[u], st.base.indptr[u + 1]
+        return st.base.indices[start:stop].astype(np.int64), st.base.data[start:stop]
+
+    def row(self, u):
+        """(cols, values) của hàng u, cols tăng dần."""
+        return self._row(self._state, u)
+
+    def _gather_rows(self, st, users):
+        users = np.asarray(users, dtype=np.int64)
+        if not st.rows and (len(users) == 0 or users.max() < st.base.shape[0]):
+            return gather_rows(st.base, users)
+        owners, cols, vals = [], [], []
+        for pos, u in enumerate(users.tolist()):
+            c, v = self._row(st, u)
+            owners.append(np.full(len(c), pos, dtype=np.int64))
+            cols.append(c)
+            vals.append(v)
+        if not cols:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(owners), np.concatenate(cols), np.concatenate(vals)
+
+    def rows(self, users):
+        """Các phần tử khác 0 của nhiều hàng → (vị trí trong users, cols, values) — như gather_rows."""
+        return self._gather_rows(self._state, users)
+
+    @staticmethod
+    def _gather_columns(st, items):
+        items = np.asarray(items, dtype=np.int64)
+        in_base = items < st.base_csc.shape[1]
+        owner, users, vals = gather_rows(st.base_csc, items[in_base])
+        owner = np.nonzero(in_base)[0][owner]
+        if len(st.overlay_users):
+            keep = ~np.isin(users, st.overlay_users)  # Hàng overlay thay thế hàng base
+            owner, users, vals = owner[keep], users[keep], vals[keep]
+            extra = [(pos, u, st.rows[u][h]) for pos, h in enumerate(items.tolist())
+                     for u in st.col_overlay.get(h, ())]
+            if extra:
+                e_owner, e_users, e_vals = zip(*extra)
+                owner = np.concatenate([owner, e_owner])
+                users = np.concatenate([users, e_users])
+                vals = np.concatenate([vals, e_vals])
+        return owner, users.astype(np.int64), vals.astype(np.float64)
+
+    def columns(self, items):
+        """Các phần tử khác 0 của nhiều cột → (vị trí trong items, users, values)."""
+        return self._gather_columns(self._state, items)
+
+    @staticmethod
+    def _get(st, u, h):
+        overlay = st.rows.get(u)
+        if overlay is not None:
+            return overlay.get(h, 0.0)
+        if u >= st.base.shape[0] or h >= st.base.shape[1]:
+            return 0.0
+        return float(st.base[u, h])
+
+    def get(self, u, h):
+        return self._get(self._state, u, h)
+
+    # ---------- Ghi (caller giữ lock) ----------
+    def ensure_user(self, user_id):
+        u = self.user_idx.get(user_id)
+        if u is None:
+            u = len(self.user_list)
+            self.user_list.append(user_id)
+            self._state = self._grown(self._state)
+            self.user_idx[user_id] = u  # Publish index sau cùng: reader thấy u thì norm đã đủ dài
+        return u
+
+    def ensure_hotel(self, hotel_id):
+        h = self.hotel_idx.get(hotel_id)
+        if h is None:
+            h = len(self.hotel_list)
+            self.hotel_list.append(hotel_id)
+            self._state = self._grown(self._state)
+            self.hotel_idx[hotel_id] = h
+        return h
+
+    def set_value(self, u, h, value):
+        """Gán giá trị ô (u, h); value <= 0 → xóa ô. Trả về True nếu có thay đổi."""
+        st = self._state
+        old = self._get(st, u, h)
+        value = max(0.0, float(value))
+        if value == old:
+            return False
+
+        # Copy-on-write: hàng u, dict hàng overlay và set cột bị chạm là bản mới; phần còn lại dùng chung
+        rows = dict(st.rows)
+        col_overlay = dict(st.col_overlay)
+        overlay_users = st.overlay_users
+        row = st.rows.get(u)
+        if row is None:
+            cols, vals = self._row(st, u)
+            row = dict(zip(cols.tolist(), vals.tolist()))
+            for c in row:
+                col_overlay[c] = col_overlay.get(c, frozenset()) | {u}
+            overlay_users = np.fromiter(list(rows) + [u], dtype=np.int64, count=len(rows) + 1)
+        else:
+            row = dict(row)
+        if value > 0:
+            row[h] = value
+            col_overlay[h] = col_overlay.get(h, frozenset()) | {u}
+        else:
+            row.pop(h, None)
+            col_overlay[h] = col_overlay.get(h, frozenset()) - {u}
+        rows[u] = row
+
+        delta = value * value - old * old
+        st.row_sq[u] += delta
+        st.col_sq[h] += delta
+        self._state = st._replace(rows=rows, col_overlay=col_overlay, overlay_users=overlay_users)
+        self.updates += 1
+        if len(rows) > LIVE_COMPACT_ROWS:
+            self.compact()
+        return True
+
+    def apply_implicit(self, user_id, hotel_id, weight):
+        """Signal implicit: ô = max(0, max signal), trừ khi cặp này đã có rating explicit."""
+        u, h = self.ensure_user(user_id), self.ensure_hotel(hotel_id)
+        if (u, h) in self.explicit:
+            return u, h, False
+        return u, h, self.set_value(u, h, max(self.get(u, h), weight))
+
+    def apply_explicit(self, user_id, hotel_id, rating):
+        u, h = self.ensure_user(user_id), self.ensure_hotel(hotel_id)
+        self.explicit.add((u, h))
+        return u, h, self.set_value(u, h, rating)
+
+    def to_csr(self):
+        """Ma trận đầy đủ hiện tại (base + overlay) dạng CSR."""
+        st = self._state
+        n_users, n_items = self.shape
+        base = st.base
+        if not st.rows:
+            if base.shape == (n_users, n_items):
+                return base
+            return sparse.csr_matrix((base.data, base.indices, np.concatenate(
+                [base.indptr, np.full(n_users - base.shape[0], base.indptr[-1])])), shape=(n_users, n_items))
+        coo = base.tocoo()
+        keep = ~np.isin(coo.row, st.overlay_users)
+        extra = [(u, h, v) for u, row in st.rows.items() for h, v in row.items()]
+        e_rows, e_cols, e_vals = zip(*extra) if extra else ((), (), ())
+        return sparse.csr_matrix(
+            (np.concatenate([coo.data[keep], e_vals]),
+             (np.concatenate([coo.row[keep], e_rows]).astype(np.int64),
+              np.concatenate([coo.col[keep], e_cols]).astype(np.int64))),
+            shape=(n_users, n_items),
+        )
+
+    def compact(self):
+        """Gộp overlay vào base (giữ nguyên index user/hotel)."""
+        self._set_base(self.to_csr())
+
+    # ---------- Láng giềng cục bộ ----------
+    def _top(self, candidates, dots, norms_sq, self_norm_sq, exclude, k):
+        denom = np.sqrt(norms_sq[candidates] * self_norm_sq)
+        sims = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+        keep = (candidates != exclude) & (sims > 0)
+        candidates, sims = candidates[keep], sims[keep]
+        if len(candidates) > k:
+            top = np.argpartition(-sims, k - 1)[:k]
+            candidates, sims = candidates[top], sims[top]
+        order = np.lexsort((candidates, -sims))
+        neighbors = np.full(k, -1, dtype=np.int32)
+        out_sims = np.zeros(k, dtype=np.float32)
+        neighbors[:len(order)] = candidates[order]
+        out_sims[:len(order)] = sims[order]
+        return neighbors, out_sims
+
+    def user_neighbors(self, u, k):
+        """Top-k user cosine với user u, chỉ duyệt các user cùng tương tác ≥ 1 hotel với u."""
+        st = self._state
+        cols, vals = self._row(st, u)
+        owner, users, col_vals = self._gather_columns(st, cols)
+        candidates, dots, _ = accumulate(users, vals[owner], col_vals)
+        return self._top(candidates, dots, st.row_sq, st.row_sq[u], u, k)
+
+    def item_neighbors(self, h, k):
+        """Top-k hotel cosine với hotel h, chỉ duyệt các hotel có chung user với h."""
+        st = self._state
+        owner, users, vals = self._gather_columns(st, [h])
+        row_owner, cols, row_vals = self._gather_rows(st, users)
+        candidates, dots, _ = accumulate(cols, vals[row_owner], row_vals)
+        return self._top(candidates, dots, st.col_sq, st.col_sq[h], h, k)
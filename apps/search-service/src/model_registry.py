@@ -0,0 +1,88 @@
+# src/model_registry.py
+# Model Registry: mỗi encoder (CLIP, multilingual text) chỉ load 1 lần / process, lazy khi dùng lần đầu.
+# main.py, src/embedding.py, agent.py, process_data.py đều lấy model qua đây thay vì tự SentenceTransformer(...)
+
+import time
+import threading
+from datetime import datetime
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+CLIP_MODEL = "clip-ViT-B-32"                         # Ảnh + text (search), 512 dims
+TEXT_MODEL = "distiluse-base-multilingual-cased-v1"  # Text tiếng Việt (RAG, FAQ), 512 dims
+
+_models = {}
+_load_stats = {}
+_registry_lock = threading.Lock()
+# Mỗi model 1 lock encode: tokenizer (HF fast tokenizer) không an toàn khi gọi song song
+_encode_locks = {}
+
+
+def _current_rss_mb():
+    """RSS hiện tại của process (MB). Linux: /proc, nơi khác: peak RSS qua resource."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return None
+
+
+def get_model(name: str = CLIP_MODEL):
+    """Trả về SentenceTransformer đã load (load lần đầu, thread-safe)."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        model = _models.get(name)
+        if model is not None:
+            return model
+
+        from sentence_transformers import SentenceTransformer
+        print(f"--- Loading AI Model ({name}) ---")
+        rss_before = _current_rss_mb()
+        start = time.perf_counter()
+        model = SentenceTransformer(name)
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss_mb()
+
+        _encode_locks[name] = threading.Lock()
+        _load_stats[name] = {
+            "loaded_at": datetime.now().isoformat(),
+            "load_seconds": round(load_seconds, 3),
+            "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+        }
+        _models[name] = model
+        print(f"✅ [Registry] {name} loaded in {load_seconds:.2f}s")
+        return model
+
+
+def encode(inputs, model_name: str = CLIP_MODEL, **kwargs):
+    """model.encode thread-safe. inputs: 1 phần tử (str / PIL.Image) hoặc list."""
+    model = get_model(model_name)
+    with _encode_locks[model_name]:
+        return model.encode(inputs, **kwargs)
+
+
+def encode_text(text, model_name: str = CLIP_MODEL, **kwargs):
+    return encode(text, model_name=model_name, **kwargs)
+
+
+def encode_image(image, **kwargs):
+    return encode(image, model_name=CLIP_MODEL, **kwargs)
+
+
+def registry_stats():
+    """Thông tin cho health endpoint: model nào đã load, thời gian load, RAM."""
+    return {
+        "models": {name: dict(stats) for name, stats in _load_stats.items()},
+        "process_rss_mb": round(_current_rss_mb() or 0, 1),
+    }
@@ -0,0 +1,281 @@
+# src/model_store.py
+# Model SVD có version + hot-swap cho mọi uvicorn worker:
+# - jsons/models/svd-<version>.pkl (+ svd-<version>.json: training report) — không bao giờ ghi đè
+# - jsons/models/current.json: {"version", "previous", "updated_at"} — đổi bằng os.replace (atomic)
+# - Publish: validate model mới (cấu trúc, điểm hữu hạn, RMSE không tệ hơn quá ngưỡng) rồi mới trỏ current
+# - ModelWatcher (mỗi worker): poll current.json → load + swap; giữ model cũ trong RAM → rollback tức thì
+# Chưa có current.json → dùng jsons/recsys_model.pkl cũ (version = "legacy-<mtime>").
+
+import os
+import json
+import pickle
+import shutil
+import threading
+import numpy as np
+from datetime import datetime
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+MODELS_DIR = os.getenv("MODELS_DIR", "jsons/models")
+LEGACY_MODEL_PATH = "jsons/recsys_model.pkl"
+LEGACY_REPORT_PATH = "jsons/svd_training_report.json"
+POINTER_FILE = "current.json"
+MODEL_KEEP = int(os.getenv("MODEL_KEEP", 5))                          # Số version giữ lại trên đĩa
+MODEL_MAX_RMSE_REGRESSION = float(os.getenv("MODEL_MAX_RMSE_REGRESSION", 0.10))  # RMSE tệ hơn >10% → từ chối
+MODEL_CHECK_S = float(os.getenv("MODEL_CHECK_S", 10))
+
+
+class InvalidModel(Exception):
+    pass
+
+
+def new_version():
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def model_path(version):
+    return os.path.join(MODELS_DIR, f"svd-{version}.pkl")
+
+
+def report_path(version):
+    return os.path.join(MODELS_DIR, f"svd-{version}.json")
+
+
+def _write_json_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def read_pointer():
+    try:
+        with open(os.path.join(MODELS_DIR, POINTER_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def target_version():
+    """Version mà mọi worker nên chạy: theo current.json, hoặc file model cũ."""
+    pointer = read_pointer()
+    if pointer and pointer.get("version"):
+        return pointer["version"]
+    try:
+        return f"legacy-{os.stat(LEGACY_MODEL_PATH).st_mtime_ns}"
+    except OSError:
+        return None
+
+
+def _file_for(version, path, legacy_path):
+    """Version "legacy-*" chưa archive (chưa publish lần nào) → đọc thẳng file cũ."""
+    if version.startswith("legacy-") and not os.path.exists(path):
+        return legacy_path
+    return path
+
+
+def load_model(version):
+    with open(_file_for(version, model_path(version), LEGACY_MODEL_PATH), "rb") as f:
+        return pickle.load(f)
+
+
+def load_report(version):
+    path = LEGACY_REPORT_PATH if version is None else _file_for(version, report_path(version), LEGACY_REPORT_PATH)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_versions():
+    if not os.path.isdir(MODELS_DIR):
+        return []
+    names = [name for name in os.listdir(MODELS_DIR) if name.startswith("svd-") and name.endswith(".pkl")]
+    names.sort(key=lambda name: os.stat(os.path.join(MODELS_DIR, name)).st_mtime_ns)  # Cũ → mới
+    return [name[4:-4] for name in names]
+
+
+# ---------------------------------------------------------
+# VALIDATE / PUBLISH / ROLLBACK
+# ---------------------------------------------------------
+def validate_model(model, report=None, baseline_report=None, sample_users=50):
+    """Raise InvalidModel nếu model hỏng: thiếu factor, điểm không hữu hạn, RMSE tụt quá ngưỡng."""
+    from src.svd_scorer import SVDScorer
+    for attr in ("pu", "qi", "bu", "bi", "trainset"):
+        if getattr(model, attr, None) is None:
+            raise InvalidModel(f"Model thiếu thuộc tính '{attr}'")
+    try:
+        scorer = SVDScorer(model)
+    except Exception as e:
+        raise InvalidModel(f"Không dựng được factor matrix: {e}")
+    if not (np.isfinite(scorer.pu).all() and np.isfinite(scorer.qi).all()):
+        raise InvalidModel("Factor matrix có NaN / inf")
+    users = list(scorer.user_index)[:sample_users]
+    for user_id in users:
+        if not np.isfinite(scorer.score_all(user_id)).all():
+            raise InvalidModel(f"Điểm không hữu hạn cho user {user_id}")
+
+    # RMSE: so với baseline SVD mặc định trong cùng report (cùng dữ liệu, cùng CV), và với version hiện tại
+    # chỉ khi 2 lần train dùng đúng bộ dữ liệu như nhau (RMSE trên dữ liệu khác nhau không so sánh được)
+    evaluation = (report or {}).get("evaluation") or {}
+    new_rmse = evaluation.get("optimized_rmse")
+    if new_rmse is None:
+        return
+    references = [("baseline SVD", evaluation.get("baseline_rmse"))]
+    if baseline_report and baseline_report.get("data_stats") == report.get("data_stats"):
+        references.append(("version hiện tại", (baseline_report.get("evaluation") or {}).get("optimized_rmse")))
+    for name, ref_rmse in references:
+        if ref_rmse and new_rmse > ref_rmse * (1 + MODEL_MAX_RMSE_REGRESSION):
+            raise InvalidModel(f"RMSE {new_rmse:.4f} tệ hơn {name} {ref_rmse:.4f} quá {MODEL_MAX_RMSE_REGRESSION:.0%}")
+
+
+def publish(model_file, report_file=None, version=None):
+    """
+    Validate rồi đưa model vừa train thành version hiện tại. Trả về version.
+    model_file / report_file: file tạm do train_svd.py ghi ra (được move vào MODELS_DIR).
+    """
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    version = version or new_version()
+    with open(model_file, "rb") as f:
+        model = pickle.load(f)
+    report = None
+    if report_file and os.path.exists(report_file):
+        with open(report_file, "r", encoding="utf-8") as f:
+            report = json.load(f)
+
+    current = target_version()
+    validate_model(model, report, load_report(current) if current else None)
+    if current is not None and current.startswith("legacy-") and not os.path.exists(model_path(current)):
+        # Archive model cũ trước khi jsons/recsys_model.pkl bị ghi đè → vẫn rollback được
+        for src, dst in ((LEGACY_MODEL_PATH, model_path(current)), (LEGACY_REPORT_PATH, report_path(current))):
+            if os.path.exists(src):
+                shutil.copy2(src, dst)
+
+    os.replace(model_file, model_path(version))
+    if report is not None:
+        os.replace(report_file, report_path(version))
+    _write_json_atomic(os.path.join(MODELS_DIR, POINTER_FILE), {
+        "version": version,
+        "previous": current,
+        "updated_at": datetime.now().isoformat(),
+    })
+
+    # Tool cũ (evaluate.py, ...) vẫn đọc jsons/recsys_model.pkl / svd_training_report.json
+    for src, dst in ((model_path(version), LEGACY_MODEL_PATH), (report_path(version), LEGACY_REPORT_PATH)):
+        if os.path.exists(src):
+            shutil.copyfile(src, dst + ".tmp")
+            os.replace(dst + ".tmp", dst)
+
+    _prune(keep={version, current})
+    print(f"✅ [ModelStore] Published SVD version {version} (previous: {current})")
+    return version
+
+
+def rollback():
+    """Trỏ current về version trước đó. Trả về version mới, None nếu không có gì để rollback."""
+    pointer = read_pointer()
+    if not pointer or not pointer.get("previous"):
+        return None
+    previous = pointer["previous"]
+    if not os.path.exists(model_path(previous)):
+        return None
+    _write_json_atomic(os.path.join(MODELS_DIR, POINTER_FILE), {
+        "version": previous,
+        "previous": pointer["version"],
+        "updated_at": datetime.now().isoformat(),
+        "rollback": True,
+    })
+    print(f"⏪ [ModelStore] Rolled back {pointer['version']} → {previous}")
+    return previous
+
+
+def _prune(keep):
+    versions = list_versions()
+    for version in versions[:-MODEL_KEEP]:
+        if version in keep:
+            continue
+        for path in (model_path(version), report_path(version)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# ---------------------------------------------------------
+# WATCHER (mỗi serving worker)
+# ---------------------------------------------------------
+class ModelWatcher:
+    """
+    Theo dõi version đích; đổi → load + validate → on_swap(model, version).
+    Model đang chạy trước đó giữ trong RAM: rollback về đúng version đó không phải unpickle lại.
+    """
+
+    def __init__(self, on_swap, interval=MODEL_CHECK_S):
+        self.on_swap = on_swap
+        self.interval = interval
+        self.active_version = None
+        self._active_model = None
+        self.previous = None  # (version, model)
+        self.swaps = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def adopt(self, model, version):
+        """Model load sẵn lúc import (recommend.py) → coi là version đang chạy."""
+        self.active_version = version
+        self._active_model = model
+
+    def check(self):
+        target = target_version()
+        if target is None or target == self.active_version:
+            return False
+        with self._lock:
+            if target == self.active_version:
+                return False
+            if self.previous is not None and self.previous[0] == target:
+                model = self.previous[1]
+            else:
+                try:
+                    model = load_model(target)
+                    validate_model(model)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"❌ [ModelStore] Cannot activate version {target}: {e}")
+                    return False
+            self.previous = (self.active_version, self._active_model)
+            self.on_swap(model, target)
+            self.active_version, self._active_model = target, model
+            self.swaps += 1
+            print(f"🔄 [ModelStore] Swapped SVD model → {target}")
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ [ModelStore] Watcher error: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        pointer = read_pointer() or {}
+        return {
+            "active_version": self.active_version,
+            "target_version": target_version(),
+            "previous_version": self.previous[0] if self.previous else pointer.get("previous"),
+            "available_versions": list_versions(),
+            "swaps": self.swaps,
+            "failures": self.failures,
+        }
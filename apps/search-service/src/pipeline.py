@@ -0,0 +1,245 @@
+# src/pipeline.py
+# Gợi ý 2 tầng (strategy 'pipeline'): latency không tăng theo kích thước catalogue
+# - Tầng 1 — candidate generation (rẻ, mỗi nguồn ≤ PIPELINE_PER_SOURCE hotel):
+#     item_cf      : láng giềng Item-CF của các hotel user đã tương tác
+#     location     : hotel ở các location user đã tương tác (location nặng ký trước)
+#     city_popular : hotel phổ biến nhất ở thành phố chính của user (user mới → phổ biến toàn catalogue)
+#     clip         : CLIP nearest-neighbour, seed = vector ảnh TB các hotel user đã BOOK
+#   Gộp, bỏ trùng (giữ thứ tự nguồn) → tối đa PIPELINE_MAX_CANDIDATES
+# - Tầng 2 — re-rank (nặng) CHỈ trên tập ứng viên: SVD + content + sentiment
+# Mỗi tầng / nguồn đo thời gian → pipeline_stats() (health check).
+
+import os
+import time
+import threading
+import numpy as np
+from src.search import top_k_indices, normalize_vector
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+PIPELINE_SOURCES = [s.strip() for s in os.getenv("PIPELINE_SOURCES", "item_cf,location,city_popular,clip").split(",")
+                    if s.strip()]
+PIPELINE_PER_SOURCE = int(os.getenv("PIPELINE_PER_SOURCE", 100))
+PIPELINE_MAX_CANDIDATES = int(os.getenv("PIPELINE_MAX_CANDIDATES", 300))
+CLIP_SEED_TYPES = ("BOOK",)  # Không có booking → dùng mọi interaction dương
+
+# Index 1 vector ảnh / hotel (main.py đăng ký lúc startup); None → bỏ qua nguồn 'clip'
+_visual_index = None
+_visual_row_of = {}
+
+
+def set_visual_index(index):
+    global _visual_index, _visual_row_of
+    _visual_index = index
+    _visual_row_of = {hid: i for i, hid in enumerate(index.ids.tolist())} if index is not None else {}
+
+
+# ---------------------------------------------------------
+# TẦNG 1: CANDIDATE GENERATORS
+# ---------------------------------------------------------
+class _LocationIndex:
+    """Hàng catalogue theo location (offsets kiểu CSR) → hotel của 1 location lấy O(số hotel ở đó)."""
+
+    def __init__(self, features):
+        self.features = features
+        codes = np.where(features.loc_idx >= 0, features.loc_idx, len(features.locations))
+        self.order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes, minlength=len(features.locations) + 1)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def rows(self, locations):
+        if len(locations) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in locations])
+
+
+_location_index = None
+
+
+def _get_location_index(features):
+    global _location_index
+    if _location_index is None or _location_index.features is not features:
+        _location_index = _LocationIndex(features)
+    return _location_index
+
+
+def _top_popular(rows, popularity, limit):
+    return rows[top_k_indices(popularity[rows], limit)]
+
+
+def _user_locations(ctx):
+    """Location user đã tương tác, nặng ký trước."""
+    profiles, u = ctx["profiles"], ctx["profile_row"]
+    if u is None:
+        return np.empty(0, dtype=np.int64)
+    seen = np.nonzero(profiles.loc_seen[u])[0]
+    return seen[np.argsort(-profiles.loc[u][seen], kind="stable")]
+
+
+def _candidates_item_cf(ctx, limit):
+    from src import recommend
+    row_of = ctx["features"].row_of
+    return np.array([row_of[h] for h in recommend.item_cf_candidates(ctx["user_id"], limit) if h in row_of],
+                    dtype=np.int64)
+
+
+def _candidates_location(ctx, limit):
+    locations = _user_locations(ctx)
+    index = _get_location_index(ctx["features"])
+    # Theo thứ tự sở thích location; trong cùng location → hotel phổ biến trước
+    out = []
+    remaining = limit
+    for loc in locations.tolist():
+        rows = index.rows([loc])
+        picked = _top_popular(rows, ctx["popularity"], remaining)
+        out.append(picked)
+        remaining -= len(picked)
+        if remaining <= 0:
+            break
+    return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
+
+
+def _candidates_city_popular(ctx, limit):
+    locations = _user_locations(ctx)
+    popularity = ctx["popularity"]
+    if len(locations) == 0:
+        return _top_popular(np.arange(len(popularity)), popularity, limit)
+    return _top_popular(_get_location_index(ctx["features"]).rows(locations[:1]), popularity, limit)
+
+
+def _candidates_clip(ctx, limit):
+    if _visual_index is None or len(_visual_index) == 0:
+        return np.empty(0, dtype=np.int64)
+    history = ctx["store"].user_history(ctx["user_id"])
+    seeds = [h for h, t, _ in history if t in CLIP_SEED_TYPES]
+    if not seeds:
+        seeds = [h for h, t, _ in history if ctx["weights"].get(t, 0) > 0]
+    seed_rows = sorted({_visual_row_of[h] for h in seeds if h in _visual_row_of})
+    if not seed_rows:
+        return np.empty(0, dtype=np.int64)
+    query = normalize_vector(np.asarray(_visual_index.matrix[seed_rows], dtype=np.float32).mean(axis=0))
+    rows, _ = _visual_index.search_rows(query, limit + len(seed_rows))
+    row_of = ctx["features"].row_of
+    seed_set = set(seed_rows)
+    hotel_ids = [_visual_index.ids[r].item() for r in rows.tolist() if r not in seed_set]
+    return np.array([row_of[h] for h in hotel_ids if h in row_of][:limit], dtype=np.int64)
+
+
+GENERATORS = {
+    "item_cf": _candidates_item_cf,
+    "location": _candidates_location,
+    "city_popular": _candidates_city_popular,
+    "clip": _candidates_clip,
+}
+
+
+# ---------------------------------------------------------
+# THỐNG KÊ THỜI GIAN
+# ---------------------------------------------------------
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "stages": {}}
+
+
+def _record(timings, candidates):
+    with _stats_lock:
+        _stats["requests"] += 1
+        for stage, ms in timings.items():
+            entry = _stats["stages"].setdefault(stage, {"total_ms": 0.0, "max_ms": 0.0})
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+        _stats["candidates_total"] = _stats.get("candidates_total", 0) + candidates
+
+
+def pipeline_stats():
+    with _stats_lock:
+        n = _stats["requests"]
+        return {
+            "requests": n,
+            "sources": PIPELINE_SOURCES,
+            "per_source": PIPELINE_PER_SOURCE,
+            "max_candidates": PIPELINE_MAX_CANDIDATES,
+            "avg_candidates": round(_stats.get("candidates_total", 0) / n, 1) if n else 0.0,
+            "stages_ms": {stage: {"avg": round(e["total_ms"] / n, 3), "max": round(e["max_ms"], 3)}
+                          for stage, e in _stats["stages"].items()} if n else {},
+        }
+
+
+# ---------------------------------------------------------
+# PIPELINE
+# ---------------------------------------------------------
+def generate_candidates(ctx, sources=None, per_source=None, max_candidates=None, timings=None):
+    """Chạy các nguồn theo thứ tự, gộp + bỏ trùng (giữ lần xuất hiện đầu) → hàng catalogue."""
+    sources = PIPELINE_SOURCES if sources is None else sources
+    per_source = PIPELINE_PER_SOURCE if per_source is None else per_source
+    max_candidates = PIPELINE_MAX_CANDIDATES if max_candidates is None else max_candidates
+    timings = {} if timings is None else timings
+
+    parts = []
+    for name in sources:
+        start = time.perf_counter()
+        rows = GENERATORS[name](ctx, per_source)
+        timings[f"candidates.{name}"] = (time.perf_counter() - start) * 1000
+        parts.append(np.asarray(rows, dtype=np.int64))
+
+    merged = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+    _, first = np.unique(merged, return_index=True)
+    return merged[np.sort(first)][:max_candidates]
+
+
+def rerank(ctx, rows):
+    """Điểm tầng 2 cho các hàng ứng viên: SVD + content + sentiment (trọng số hybrid, chuẩn hóa lại)."""
+    from src import recommend
+    from src.content_features import content_scores_many
+
+    pillars = [
+        (recommend.CONTENT_WEIGHT,
+         content_scores_many(ctx["profiles"], [ctx["user_id"]], ctx["features"].take(rows))[0]),
+        (recommend.SENTIMENT_WEIGHT, ctx["signals"].sentiment[rows]),
+    ]
+    if recommend.algo is not None and recommend.fold_in_user(ctx["user_id"]):
+        scorer = recommend.get_svd_scorer()
+        inner = scorer.item_rows(ctx["catalogue"])[rows]
+        pillars.append((recommend.COLLABORATIVE_WEIGHT, (scorer.score_inner(ctx["user_id"], inner) - 1) / 4))
+
+    weights = np.array([w for w, _ in pillars])
+    return (weights / weights.sum()) @ np.vstack([v for _, v in pillars])
+
+
+def two_stage_recommend(user_id, top_k=5, sources=None, per_source=None, max_candidates=None):
+    """Trả về (list hotel, timings ms theo tầng / nguồn)."""
+    from src import recommend
+    from src.interaction_store import SIGNAL_WEIGHTS
+
+    timings = {}
+    start = time.perf_counter()
+    features, profiles = recommend.get_content_model()
+    signals = recommend.get_hotel_signals()
+    ctx = {
+        "user_id": user_id,
+        "catalogue": recommend.get_all_hotels(),
+        "features": features,
+        "profiles": profiles,
+        "profile_row": profiles.user_index.get(user_id),
+        "signals": signals,
+        "popularity": signals.popularity,
+        "store": recommend.get_interaction_store(),
+        "weights": SIGNAL_WEIGHTS,
+    }
+    timings["context"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    rows = generate_candidates(ctx, sources, per_source, max_candidates, timings)
+    timings["candidates"] = (time.perf_counter() - start) * 1000
+    if len(rows) == 0:
+        _record(timings, 0)
+        return [], timings
+
+    start = time.perf_counter()
+    scores = rerank(ctx, rows)
+    top = rows[top_k_indices(scores, top_k)]
+    timings["rerank"] = (time.perf_counter() - start) * 1000
+
+    _record(timings, len(rows))
+    catalogue = ctx["catalogue"]
+    return [catalogue[r] for r in top.tolist()], timings
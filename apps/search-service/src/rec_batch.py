@@ -0,0 +1,223 @@
+# src/rec_batch.py
+# Precompute gợi ý cho TOÀN BỘ user (chạy sau mỗi lần retrain / generate_recommendations.py):
+# - Mỗi strategy cá nhân hóa (svd, user_cf, item_cf): chấm điểm theo chunk user bằng phép nhân ma trận,
+#   top-N mỗi hàng → bảng int32 (n_users, N) chứa hotelId (-1 = trống) lưu .npy
+# - Online: np.load(mmap_mode='r') + dict user → hàng → O(1) / request
+# - Hàng "cũ" (user có event mới sau lúc build, hoặc model đã reload) → /recommend tính online như trước
+# content / popular không precompute: content đọc category onboarding từ DB, popular giống nhau cho mọi user.
+
+import os
+import json
+import time
+import threading
+import numpy as np
+from datetime import datetime
+from typing import NamedTuple
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+REC_BATCH_DIR = os.getenv("REC_BATCH_DIR", "jsons/rec_batch")
+REC_BATCH_TOP_N = int(os.getenv("REC_BATCH_TOP_N", 50))
+REC_BATCH_CHUNK = int(os.getenv("REC_BATCH_CHUNK", 512))           # Số user / lần nhân ma trận
+REC_BATCH_CHECK_S = float(os.getenv("REC_BATCH_CHECK_S", 30))      # Chu kỳ kiểm tra manifest mới
+MANIFEST_FILE = "manifest.json"
+BATCH_STRATEGIES = ("svd", "user_cf", "item_cf")
+
+
+def top_n_rows(scores, valid, top_n):
+    """Top-N cột mỗi hàng (giảm dần, bằng điểm → cột nhỏ trước) chỉ trên ô valid → (c, top_n) int64, -1 = trống."""
+    c, n = scores.shape
+    k = min(top_n, n)
+    out = np.full((c, top_n), -1, dtype=np.int64)
+    if k == 0 or c == 0:
+        return out
+    masked = np.where(valid, scores, -np.inf)
+    top = np.argpartition(-masked, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (c, 1))
+    top_vals = np.take_along_axis(masked, top, axis=1)
+    order = np.lexsort((top, -top_vals), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_vals = np.take_along_axis(top_vals, order, axis=1)
+    out[:, :k] = np.where(np.isfinite(top_vals), top, -1)
+    return out
+
+
+# ---------------------------------------------------------
+# BUILD
+# ---------------------------------------------------------
+def build_batch_recommendations(strategies=BATCH_STRATEGIES, top_n=REC_BATCH_TOP_N,
+                                chunk_size=REC_BATCH_CHUNK, directory=REC_BATCH_DIR):
+    """Chấm điểm + top-N cho mọi user có interaction, mọi strategy → ghi bảng int32 + manifest. Trả về manifest."""
+    from src import recommend
+
+    start = time.perf_counter()
+    hotels = recommend.get_all_hotels()
+    store = recommend.get_interaction_store()
+    users = list(store.users)
+    hotel_ids = np.array([h.get('id') for h in hotels], dtype=np.int64)
+    generations = np.fromiter((recommend.user_generation(u) for u in users), dtype=np.int32, count=len(users))
+
+    tables = {}
+    for strategy in strategies:
+        table = np.full((len(users), top_n), -1, dtype=np.int32)
+        state = {}  # Ma trận / bảng dùng chung giữa các chunk
+        for lo in range(0, len(users), chunk_size):
+            chunk = users[lo:lo + chunk_size]
+            result = recommend.batch_scores(strategy, chunk, hotels, state)
+            if result is None:
+                break
+            top = top_n_rows(*result, top_n)
+            table[lo:lo + len(chunk)] = np.where(top >= 0, hotel_ids[np.maximum(top, 0)], -1)
+        else:
+            tables[strategy] = table
+            print(f"   ✅ [Batch] {strategy}: {int((table[:, 0] >= 0).sum())}/{len(users)} users")
+
+    manifest = _save(directory, users, generations, tables, top_n, recommend.algo_version)
+    print(f"✅ [Batch] Precomputed {len(tables)} strategies × {len(users)} users "
+          f"in {time.perf_counter() - start:.1f}s → {directory}")
+    batch_recommendations.reload()
+    return manifest
+
+
+def _save(directory, users, generations, tables, top_n, model_version):
+    """Ghi file theo stamp rồi os.replace manifest (atomic) → reader không bao giờ thấy bộ file dở dang."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    files = {"users": f"users-{stamp}.json", "generations": f"generations-{stamp}.npy"}
+    with open(os.path.join(directory, files["users"]), "w", encoding="utf-8") as f:
+        json.dump(users, f, ensure_ascii=False)
+    np.save(os.path.join(directory, files["generations"]), generations)
+    for strategy, table in tables.items():
+        files[strategy] = f"{strategy}-{stamp}.npy"
+        np.save(os.path.join(directory, files[strategy]), table)
+
+    manifest = {
+        "created_at": datetime.now().isoformat(),
+        "model_version": model_version,
+        "top_n": top_n,
+        "users": len(users),
+        "strategies": list(tables),
+        "files": files,
+    }
+    tmp = os.path.join(directory, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST_FILE))
+
+    # Dọn bộ file cũ
+    current = set(files.values()) | {MANIFEST_FILE}
+    for name in os.listdir(directory):
+        if name not in current and name.endswith((".npy", ".json")):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return manifest
+
+
+# ---------------------------------------------------------
+# SERVE
+# ---------------------------------------------------------
+class _Snapshot(NamedTuple):
+    """Bộ bảng đã load — thay cả bộ bằng 1 phép gán → lookup không bao giờ trộn hàng của 2 lần build."""
+    manifest: dict
+    tables: dict
+    user_row: dict
+    generations: np.ndarray
+
+
+class BatchRecommendations:
+    def __init__(self, directory=REC_BATCH_DIR):
+        self.directory = directory
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()  # 1 thread load bộ mới, các request khác dùng bộ hiện tại
+        self._mtime = None
+        self._checked_at = 0.0
+        self.served = 0
+        self.stale = 0
+        self.missing = 0
+
+    def reload(self):
+        with self._refresh_lock:
+            self._checked_at = 0.0
+            self._mtime = None
+            self._load()
+
+    def _refresh(self):
+        if time.monotonic() - self._checked_at < REC_BATCH_CHECK_S:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._load()
+        finally:
+            self._refresh_lock.release()
+
+    def _load(self):
+        now = time.monotonic()
+        if now - self._checked_at < REC_BATCH_CHECK_S:
+            return
+        self._checked_at = now
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            files = manifest["files"]
+            with open(os.path.join(self.directory, files["users"]), "r", encoding="utf-8") as f:
+                users = json.load(f)
+            generations = np.load(os.path.join(self.directory, files["generations"]))
+            tables = {s: np.load(os.path.join(self.directory, files[s]), mmap_mode="r")
+                      for s in manifest["strategies"]}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ [Batch] Cannot load precomputed recommendations: {e}")
+            return
+        self._snapshot = _Snapshot(manifest, tables, {u: i for i, u in enumerate(users)}, generations)
+        self._mtime = mtime
+        print(f"✅ [Batch] Loaded precomputed recommendations ({manifest['created_at']}, "
+              f"{len(users)} users, {manifest['strategies']})")
+
+    def lookup(self, user_id, strategy, top_k, generation, model_version):
+        """hotelId top-k đã precompute, hoặc None (chưa có / user mới / user có event mới / model đã đổi)."""
+        self._refresh()
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.missing += 1
+            return None
+        table = snapshot.tables.get(strategy)
+        row = snapshot.user_row.get(user_id)
+        if table is None or row is None or top_k > snapshot.manifest["top_n"]:
+            self.missing += 1
+            return None
+        if snapshot.generations[row] != generation or \
+                (strategy == "svd" and snapshot.manifest["model_version"] != model_version):
+            self.stale += 1
+            return None
+        ids = table[row, :top_k]
+        ids = ids[ids >= 0]
+        if len(ids) == 0:
+            self.missing += 1
+            return None
+        self.served += 1
+        return ids.tolist()
+
+    def stats(self):
+        snapshot = self._snapshot
+        manifest = snapshot.manifest if snapshot is not None else None
+        return {
+            "loaded": manifest is not None,
+            "created_at": manifest["created_at"] if manifest else None,
+            "strategies": manifest["strategies"] if manifest else [],
+            "users": len(snapshot.user_row) if snapshot is not None else 0,
+            "served": self.served,
+            "stale": self.stale,
+            "missing": self.missing,
+        }
+
+
+batch_recommendations = BatchRecommendations()
@@ -1,21 +1,30 @@
 # src/recommend.py
 # Multi-Strategy Recommendation Engine
-# Strategies: svd (default), user_cf, item_cf, content, popular
+# Strategies: svd (default), user_cf, item_cf, content, popular, hybrid, pipeline
 # Usage: Called by main.py endpoint /recommend/{user_id}?strategy=svd
 
 import os
-import pickle
 import random
 import json
+import threading
+import time
 import numpy as np
 from collections import defaultdict
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 from src.db_utils import get_user_interested_categories
+from src.svd_scorer import SVDScorer
+from src import model_store, live_log
+from src.interaction_store import InteractionStore, SIGNAL_WEIGHTS
+from src.live_matrix import LiveUserItemMatrix
+from src.content_features import HotelFeatures, UserProfiles, content_scores, content_scores_many
+from src.search import top_k_indices
+from src.rec_batch import batch_recommendations
+from src.hybrid_signals import HotelSignals
+from src.cf_neighbors import topk_cosine_neighbors, accumulate, save_neighbor_tables, load_neighbor_tables
 
 # ---------------------------------------------------------
 # CONFIGURATION
 # ---------------------------------------------------------
-MODEL_PATH = "jsons/recsys_model.pkl"
 HOTELS_FILE = "jsons/__homeStay.json"
 INTERACTIONS_FILE = "jsons/__interactions.json"
 
@@ -29,11 +38,8 @@ POPULARITY_WEIGHT = 0.10     # Popularity: 10% (avg rating safety)
 SVD_WEIGHT = 0.6
 CONTENT_WEIGHT_SVD = 0.4
 
-# Content feature weights
-PRICE_WEIGHT = 0.3
-LOCATION_WEIGHT = 0.3
-AMENITY_WEIGHT = 0.2
-CATEGORY_WEIGHT = 0.2
+# Content feature weights (định nghĩa trong src/content_features.py)
+from src.content_features import PRICE_WEIGHT, LOCATION_WEIGHT, AMENITY_WEIGHT, CATEGORY_WEIGHT
 
 # User-CF parameters
 USER_CF_K = 10  # Number of similar users
@@ -41,16 +47,87 @@ USER_CF_K = 10  # Number of similar users
 # ---------------------------------------------------------
 # LOAD MODEL & DATA
 # ---------------------------------------------------------
+# Ghi state live (event mới, build lazy lần đầu) đi qua _live_lock; đọc dùng ảnh chụp (LiveUserItemMatrix,
+# InteractionStore) hoặc .get() trên overlay → request không phải chờ lock
+_live_lock = threading.RLock()
+
 algo = None
+algo_version = "none"  # Version model (jsons/models/current.json) — dùng trong key cache kết quả (giống nhau giữa các worker)
+
+
+def set_model(model, version):
+    """Hot-swap model SVD (ModelWatcher / retrain_worker gọi). Scorer + fold-in tự build lại theo `algo` mới."""
+    global algo, algo_version
+    algo, algo_version = model, version
 
-if os.path.exists(MODEL_PATH):
+
+_version = model_store.target_version()
+if _version is not None:
     try:
-        with open(MODEL_PATH, "rb") as f:
-            algo = pickle.load(f)
-        print("✅ [Recommend] Loaded SVD model.")
+        set_model(model_store.load_model(_version), _version)
+        print(f"✅ [Recommend] Loaded SVD model ({_version}).")
     except Exception as e:
         print(f"❌ [Recommend] Model error: {e}")
 
+# Factor matrix của model hiện tại (tự build lại khi set_model() đổi `algo` sau retrain / rollback)
+_svd_scorer = None
+def get_svd_scorer():
+    global _svd_scorer
+    if algo is None:
+        return None
+    if _svd_scorer is None or _svd_scorer.algo is not algo:
+        _svd_scorer = SVDScorer(algo)
+    return _svd_scorer
+
+
+_reviews_by_user = None  # (mtime __reviews.json lúc build, {userId: {hotelId: rating}})
+def _get_reviews_by_user():
+    """Rating explicit theo user; file review đổi → build lại, user có review đổi bị bỏ vector fold-in cũ."""
+    global _reviews_by_user
+    mtime = _current_reviews_mtime()
+    cached = _reviews_by_user
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    by_user = defaultdict(dict)
+    for rev in _load_reviews():
+        rating = _parse_rating(rev)
+        if rating is not None:
+            by_user[rev.get('userId')][rev.get('hotelId')] = rating
+    if cached is not None and _svd_scorer is not None:
+        for uid in set(by_user) | set(cached[1]):
+            if by_user.get(uid) != cached[1].get(uid):
+                _svd_scorer.forget(uid)
+    _reviews_by_user = (mtime, by_user)
+    return by_user
+
+
+def _svd_ratings_for(user_id: str) -> list:
+    """
+    [(hotelId, rating)] của user theo đúng cách train_svd.py dựng data:
+    signal implicit sau cùng cho mỗi hotel, review explicit ghi đè.
+    """
+    ratings = {}
+    for hotel_id, itype, _ in get_interaction_store().user_history(user_id):
+        if itype in SIGNAL_WEIGHTS:
+            ratings[hotel_id] = SIGNAL_WEIGHTS[itype]
+    ratings.update(_get_reviews_by_user().get(user_id, {}))
+    return list(ratings.items())
+
+
+def fold_in_user(user_id: str) -> bool:
+    """User chưa có trong model → fold-in vector ẩn từ lịch sử hiện có (cache trong scorer tới khi có event mới)."""
+    scorer = get_svd_scorer()
+    if scorer is None:
+        return False
+    _get_reviews_by_user()  # File review đổi → fold-in cũ của user có review đổi bị bỏ trước khi kiểm tra
+    if scorer.knows_user(user_id):
+        return True
+    ratings = _svd_ratings_for(user_id)
+    if not ratings or not scorer.fold_in(user_id, ratings):
+        return False
+    print(f"🧩 [SVD] Folded in user {user_id} from {len(ratings)} ratings")
+    return True
+
 # Load hotels data
 _hotels_cache = None
 def get_all_hotels():
@@ -63,132 +140,352 @@ def get_all_hotels():
             _hotels_cache = []
     return _hotels_cache
 
-# Load interactions
+# Load interactions: export + event live (src/live_log.py) chưa có trong export (dedupe theo id)
 _interactions_cache = None
+_replayed_live = []  # Event lấy từ log live lúc load → so với event_ids của bảng láng giềng build offline
 def get_all_interactions():
-    global _interactions_cache
+    global _interactions_cache, _replayed_live
     if _interactions_cache is None:
-        try:
-            with open(INTERACTIONS_FILE, "r", encoding="utf-8") as f:
-                _interactions_cache = json.load(f)
-        except:
-            _interactions_cache = []
+        with _live_lock:
+            if _interactions_cache is None:
+                try:
+                    with open(INTERACTIONS_FILE, "r", encoding="utf-8") as f:
+                        base = json.load(f)
+                except:
+                    base = []
+                interactions = live_log.merge(base)
+                _replayed_live = interactions[len(base):]
+                _interactions_cache = interactions
     return _interactions_cache
 
+# Interaction store dạng cột, nhóm sẵn theo user / hotel (lazy init)
+_interaction_store = None
+def get_interaction_store():
+    global _interaction_store
+    if _interaction_store is None:
+        with _live_lock:  # Build 1 lần: 2 request đồng thời không được dựng 2 store (event ghi vào bản bị bỏ sẽ mất)
+            if _interaction_store is None:
+                _interaction_store = InteractionStore(get_all_interactions())
+                print(f"✅ [Recommend] Interaction store: {len(_interaction_store)} events, "
+                      f"{len(_interaction_store.users)} users, {len(_interaction_store.hotel_list)} hotels")
+    return _interaction_store
+
+# Map id → hotel của catalogue, build 1 lần và dùng chung
+_hotels_by_id = None
+def get_hotels_by_id():
+    global _hotels_by_id
+    if _hotels_by_id is None:
+        _hotels_by_id = {h['id']: h for h in get_all_hotels()}
+    return _hotels_by_id
+
+# Bảng láng giềng precompute: K user gần nhất / user, M hotel giống nhất / hotel
+NEIGHBORS_FILE = "jsons/cf_neighbors.npz"
+USER_SIM_TOP_K = int(os.getenv("USER_SIM_TOP_K", 50))
+ITEM_SIM_TOP_K = int(os.getenv("ITEM_SIM_TOP_K", 100))
+
 # Precomputed user-item matrix (lazy init)
 _user_item_matrix = None
-_user_similarity_df = None
-_item_similarity_df = None
-
-def _build_user_item_matrix():
-    """Build user-item interaction matrix from interactions data."""
-    global _user_item_matrix
-    if _user_item_matrix is not None:
-        return _user_item_matrix
-
-    interactions = get_all_interactions()
-    if not interactions:
-        return None
+_neighbor_tables = None
 
-    signal_weights = {
-        "VIEW": 0.5,
-        "CLICK_BOOK_NOW": 2.0,
-        "ADD_TO_WISHLIST": 3.0,
-        "RATE_POSITIVE": 4.5,
-        "BOOK": 5.0,
-        "RATE_NEGATIVE": -3.0,
-    }
 
-    # Aggregate: (userId, hotelId) -> weighted score
-    data = defaultdict(lambda: defaultdict(float))
-    all_users = set()
-    all_hotels = set()
-
-    for inter in interactions:
-        uid = inter.get('userId')
-        hid = inter.get('hotelId')
-        itype = inter.get('type')
-        if itype in signal_weights:
-            data[uid][hid] = max(data[uid][hid], signal_weights[itype])
-            all_users.add(uid)
-            all_hotels.add(hid)
-
-    # Also include explicit ratings from reviews
+def _load_reviews():
     reviews_file = INTERACTIONS_FILE.replace("__interactions.json", "__reviews.json")
     try:
         with open(reviews_file, "r", encoding="utf-8") as f:
-            reviews = json.load(f)
-        for rev in reviews:
-            uid = rev.get('userId')
-            hid = rev.get('hotelId')
-            rating = float(rev.get('rating', 0))
-            if rating > 0:
-                data[uid][hid] = rating  # Override implicit with explicit
-                all_users.add(uid)
-                all_hotels.add(hid)
+            return json.load(f)
     except:
-        pass
+        return []
 
-    user_list = sorted(all_users)
-    hotel_list = sorted(all_hotels)
 
-    matrix = np.zeros((len(user_list), len(hotel_list)))
-    user_idx = {u: i for i, u in enumerate(user_list)}
-    hotel_idx = {h: i for i, h in enumerate(hotel_list)}
+def _parse_rating(rev):
+    """Rating của 1 review dạng float; None nếu thiếu / không phải số / NaN."""
+    try:
+        rating = float(rev.get('rating'))
+    except (TypeError, ValueError):
+        return None
+    return rating if np.isfinite(rating) else None
 
-    for uid, items in data.items():
-        for hid, score in items.items():
-            matrix[user_idx[uid]][hotel_idx[hid]] = score
 
-    _user_item_matrix = {
-        'matrix': matrix,
-        'user_list': user_list,
-        'hotel_list': hotel_list,
-        'user_idx': user_idx,
-        'hotel_idx': hotel_idx
-    }
-    print(f"✅ [Recommend] Built user-item matrix: {matrix.shape}")
+def _last_per_key(keys, priority, tiebreak):
+    """Vị trí bản ghi 'thắng' cho mỗi key: sort theo (key, priority, tiebreak) rồi lấy phần tử cuối mỗi nhóm."""
+    order = np.lexsort((tiebreak, priority, keys))
+    sorted_keys = keys[order]
+    is_last = np.ones(len(order), dtype=bool)
+    is_last[:-1] = sorted_keys[1:] != sorted_keys[:-1]
+    return order[is_last]
+
+
+def _build_user_item_matrix():
+    """User-item matrix dùng chung (lazy, build dưới _live_lock — chỉ 1 bản nhận event live)."""
+    global _user_item_matrix
+    if _user_item_matrix is None:
+        with _live_lock:
+            if _user_item_matrix is None:
+                _user_item_matrix = _load_user_item_matrix()
     return _user_item_matrix
 
 
-def _get_user_similarity():
-    """Compute user-user cosine similarity matrix."""
-    global _user_similarity_df
-    if _user_similarity_df is not None:
-        return _user_similarity_df
+def _load_user_item_matrix():
+    """
+    Build user-item interaction matrix (scipy.sparse CSR) from interactions data.
+    Implicit: max(0, max signal) cho mỗi (user, hotel); explicit rating (review) ghi đè, review sau cùng thắng.
+    """
+    store = get_interaction_store()
+    if not len(store):
+        return None
 
-    uim = _build_user_item_matrix()
-    if uim is None:
+    known = store.type_known[store.type_codes]
+    implicit = list(zip(store.column_users(known), store.hotel_ids[known].tolist(), store.weights[known]))
+    explicit = []
+    for rev in _load_reviews():
+        rating = _parse_rating(rev)
+        if rating is not None and rating > 0:
+            explicit.append((rev.get('userId'), rev.get('hotelId'), rating))
+
+    records = implicit + explicit
+    if not records:
         return None
+    uids, hids, values = zip(*records)
+
+    user_list, user_codes = np.unique(np.asarray(uids), return_inverse=True)
+    hotel_list, hotel_codes = np.unique(np.asarray(hids), return_inverse=True)
+    user_list, hotel_list = user_list.tolist(), hotel_list.tolist()
+    values = np.asarray(values, dtype=np.float64)
+
+    # Implicit: tiebreak = giá trị (max thắng); explicit: priority cao hơn, tiebreak = thứ tự (cuối thắng)
+    n_implicit = len(implicit)
+    priority = np.zeros(len(records), dtype=np.int8)
+    priority[n_implicit:] = 1
+    tiebreak = values.copy()
+    tiebreak[n_implicit:] = np.arange(len(explicit))
+    keys = user_codes.astype(np.int64) * len(hotel_list) + hotel_codes
+    winners = _last_per_key(keys, priority, tiebreak)
+
+    matrix = sparse.csr_matrix(
+        (np.maximum(values[winners], 0.0), (user_codes[winners], hotel_codes[winners])),
+        shape=(len(user_list), len(hotel_list)),
+    )
+    matrix.eliminate_zeros()  # RATE_NEGATIVE-only → 0, không tính là "đã tương tác"
+    explicit_pairs = zip(user_codes[winners][priority[winners] == 1].tolist(),
+                         hotel_codes[winners][priority[winners] == 1].tolist())
 
-    sim_matrix = cosine_similarity(uim['matrix'])
-    _user_similarity_df = {
-        'matrix': sim_matrix,
-        'user_list': uim['user_list']
+    # LiveUserItemMatrix: nhận event mới (record_interaction) mà không build lại; list/dict dùng chung bên dưới
+    live = LiveUserItemMatrix(matrix, user_list, hotel_list, explicit_pairs)
+    print(f"✅ [Recommend] Built user-item matrix: {matrix.shape} (nnz={matrix.nnz})")
+    return {
+        'live': live,
+        'user_list': live.user_list,
+        'hotel_list': live.hotel_list,
+        'user_idx': live.user_idx,
+        'hotel_idx': live.hotel_idx,
     }
-    print(f"✅ [Recommend] Computed user-user similarity: {sim_matrix.shape}")
-    return _user_similarity_df
 
 
-def _get_item_similarity():
-    """Compute item-item cosine similarity matrix."""
-    global _item_similarity_df
-    if _item_similarity_df is not None:
-        return _item_similarity_df
-
+def build_neighbor_tables(save=True):
+    """
+    Build bảng láng giềng top-K user-user và top-M item-item từ user-item matrix.
+    CHỈ chạy offline (build_cf_neighbors.py / retrain_worker.py) — serving chỉ đọc NEIGHBORS_FILE.
+    """
     uim = _build_user_item_matrix()
     if uim is None:
         return None
+    matrix = uim['live'].to_csr()
+    user_neighbors, user_sims = topk_cosine_neighbors(matrix, USER_SIM_TOP_K)
+    item_neighbors, item_sims = topk_cosine_neighbors(matrix.T.tocsr(), ITEM_SIM_TOP_K)
+    tables = {
+        'user_neighbors': user_neighbors, 'user_sims': user_sims,
+        'item_neighbors': item_neighbors, 'item_sims': item_sims,
+    }
+    print(f"✅ [Recommend] Built neighbor tables: users {user_neighbors.shape}, items {item_neighbors.shape}")
+    if save:
+        try:
+            save_neighbor_tables(NEIGHBORS_FILE, uim['user_list'][:matrix.shape[0]],
+                                 uim['hotel_list'][:matrix.shape[1]], **tables,
+                                 event_ids=[e['id'] for e in _replayed_live if e.get('id')])
+            print(f"💾 [Recommend] Saved neighbor tables → {NEIGHBORS_FILE}")
+        except OSError as e:
+            print(f"⚠️ [Recommend] Could not save neighbor tables: {e}")
+    return tables
+
+
+_NO_TABLES = {}  # Đã thử load nhưng không có file → mọi hàng tính cục bộ, không thử lại mỗi request
+
+
+def _get_neighbor_tables():
+    """Bảng láng giềng build offline (read-only), None nếu chưa có → láng giềng tính cục bộ theo từng hàng."""
+    global _neighbor_tables
+    if _neighbor_tables is None:
+        with _live_lock:
+            if _neighbor_tables is None:
+                uim = _build_user_item_matrix()
+                tables = None
+                if uim is not None:
+                    tables = load_neighbor_tables(NEIGHBORS_FILE, uim['user_idx'], uim['hotel_idx'],
+                                                  USER_SIM_TOP_K, ITEM_SIM_TOP_K)
+                if tables is not None:
+                    # User / hotel xuất hiện sau lần build, hoặc có event live bảng chưa tính → tính cục bộ khi cần
+                    _dirty_users.update(tables.pop('missing_users'))
+                    _dirty_items.update(tables.pop('missing_items'))
+                    built_with = tables.pop('event_ids')
+                    for event in _replayed_live:
+                        if event.get('id') in built_with:
+                            continue
+                        u, h = uim['user_idx'].get(event.get('userId')), uim['hotel_idx'].get(event.get('hotelId'))
+                        if u is not None:
+                            _dirty_users.add(u)
+                        if h is not None:
+                            _dirty_items.add(h)
+                    print(f"✅ [Recommend] Loaded neighbor tables from {NEIGHBORS_FILE}")
+                else:
+                    print(f"⚠️ [Recommend] No neighbor tables at {NEIGHBORS_FILE} "
+                          f"(run build_cf_neighbors.py) → computing neighbours per row")
+                _neighbor_tables = tables if tables is not None else _NO_TABLES
+    return _neighbor_tables or None
+
+
+# Láng giềng của hàng bị event mới chạm: tính lại cục bộ khi cần (lazy), ghi đè lên bảng precompute
+_dirty_users = set()
+_dirty_items = set()
+_user_neighbor_overlay = {}
+_item_neighbor_overlay = {}
+
+
+def _user_neighbors(u):
+    """(neighbors int32, sims float32) của user u — bảng precompute, hoặc tính lại nếu hàng u đã đổi / chưa có."""
+    tables = _get_neighbor_tables()
+    table = tables['user_neighbors'] if tables else None
+    cached = _user_neighbor_overlay.get(u)  # .get(): writer có thể pop giữa "in" và "[]"
+    if cached is not None:
+        return cached
+    if table is None or u >= len(table) or u in _dirty_users:
+        with _live_lock:
+            cached = _user_neighbor_overlay.get(u)
+            if cached is None:
+                live = _build_user_item_matrix()['live']
+                cached = _user_neighbor_overlay[u] = live.user_neighbors(u, USER_SIM_TOP_K)
+                _dirty_users.discard(u)
+        return cached
+    return table[u], tables['user_sims'][u]
+
+
+def _item_neighbor_rows(items):
+    """Bảng láng giềng (len(items), M) cho các hotel — hàng đã đổi / hotel mới được tính lại cục bộ."""
+    tables = _get_neighbor_tables()
+    table, sims = (tables['item_neighbors'], tables['item_sims']) if tables else (None, None)
+    items = np.asarray(items, dtype=np.int64)
+    if table is not None and not _item_neighbor_overlay and not _dirty_items and \
+            (len(items) == 0 or items.max() < len(table)):
+        return table[items], sims[items]
+
+    width = table.shape[1] if table is not None else ITEM_SIM_TOP_K
+    out_idx = np.full((len(items), width), -1, dtype=np.int32)
+    out_sims = np.zeros((len(items), width), dtype=np.float32)
+    for pos, h in enumerate(items.tolist()):
+        cached = _item_neighbor_overlay.get(h)
+        if cached is None and (table is None or h >= len(table) or h in _dirty_items):
+            with _live_lock:
+                cached = _item_neighbor_overlay.get(h)
+                if cached is None:
+                    live = _build_user_item_matrix()['live']
+                    cached = _item_neighbor_overlay[h] = live.item_neighbors(h, width)
+                    _dirty_items.discard(h)
+        if cached is not None:
+            out_idx[pos], out_sims[pos] = cached
+        else:
+            out_idx[pos], out_sims[pos] = table[h], sims[h]
+    return out_idx, out_sims
+
+
+def _rank_candidates(cols, scores, exclude=None, limit=None):
+    """Cột ứng viên có score > 0 (bỏ exclude), giảm dần theo score; chỉ sort `limit` phần tử đầu."""
+    mask = scores > 0
+    if exclude is not None and len(exclude):
+        mask &= ~np.isin(cols, exclude)
+    cols, scores = cols[mask], scores[mask]
+    if limit is not None and len(cols) > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        cols, scores = cols[top], scores[top]
+    order = np.lexsort((cols, -scores))  # Bằng điểm → chỉ số nhỏ trước
+    return cols[order]
+
+
+def _map_to_hotels(item_indices, hotel_list, hotels, top_k):
+    hotels_by_id = get_hotels_by_id() if hotels is get_all_hotels() else {h['id']: h for h in hotels}
+    results = []
+    for item_idx in item_indices[:top_k * 2]:  # Get extra to filter
+        hotel = hotels_by_id.get(hotel_list[item_idx])
+        if hotel:
+            results.append(hotel)
+        if len(results) >= top_k:
+            break
+    return results
+
+
+# ---------------------------------------------------------
+# LIVE INGESTION (event mới → cập nhật tăng dần, không build lại)
+# ---------------------------------------------------------
+_live_stats = {'events': 0, 'matrix_updates': 0, 'new_users': 0}
+
+
+def prepare_live_state():
+    """
+    Build các cấu trúc lazy (store, matrix, profile) TRƯỚC khi ghi event vào log live,
+    nếu không lần load đầu sẽ replay log và event bị tính 2 lần.
+    """
+    with _live_lock:
+        store = get_interaction_store()
+        uim = _build_user_item_matrix()
+        _, profiles = get_content_model()
+        return store, uim, profiles
+
 
-    # Item vectors = columns of user-item matrix (transpose)
-    item_matrix = uim['matrix'].T
-    sim_matrix = cosine_similarity(item_matrix)
-    _item_similarity_df = {
-        'matrix': sim_matrix,
-        'hotel_list': uim['hotel_list']
+def record_interaction(user_id: str, hotel_id, itype: str, timestamp=None) -> dict:
+    """
+    Áp 1 event mới vào interaction store, user-item matrix, content profile và popularity.
+    Hàng/cột bị đổi được đánh dấu "dirty" → láng giềng tính lại lazy ở request kế tiếp.
+    """
+    with _live_lock:
+        store, uim, profiles = prepare_live_state()
+
+        is_new_user = not store.has_user(user_id)
+        store.append(user_id, hotel_id, itype, timestamp)
+        profiles.add_event(user_id, hotel_id, SIGNAL_WEIGHTS.get(itype, 1.0))
+        if _hotel_signals is not None:
+            _hotel_signals.add_interaction(hotel_id, SIGNAL_WEIGHTS.get(itype, 1.0))
+        if _svd_scorer is not None:
+            _svd_scorer.forget(user_id)
+
+        changed = False
+        if uim is not None and itype in SIGNAL_WEIGHTS:
+            u, h, changed = uim['live'].apply_implicit(user_id, hotel_id, SIGNAL_WEIGHTS[itype])
+            if changed:
+                _dirty_users.add(u)
+                _dirty_items.add(h)
+                _user_neighbor_overlay.pop(u, None)
+                _item_neighbor_overlay.pop(h, None)
+
+        _live_stats['events'] += 1
+        _live_stats['matrix_updates'] += int(changed)
+        _live_stats['new_users'] += int(is_new_user)
+        return {'new_user': is_new_user, 'matrix_changed': changed}
+
+
+def user_generation(user_id: str) -> int:
+    """Số event của user — đổi khi user có interaction mới (dùng làm phần key cache kết quả)."""
+    return len(get_interaction_store().user_events(user_id))
+
+
+def live_stats() -> dict:
+    uim = _user_item_matrix
+    return {
+        **_live_stats,
+        'matrix_shape': list(uim['live'].shape) if uim else None,
+        'matrix_overlay_rows': uim['live'].overlay_rows if uim else 0,
+        'dirty_users': len(_dirty_users),
+        'dirty_items': len(_dirty_items),
+        'svd_folded_users': len(_svd_scorer.folded) if _svd_scorer is not None else 0,
+        'hotel_signals': _hotel_signals.stats() if _hotel_signals is not None else None,
     }
-    print(f"✅ [Recommend] Computed item-item similarity: {sim_matrix.shape}")
-    return _item_similarity_df
 
 
 # ---------------------------------------------------------
@@ -196,10 +493,10 @@ def _get_item_similarity():
 # ---------------------------------------------------------
 def build_user_profile(user_id: str) -> dict:
     """Build user profile from interaction history."""
-    interactions = get_all_interactions()
-    hotels = {h['id']: h for h in get_all_hotels()}
+    store = get_interaction_store()
+    hotels = get_hotels_by_id()
 
-    user_inters = [i for i in interactions if i['userId'] == user_id]
+    user_inters = store.user_history(user_id)
     if not user_inters:
         return None
 
@@ -208,20 +505,11 @@ def build_user_profile(user_id: str) -> dict:
     amenity_counts = defaultdict(int)
     prices = []
 
-    weight_map = {
-        "VIEW": 0.5,
-        "CLICK_BOOK_NOW": 2.0,
-        "ADD_TO_WISHLIST": 3.0,
-        "RATE_POSITIVE": 4.5,
-        "BOOK": 5.0,
-        "RATE_NEGATIVE": -3.0,
-    }
-
-    for inter in user_inters:
-        hotel = hotels.get(inter['hotelId'])
+    for hotel_id, itype, _ in user_inters:
+        hotel = hotels.get(hotel_id)
         if not hotel:
             continue
-        w = weight_map.get(inter['type'], 1.0)
+        w = SIGNAL_WEIGHTS.get(itype, 1.0)
 
         address = hotel.get('address', '')
         if ' Đường ' in address:
@@ -246,6 +534,44 @@ def build_user_profile(user_id: str) -> dict:
     }
 
 
+# ---------------------------------------------------------
+# CONTENT FEATURES (vectorized)
+# ---------------------------------------------------------
+_content_model = None
+_foreign_features = (None, None)  # (list hotels, HotelFeatures) — list khác catalogue, cache 1 slot
+
+def get_content_model():
+    """(HotelFeatures của catalogue, UserProfiles của mọi user) — build 1 lần."""
+    global _content_model
+    if _content_model is None:
+        with _live_lock:
+            if _content_model is None:
+                features = HotelFeatures(get_all_hotels())
+                store = get_interaction_store()
+                profiles = UserProfiles(features, store.column_users(), store.hotel_ids.tolist(), store.weights)
+                _content_model = (features, profiles)
+                print(f"✅ [Recommend] Content features: {len(features)} hotels, "
+                      f"{len(features.locations)} locations, {len(features.amenities)} amenities, "
+                      f"{len(profiles.user_index)} user profiles")
+    return _content_model
+
+
+def _features_for(hotels):
+    global _foreign_features
+    features, _ = get_content_model()
+    if hotels is get_all_hotels():
+        return features
+    if _foreign_features[0] is not hotels:
+        _foreign_features = (hotels, HotelFeatures(hotels, vocabs=features.vocabs))
+    return _foreign_features[1]
+
+
+def content_scores_for_user(user_id: str, hotels: list) -> np.ndarray:
+    """Vector điểm content cho từng hotel trong `hotels` (= compute_content_score trên từng hotel)."""
+    _, profiles = get_content_model()
+    return content_scores(profiles, user_id, _features_for(hotels))
+
+
 # ---------------------------------------------------------
 # CONTENT SIMILARITY SCORING
 # ---------------------------------------------------------
@@ -311,41 +637,26 @@ def svd_recommend(user_id: str, hotels: list, top_k: int = 5) -> list:
         print("⚠️ [SVD] No model loaded, falling back to popular")
         return popular_recommend(hotels, top_k)
 
-    # Check if user is in SVD model
-    try:
-        algo.trainset.to_inner_uid(user_id)
-    except ValueError:
+    # Check if user is in SVD model (user mới → fold-in từ lịch sử hiện có)
+    if not fold_in_user(user_id):
         print(f"👶 [SVD] User {user_id} not in model, falling back to content")
         return content_recommend(user_id, hotels, top_k)
 
     print(f"🤖 [SVD] User {user_id} → Hybrid SVD + Content scoring.")
-    user_profile = build_user_profile(user_id)
-
-    predictions = []
-    for hotel in hotels:
-        svd_pred = algo.predict(user_id, hotel.get("id"))
-        svd_score = svd_pred.est
-
-        content_score = compute_content_score(user_profile, hotel)
-        svd_normalized = (svd_score - 1) / 4
 
-        hybrid_score = SVD_WEIGHT * svd_normalized + CONTENT_WEIGHT_SVD * content_score
+    # SVD cho toàn bộ hotel: 1 phép qi @ pu[u] thay vì N lần algo.predict
+    svd_scores = get_svd_scorer().score_items(user_id, hotels)
+    content = content_scores_for_user(user_id, hotels)
+    svd_normalized = (svd_scores - 1) / 4
+    hybrid_scores = SVD_WEIGHT * svd_normalized + CONTENT_WEIGHT_SVD * content
 
-        predictions.append({
-            "data": hotel,
-            "score": hybrid_score,
-            "svd_score": svd_score,
-            "content_score": content_score
-        })
+    top = top_k_indices(hybrid_scores, max(top_k, 3))
+    for i, idx in enumerate(top[:3]):
+        print(f"   #{i+1}: {hotels[idx].get('title', 'N/A')[:30]} | "
+              f"SVD={svd_scores[idx]:.2f} | Content={content[idx]:.3f} | "
+              f"Hybrid={hybrid_scores[idx]:.3f}")
 
-    predictions.sort(key=lambda x: x["score"], reverse=True)
-
-    for i, p in enumerate(predictions[:3]):
-        print(f"   #{i+1}: {p['data'].get('title', 'N/A')[:30]} | "
-              f"SVD={p['svd_score']:.2f} | Content={p['content_score']:.3f} | "
-              f"Hybrid={p['score']:.3f}")
-
-    return [p["data"] for p in predictions[:top_k]]
+    return [hotels[idx] for idx in top[:top_k]]
 
 
 # =========================================================
@@ -357,66 +668,39 @@ def user_based_cf_recommend(user_id: str, hotels: list, top_k: int = 5) -> list:
     Finds K most similar users and recommends their liked hotels.
     """
     uim = _build_user_item_matrix()
-    usim = _get_user_similarity()
 
-    if uim is None or usim is None:
+    if uim is None:
         print("⚠️ [User-CF] Cannot build matrix, falling back to popular")
         return popular_recommend(hotels, top_k)
 
     user_idx_map = uim['user_idx']
     hotel_list = uim['hotel_list']
     hotel_idx_map = uim['hotel_idx']
-    matrix = uim['matrix']
+    live = uim['live']
 
-    if user_id not in user_idx_map:
+    uid_idx = user_idx_map.get(user_id)
+    if uid_idx is None:
         print(f"👶 [User-CF] User {user_id} not in matrix, falling back to content")
         return content_recommend(user_id, hotels, top_k)
 
-    uid_idx = user_idx_map[user_id]
-    sim_scores = usim['matrix'][uid_idx]
-
-    # Find K most similar users (exclude self)
-    sim_users = [(i, sim_scores[i]) for i in range(len(sim_scores)) if i != uid_idx]
-    sim_users.sort(key=lambda x: x[1], reverse=True)
-    top_similar = sim_users[:USER_CF_K]
+    # K most similar users (exclude self) — đọc thẳng từ bảng láng giềng đã sắp xếp
+    neighbor_idx, neighbor_sim = _user_neighbors(uid_idx)
+    neighbor_idx, neighbor_sim = neighbor_idx[:USER_CF_K], neighbor_sim[:USER_CF_K].astype(np.float64)
+    valid = neighbor_idx >= 0
+    neighbor_idx, neighbor_sim = neighbor_idx[valid], neighbor_sim[valid]
 
     print(f"👥 [User-CF] User {user_id} → Top-{USER_CF_K} similar users")
-    for i, (idx, sim) in enumerate(top_similar[:3]):
-        print(f"   #{i+1}: {usim['user_list'][idx]} (sim={sim:.3f})")
+    for i, (idx, sim) in enumerate(zip(neighbor_idx[:3], neighbor_sim[:3])):
+        print(f"   #{i+1}: {uim['user_list'][idx]} (sim={sim:.3f})")
 
-    # Aggregate recommendations from similar users
-    user_rated = set(np.where(matrix[uid_idx] > 0)[0])
-    item_scores = defaultdict(float)
-    item_sim_sum = defaultdict(float)
+    # Gather hotel của K láng giềng → Σ sim·r / Σ sim (chỉ trên các hotel láng giềng đã tương tác)
+    owner, cols, ratings = live.rows(neighbor_idx)
+    cols, score_sum, sim_sum = accumulate(cols, neighbor_sim[owner], ratings)
+    final_scores = np.divide(score_sum, sim_sum, out=np.zeros_like(score_sum), where=sim_sum > 0)
 
-    for neighbor_idx, similarity in top_similar:
-        if similarity <= 0:
-            continue
-        for item_idx in range(len(hotel_list)):
-            if item_idx in user_rated:
-                continue
-            if matrix[neighbor_idx][item_idx] > 0:
-                item_scores[item_idx] += similarity * matrix[neighbor_idx][item_idx]
-                item_sim_sum[item_idx] += similarity
-
-    # Normalize and sort
-    final_scores = []
-    for item_idx, score_sum in item_scores.items():
-        normalized = score_sum / item_sim_sum[item_idx] if item_sim_sum[item_idx] > 0 else 0
-        final_scores.append((item_idx, normalized))
-
-    final_scores.sort(key=lambda x: x[1], reverse=True)
-
-    # Map back to hotel data
-    hotels_by_id = {h['id']: h for h in hotels}
-    results = []
-    for item_idx, score in final_scores[:top_k * 2]:  # Get extra to filter
-        hotel_id = hotel_list[item_idx]
-        hotel = hotels_by_id.get(hotel_id)
-        if hotel:
-            results.append(hotel)
-        if len(results) >= top_k:
-            break
+    user_rated, _ = live.row(uid_idx)
+    ranked = _rank_candidates(cols, final_scores, exclude=user_rated, limit=top_k * 2)
+    results = _map_to_hotels(ranked, hotel_list, hotels, top_k)
 
     if results:
         return results
@@ -434,64 +718,31 @@ def item_based_cf_recommend(user_id: str, hotels: list, top_k: int = 5) -> list:
     Recommends hotels similar to what the user has already interacted with.
     """
     uim = _build_user_item_matrix()
-    isim = _get_item_similarity()
 
-    if uim is None or isim is None:
+    if uim is None:
         print("⚠️ [Item-CF] Cannot build matrix, falling back to popular")
         return popular_recommend(hotels, top_k)
 
     user_idx_map = uim['user_idx']
     hotel_list = uim['hotel_list']
     hotel_idx_map = uim['hotel_idx']
-    matrix = uim['matrix']
+    live = uim['live']
 
-    if user_id not in user_idx_map:
+    uid_idx = user_idx_map.get(user_id)
+    if uid_idx is None:
         print(f"👶 [Item-CF] User {user_id} not in matrix, falling back to content")
         return content_recommend(user_id, hotels, top_k)
 
-    uid_idx = user_idx_map[user_id]
-    user_ratings = matrix[uid_idx]
-
     # Find hotels user has interacted with
-    rated_indices = np.where(user_ratings > 0)[0]
+    rated_indices, user_ratings = live.row(uid_idx)
     if len(rated_indices) == 0:
         return content_recommend(user_id, hotels, top_k)
 
     print(f"🏨 [Item-CF] User {user_id} → Based on {len(rated_indices)} interacted hotels")
 
-    # Score unseen hotels by similarity to rated hotels
-    item_scores = defaultdict(float)
-    item_sim_sum = defaultdict(float)
-
-    for rated_idx in rated_indices:
-        user_rating = user_ratings[rated_idx]
-        sim_scores = isim['matrix'][rated_idx]
-
-        for candidate_idx in range(len(hotel_list)):
-            if candidate_idx in set(rated_indices):
-                continue
-            if sim_scores[candidate_idx] > 0:
-                item_scores[candidate_idx] += sim_scores[candidate_idx] * user_rating
-                item_sim_sum[candidate_idx] += sim_scores[candidate_idx]
-
-    # Normalize and sort
-    final_scores = []
-    for item_idx, score_sum in item_scores.items():
-        normalized = score_sum / item_sim_sum[item_idx] if item_sim_sum[item_idx] > 0 else 0
-        final_scores.append((item_idx, normalized))
-
-    final_scores.sort(key=lambda x: x[1], reverse=True)
-
-    # Map back to hotel data
-    hotels_by_id = {h['id']: h for h in hotels}
-    results = []
-    for item_idx, score in final_scores[:top_k * 2]:
-        hotel_id = hotel_list[item_idx]
-        hotel = hotels_by_id.get(hotel_id)
-        if hotel:
-            results.append(hotel)
-        if len(results) >= top_k:
-            break
+    cols, final_scores = _item_cf_scores(rated_indices, user_ratings)
+    ranked = _rank_candidates(cols, final_scores, exclude=rated_indices, limit=top_k * 2)
+    results = _map_to_hotels(ranked, hotel_list, hotels, top_k)
 
     if results:
         return results
@@ -500,6 +751,30 @@ def item_based_cf_recommend(user_id: str, hotels: list, top_k: int = 5) -> list:
     return popular_recommend(hotels, top_k)
 
 
+def _item_cf_scores(rated_indices, user_ratings):
+    """Gather top-M hotel giống mỗi hotel đã tương tác → (cột, Σ sim·r / Σ sim)."""
+    neighbors, sims = _item_neighbor_rows(rated_indices)
+    sims = sims.astype(np.float64)
+    ratings = np.broadcast_to(user_ratings[:, None], neighbors.shape)
+    valid = neighbors >= 0
+    cols, score_sum, sim_sum = accumulate(neighbors[valid], sims[valid], ratings[valid])
+    return cols, np.divide(score_sum, sim_sum, out=np.zeros_like(score_sum), where=sim_sum > 0)
+
+
+def item_cf_candidates(user_id: str, limit: int):
+    """Top-`limit` hotelId theo Item-CF (bỏ hotel đã tương tác) — candidate generator cho src/pipeline.py."""
+    uim = _build_user_item_matrix()
+    uid_idx = uim['user_idx'].get(user_id) if uim is not None else None
+    if uid_idx is None:
+        return []
+    rated_indices, user_ratings = uim['live'].row(uid_idx)
+    if len(rated_indices) == 0:
+        return []
+    cols, final_scores = _item_cf_scores(rated_indices, user_ratings)
+    ranked = _rank_candidates(cols, final_scores, exclude=rated_indices, limit=limit)
+    return [uim['hotel_list'][c] for c in ranked[:limit].tolist()]
+
+
 # =========================================================
 # STRATEGY 4: Content-Based (Onboarding)
 # =========================================================
@@ -537,14 +812,187 @@ def content_recommend(user_id: str, hotels: list, top_k: int = 5) -> list:
 def popular_recommend(hotels: list, top_k: int = 5) -> list:
     """Fallback: top-rated hotels by reviewStar * reviewCount."""
     print("🎲 [Popular] Fallback → Top-rated hotels.")
+    # Bằng điểm → ưu tiên hotel đang được tương tác nhiều (popularity counter cập nhật realtime)
+    live_popularity = get_interaction_store().hotel_popularity
     sorted_by_rating = sorted(
         hotels,
-        key=lambda h: (h.get('reviewStar', 0) * h.get('reviewCount', 0)),
+        key=lambda h: (h.get('reviewStar', 0) * h.get('reviewCount', 0), live_popularity.get(h.get('id'), 0.0)),
         reverse=True
     )
     return sorted_by_rating[:top_k]
 
 
+# =========================================================
+# STRATEGY 6: Hybrid 4 pillars (Content + Collaborative + Sentiment + Popularity)
+# =========================================================
+REVIEWS_CHECK_S = float(os.getenv("REVIEWS_CHECK_S", 60))  # Chu kỳ kiểm tra __reviews.json có review mới
+
+_hotel_signals = None
+_hotel_signals_mtime = None  # mtime file review đã áp vào _hotel_signals
+_reviews_state = {'mtime': None, 'checked_at': 0.0}
+
+def _reviews_mtime():
+    try:
+        return os.stat(INTERACTIONS_FILE.replace("__interactions.json", "__reviews.json")).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _current_reviews_mtime():
+    """mtime __reviews.json, stat lại tối đa 1 lần / REVIEWS_CHECK_S (dùng chung cho signal + rating fold-in)."""
+    now = time.monotonic()
+    if not _reviews_state['checked_at'] or now - _reviews_state['checked_at'] >= REVIEWS_CHECK_S:
+        _reviews_state['checked_at'] = now
+        _reviews_state['mtime'] = _reviews_mtime()
+    return _reviews_state['mtime']
+
+
+def get_hotel_signals() -> HotelSignals:
+    """Vector sentiment / popularity của catalogue; file review đổi → chỉ áp các review mới."""
+    global _hotel_signals, _hotel_signals_mtime
+    mtime = _current_reviews_mtime()
+    signals = _hotel_signals
+    if signals is not None and mtime == _hotel_signals_mtime:
+        return signals  # Đường thường gặp: không lấy _live_lock (request hybrid / pipeline không chờ ingest)
+
+    reviews = _load_reviews()  # Parse file review ngoài lock; dưới lock chỉ áp delta
+    with _live_lock:
+        if _hotel_signals is None:
+            _hotel_signals = HotelSignals(get_all_hotels(), reviews, get_interaction_store().hotel_popularity)
+            _hotel_signals_mtime = mtime
+            print(f"✅ [Recommend] Hotel signals: {_hotel_signals.stats()}")
+        elif mtime != _hotel_signals_mtime:
+            added = _hotel_signals.add_reviews(reviews)
+            _hotel_signals_mtime = mtime
+            print(f"🔄 [Recommend] Reviews file changed → {added} new reviews applied to sentiment")
+    return _hotel_signals
+
+
+def hybrid_recommend(user_id: str, hotels: list, top_k: int = 5) -> list:
+    """
+    Hybrid 4 pillars: điểm = Σ trọng số × vector điểm theo hotel (1 phép blend vector).
+    Collaborative = SVD (cả user fold-in); user không có vector SVD → bỏ pillar này và chuẩn hóa lại trọng số.
+    """
+    sentiment, popularity = get_hotel_signals().vectors_for(hotels)
+    pillars = [
+        (CONTENT_WEIGHT, content_scores_for_user(user_id, hotels)),
+        (SENTIMENT_WEIGHT, sentiment),
+        (POPULARITY_WEIGHT, popularity),
+    ]
+    if algo is not None and fold_in_user(user_id):
+        svd_scores = get_svd_scorer().score_items(user_id, hotels)
+        pillars.append((COLLABORATIVE_WEIGHT, (svd_scores - 1) / 4))
+
+    weights = np.array([w for w, _ in pillars])
+    vectors = np.vstack([v for _, v in pillars])
+    hybrid_scores = (weights / weights.sum()) @ vectors
+
+    print(f"🧬 [Hybrid] User {user_id} → {len(pillars)} pillars")
+    top = top_k_indices(hybrid_scores, max(top_k, 3))
+    for i, idx in enumerate(top[:3]):
+        print(f"   #{i+1}: {hotels[idx].get('title', 'N/A')[:30]} | " +
+              " | ".join(f"{v[idx]:.3f}" for v in vectors) + f" | Hybrid={hybrid_scores[idx]:.3f}")
+
+    return [hotels[idx] for idx in top[:top_k]]
+
+
+# =========================================================
+# STRATEGY 7: Two-stage (candidate generation → re-rank, src/pipeline.py)
+# =========================================================
+def pipeline_recommend(user_id: str, hotels: list, top_k: int = 5) -> list:
+    """Chỉ chấm điểm nặng trên vài trăm ứng viên thay vì toàn bộ catalogue."""
+    if hotels is not get_all_hotels():
+        return hybrid_recommend(user_id, hotels, top_k)  # List hotel tùy ý: không có index ứng viên
+
+    from src.pipeline import two_stage_recommend
+    results, timings = two_stage_recommend(user_id, top_k)
+    print(f"🪜 [Pipeline] User {user_id} → " + " | ".join(f"{k}={v:.2f}ms" for k, v in timings.items()))
+    return results if results else popular_recommend(hotels, top_k)
+
+
+# =========================================================
+# BATCH SCORING (precompute cho src/rec_batch.py)
+# =========================================================
+def _svd_batch_scores(users, hotels):
+    """Hybrid SVD + content như svd_recommend cho nhiều user; chỉ user có trong model (không fold-in)."""
+    scorer = get_svd_scorer()
+    if scorer is None:
+        return None
+    has_row = np.array([u in scorer.user_index for u in users], dtype=bool)
+    scores = np.zeros((len(users), len(hotels)))
+    known = [u for u, ok in zip(users, has_row) if ok]
+    if known:
+        _, profiles = get_content_model()
+        svd = scorer.score_items_many(known, hotels)
+        content = content_scores_many(profiles, known, _features_for(hotels))
+        scores[has_row] = SVD_WEIGHT * (svd - 1) / 4 + CONTENT_WEIGHT_SVD * content
+    return scores, np.repeat(has_row[:, None], len(hotels), axis=1)
+
+
+def _cf_batch_scores(strategy, users, hotels, state):
+    """
+    Σ sim·r / Σ sim của user_cf / item_cf cho cả chunk bằng sparse matmul:
+      user_cf: S (chunk × users, top-USER_CF_K sim) @ R      item_cf: R_chunk @ T (hotels × hotels, top-M sim)
+    """
+    uim = _build_user_item_matrix()
+    if uim is None:
+        return None
+    if 'matrix' not in state:
+        matrix = uim['live'].to_csr()
+        binary = matrix.copy()
+        binary.data = np.ones_like(binary.data)
+        row_of = {h.get('id'): i for i, h in enumerate(hotels)}
+        state['matrix'], state['binary'] = matrix, binary
+        state['col_to_row'] = np.array([row_of.get(h, -1) for h in uim['hotel_list']], dtype=np.int64)
+    matrix, binary = state['matrix'], state['binary']
+
+    rows = np.array([uim['user_idx'].get(u, -1) for u in users], dtype=np.int64)
+    in_matrix = rows >= 0
+    R, B = matrix[rows[in_matrix]], binary[rows[in_matrix]]
+
+    if strategy == 'user_cf':
+        neighbors, sims = zip(*(_user_neighbors(u) for u in rows[in_matrix].tolist())) if in_matrix.any() else ((), ())
+        neighbors = np.array([n[:USER_CF_K] for n in neighbors], dtype=np.int64).reshape(-1, USER_CF_K)
+        sims = np.array([s[:USER_CF_K] for s in sims], dtype=np.float64).reshape(-1, USER_CF_K)
+        valid = neighbors >= 0
+        owner = np.repeat(np.arange(len(neighbors)), valid.sum(axis=1))
+        S = sparse.csr_matrix((sims[valid], (owner, neighbors[valid])), shape=(len(neighbors), matrix.shape[0]))
+        score_sum, sim_sum = (S @ matrix).toarray(), (S @ binary).toarray()
+        has_row = np.ones(len(neighbors), dtype=bool)
+    else:
+        if 'item_T' not in state:
+            n_items = matrix.shape[1]
+            neighbors, sims = _item_neighbor_rows(np.arange(n_items))
+            valid = neighbors >= 0
+            owner = np.repeat(np.arange(n_items), valid.sum(axis=1))
+            state['item_T'] = sparse.csr_matrix(
+                (sims[valid].astype(np.float64), (owner, neighbors[valid])), shape=(n_items, n_items))
+        score_sum, sim_sum = (R @ state['item_T']).toarray(), (B @ state['item_T']).toarray()
+        has_row = np.diff(R.indptr) > 0  # Chưa tương tác hotel nào → content_recommend (online)
+
+    final = np.divide(score_sum, sim_sum, out=np.zeros_like(score_sum), where=sim_sum > 0)
+    valid = (final > 0) & (B.toarray() == 0) & has_row[:, None]
+
+    # Cột matrix → thứ tự list hotels (bỏ hotel không có trong list)
+    col_to_row = state['col_to_row']
+    keep = col_to_row >= 0
+    scores = np.zeros((len(users), len(hotels)))
+    mask = np.zeros((len(users), len(hotels)), dtype=bool)
+    in_rows = np.nonzero(in_matrix)[0]
+    scores[np.ix_(in_rows, col_to_row[keep])] = final[:, keep]
+    mask[np.ix_(in_rows, col_to_row[keep])] = valid[:, keep]
+    return scores, mask
+
+
+def batch_scores(strategy: str, users: list, hotels: list, state: dict):
+    """(scores, valid) dạng (len(users), len(hotels)) của 1 strategy; None nếu strategy không chạy được."""
+    if strategy == 'svd':
+        return _svd_batch_scores(users, hotels)
+    if strategy in ('user_cf', 'item_cf'):
+        return _cf_batch_scores(strategy, users, hotels, state)
+    raise ValueError(f"Strategy '{strategy}' không hỗ trợ precompute")
+
+
 # =========================================================
 # SIMILAR HOTELS (for detail page)
 # =========================================================
@@ -553,8 +1001,8 @@ def get_similar_hotels(hotel_id, hotels: list, top_k: int = 5) -> list:
     Find hotels similar to a given hotel using Item-CF similarity.
     Used for "Khách sạn tương tự" feature on detail page.
     """
-    isim = _get_item_similarity()
-    if isim is None:
+    uim = _build_user_item_matrix()
+    if uim is None:
         # Fallback: find hotels in same category
         target = None
         for h in hotels:
@@ -569,28 +1017,17 @@ def get_similar_hotels(hotel_id, hotels: list, top_k: int = 5) -> list:
                     and str(h.get('id')) != str(hotel_id)]
         return same_cat[:top_k] if same_cat else popular_recommend(hotels, top_k)
 
-    hotel_list = isim['hotel_list']
-    hotel_idx_map = {hid: i for i, hid in enumerate(hotel_list)}
+    hotel_list = uim['hotel_list']
+    hotel_idx_map = uim['hotel_idx']
 
-    if hotel_id not in hotel_idx_map:
+    idx = hotel_idx_map.get(hotel_id)
+    if idx is None:
         return popular_recommend(hotels, top_k)
 
-    idx = hotel_idx_map[hotel_id]
-    sim_scores = isim['matrix'][idx]
-
-    # Sort by similarity (exclude self)
-    similar_indices = [(i, sim_scores[i]) for i in range(len(sim_scores)) if i != idx]
-    similar_indices.sort(key=lambda x: x[1], reverse=True)
-
-    hotels_by_id = {h['id']: h for h in hotels}
-    results = []
-    for item_idx, score in similar_indices[:top_k * 2]:
-        hid = hotel_list[item_idx]
-        hotel = hotels_by_id.get(hid)
-        if hotel:
-            results.append(hotel)
-        if len(results) >= top_k:
-            break
+    # Bảng láng giềng đã sắp giảm dần theo sim (không chứa chính nó)
+    similar_indices, _ = _item_neighbor_rows([idx])
+    similar_indices = similar_indices[0]
+    results = _map_to_hotels(similar_indices[similar_indices >= 0], hotel_list, hotels, top_k)
 
     return results if results else popular_recommend(hotels, top_k)
 
@@ -604,6 +1041,8 @@ STRATEGY_MAP = {
     'item_cf': item_based_cf_recommend,
     'content': content_recommend,
     'popular': popular_recommend,
+    'hybrid': hybrid_recommend,
+    'pipeline': pipeline_recommend,
 }
 
 
@@ -616,13 +1055,23 @@ def get_recommendations_for_user(
 ) -> list:
     """
     Multi-strategy recommendation dispatcher.
-    strategy: 'svd' | 'user_cf' | 'item_cf' | 'content' | 'popular'
+    strategy: 'svd' | 'user_cf' | 'item_cf' | 'content' | 'popular' | 'hybrid' | 'pipeline'
     """
     try:
         hotels = hotel_vectors or get_all_hotels()
         if not hotels:
             return []
 
+        # Bảng precompute (nightly batch): O(1) nếu user đã có trong batch và chưa có event mới
+        if not hotel_vectors:
+            ids = batch_recommendations.lookup(user_id, strategy, top_k, user_generation(user_id), algo_version)
+            if ids:
+                hotels_by_id = get_hotels_by_id()
+                results = [hotels_by_id[hid] for hid in ids if hid in hotels_by_id]
+                if results:
+                    print(f"\n📦 [Recommend] User={user_id} | Strategy={strategy} | Top-K={top_k} → precomputed")
+                    return results
+
         # Get strategy function
         strategy_fn = STRATEGY_MAP.get(strategy, svd_recommend)
         print(f"\n🎯 [Recommend] User={user_id} | Strategy={strategy} | Top-K={top_k}")
@@ -638,4 +1087,5 @@ def get_recommendations_for_user(
         print(f"❌ Recommendation error: {e}")
         import traceback
         traceback.print_exc()
-        return random.sample(hotel_vectors or get_all_hotels(), min(top_k, len(hotel_vectors or [])))
\ No newline at end of file
+        pool = hotel_vectors or get_all_hotels()
+        return random.sample(pool, min(top_k, len(pool)))
\ No newline at end of file
@@ -0,0 +1,152 @@
+# src/result_cache.py
+# Cache kết quả /recommend/{user_id} theo (user, strategy, top_k):
+# - Tier 1: LRU trong process, mỗi entry có hạn TTL
+# - Tier 2 (tùy chọn): Redis, JSON + TTL → dùng chung giữa các worker
+# Invalidate không cần xóa key: key chứa version model + "generation" của user
+# → user có event mới / reload model → key mới, entry cũ tự hết hạn.
+# Generation = counter Redis của user (INCR mỗi lần ingest, chung mọi worker — kể cả khi không bật stream)
+# + số event worker này đã áp → worker chưa thấy event không đọc được entry cũ của worker khác và ngược lại.
+
+import os
+import json
+import time
+from src.utils.lru import LRUCache
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+REC_CACHE_ENABLED = os.getenv("REC_CACHE_ENABLED", "1") == "1"
+REC_CACHE_SIZE = int(os.getenv("REC_CACHE_SIZE", 5000))
+REC_CACHE_TTL = int(os.getenv("REC_CACHE_TTL", 300))                 # 5 phút
+REC_CACHE_REDIS = os.getenv("REC_CACHE_REDIS", "1") == "1"
+REC_CACHE_REDIS_RETRY = float(os.getenv("REC_CACHE_REDIS_RETRY", 30))  # Redis lỗi → tắt tier 2 trong N giây
+REC_CACHE_GEN_TTL = int(os.getenv("REC_CACHE_GEN_TTL", 24 * 3600))   # Phải > REC_CACHE_TTL (counter hết hạn → về 0)
+REDIS_KEY_PREFIX = "rec"
+GENERATION_KEY_PREFIX = "recgen"
+
+
+class ResultCache:
+    def __init__(self, max_items=REC_CACHE_SIZE, ttl=REC_CACHE_TTL, use_redis=REC_CACHE_REDIS):
+        self.memory = LRUCache(max_items)
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self._redis_down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(model_version, user_id, generation, strategy, top_k):
+        return f"{REDIS_KEY_PREFIX}:{model_version}:{user_id}:{generation}:{strategy}:{top_k}"
+
+    def user_generation(self, user_id, local_generation):
+        """Counter Redis của user + số event local; Redis tắt → chỉ local (tier 2 cũng không được dùng)."""
+        client = self._get_redis()
+        if client is None:
+            return f"local.{local_generation}"
+        try:
+            shared = client.get(f"{GENERATION_KEY_PREFIX}:{user_id}")
+        except Exception as e:
+            self._redis_failed(e)
+            return f"local.{local_generation}"
+        return f"{shared or 0}.{local_generation}"
+
+    def bump_generations(self, user_ids):
+        """Ingest gọi: mọi worker đổi key của các user này (entry Redis cũ không còn được đọc)."""
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id in set(user_ids):
+                key = f"{GENERATION_KEY_PREFIX}:{user_id}"
+                pipe.incr(key)
+                pipe.expire(key, REC_CACHE_GEN_TTL)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    # ---------- Redis tier ----------
+    def _get_redis(self):
+        if not self.use_redis or time.monotonic() < self._redis_down_until:
+            return None
+        try:
+            from src.utils.redis_client import get_redis_client
+            return get_redis_client()
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+
+    def _redis_failed(self, error):
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + REC_CACHE_REDIS_RETRY
+        print(f"⚠️ [RecCache] Redis không khả dụng ({error}), tắt tier 2 trong {REC_CACHE_REDIS_RETRY:.0f}s")
+
+    # ---------- API ----------
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self.hits += 1
+                return value
+            self.memory.pop(key)
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                raw = client.get(key)
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw:
+                value = json.loads(raw)
+                self.memory.put(key, (time.monotonic() + self.ttl, value))
+                self.hits += 1
+                self.redis_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.memory.put(key, (time.monotonic() + self.ttl, value))
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.set(key, json.dumps(value, ensure_ascii=False, default=str), ex=self.ttl)
+            except Exception as e:
+                self._redis_failed(e)
+
+    def get_or_compute(self, key, compute_fn):
+        """Blocking (Redis I/O + compute) → gọi trong run_io."""
+        value = self.get(key)
+        if value is None:
+            value = compute_fn()
+            if value:
+                self.put(key, value)
+        return value
+
+    def clear_local(self):
+        """Reload model: bỏ tier 1 ngay (tier 2 đã đổi key theo version model)."""
+        self.memory.clear()
+        self.invalidations += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": REC_CACHE_ENABLED,
+            "ttl_s": self.ttl,
+            "size": len(self.memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "redis_hits": self.redis_hits,
+            "redis_errors": self.redis_errors,
+            "redis_enabled": self.use_redis and time.monotonic() >= self._redis_down_until,
+            "invalidations": self.invalidations,
+        }
+
+
+recommendation_cache = ResultCache()
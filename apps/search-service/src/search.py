@@ -1,21 +1,179 @@
-from sentence_transformers import util
-import torch
+import numpy as np
+
+
+class GalleryIndex:
+    """
+    Chỉ mục vector ảnh: gom toàn bộ vector vào 1 ma trận float32 liền mạch,
+    chuẩn hóa L2 sẵn lúc load → mỗi truy vấn chỉ còn 1 phép nhân ma trận-vector.
+    """
+
+    def __init__(self, ids, matrix, normalized=False):
+        self.ids = np.asarray(ids)
+        if normalized and getattr(matrix, "dtype", None) == np.float32:
+            # Store đã chuẩn hóa sẵn → dùng thẳng memmap, không copy vào RAM của worker
+            self.matrix = matrix
+        else:
+            self.matrix = _normalize_rows(np.asarray(matrix, dtype=np.float32))
+
+    @classmethod
+    def from_store(cls, store, field="image"):
+        """Build từ VectorStore (src/vector_store.py)."""
+        return cls(store.ids(field), store.matrix(field), normalized=store.normalized)
+
+    @classmethod
+    def from_items(cls, gallery_items, vector_key="imageVector"):
+        """gallery_items: list các dict chứa {"id": ..., "imageVector": [...]}"""
+        items = [item for item in gallery_items if item.get(vector_key)]
+        if not items:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32))
+        ids = [item["id"] for item in items]
+        matrix = np.array([item[vector_key] for item in items], dtype=np.float32)
+        return cls(ids, matrix)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, query_vector):
+        """Cosine similarity của query với toàn bộ gallery (1 lần matmul)."""
+        return self.matrix @ normalize_vector(query_vector)
+
+    def search_rows(self, query_vector, top_k=10):
+        """Trả về (row indices, scores) của top-k, đã sort giảm dần."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.scores(query_vector)
+        top = top_k_indices(scores, top_k)
+        return top, scores[top]
+
+    def format_results(self, rows, scores):
+        return [{"id": _to_python(self.ids[r]), "score": float(s)} for r, s in zip(rows, scores)]
+
+    def search(self, query_vector, top_k=10):
+        rows, scores = self.search_rows(query_vector, top_k)
+        return self.format_results(rows, scores)
+
+
+class MultiVectorIndex:
+    """
+    Nhiều vector ảnh cho mỗi khách sạn (featuredImage + galleryImgs).
+    Điểm khách sạn = max (pool_top_n=1) hoặc trung bình top-n điểm ảnh của khách sạn đó.
+    Pooling chạy trên ma trận điểm đệm (hotels, max_imgs) → 1 lần matmul + reduce theo trục,
+    không lặp từng khách sạn.
+    """
+    kind = "multi"
+
+    def __init__(self, owner_ids, matrix, labels=None, normalized=False,
+                 pool_top_n=1, row_index=None, candidate_factor=20):
+        self.rows = GalleryIndex(owner_ids, matrix, normalized=normalized)
+        self.labels = labels
+        self.pool_top_n = max(1, pool_top_n)
+        # row_index: ANN index trên các dòng ảnh (src/ann_index.py); None = quét toàn bộ
+        self.row_index = row_index
+        self.candidate_factor = candidate_factor
+
+        self.ids, owner = np.unique(self.rows.ids, return_inverse=True)
+        self.counts = np.bincount(owner, minlength=len(self.ids))
+        # slot = thứ tự ảnh trong khách sạn → vị trí (owner, slot) trong ma trận đệm
+        order = np.argsort(owner, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+        slot = np.empty(len(owner), dtype=np.int64)
+        slot[order] = np.arange(len(owner)) - np.repeat(starts, self.counts)
+        self.owner = owner
+        self.slot = slot
+        self.slot_to_row = np.full((len(self.ids), max(self.counts.max(initial=0), 1)), -1, dtype=np.int64)
+        self.slot_to_row[owner, slot] = np.arange(len(owner))
+
+    @classmethod
+    def from_store(cls, store, field="gallery", **kwargs):
+        return cls(store.ids(field), store.matrix(field), labels=store.labels(field),
+                   normalized=store.normalized, **kwargs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row_scores(self, query_vector, top_k):
+        if self.row_index is None:
+            return self.rows.scores(query_vector)
+        # ANN: chỉ các dòng ứng viên có điểm, còn lại -inf
+        rows, cand_scores = self.row_index.search_rows(query_vector, top_k * self.candidate_factor)
+        scores = np.full(len(self.owner), -np.inf, dtype=np.float32)
+        scores[rows] = cand_scores
+        return scores
+
+    def pooled_scores(self, query_vector, top_k=10):
+        """Trả về (điểm từng khách sạn, dòng ảnh khớp nhất, điểm của ảnh đó)."""
+        padded = np.full(self.slot_to_row.shape, -np.inf, dtype=np.float32)
+        padded[self.owner, self.slot] = self._row_scores(query_vector, top_k)
+
+        best_slot = np.argmax(padded, axis=1)
+        best_row = self.slot_to_row[np.arange(len(self.ids)), best_slot]
+        best_scores = padded[np.arange(len(self.ids)), best_slot]
+        n = min(self.pool_top_n, padded.shape[1])
+        if n == 1:
+            hotel_scores = best_scores
+        else:
+            top_n = -np.partition(-padded, n - 1, axis=1)[:, :n]
+            valid = np.isfinite(top_n)
+            hotel_scores = np.where(valid, top_n, 0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+            hotel_scores[~valid.any(axis=1)] = -np.inf
+        return hotel_scores, best_row, best_scores
+
+    def search(self, query_vector, top_k=10):
+        if len(self) == 0:
+            return []
+        hotel_scores, best_row, best_scores = self.pooled_scores(query_vector, top_k)
+        top = top_k_indices(hotel_scores, top_k)
+        top = top[np.isfinite(hotel_scores[top])]
+
+        results = []
+        for h in top:
+            row = best_row[h]
+            results.append({
+                "id": _to_python(self.ids[h]),
+                "score": float(hotel_scores[h]),
+                "matched_image": str(self.labels[row]) if self.labels is not None else None,
+                "matched_image_score": float(best_scores[h]),
+            })
+        return results
+
+
+def normalize_vector(vector):
+    v = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
+
+
+def _normalize_rows(matrix):
+    if matrix.size == 0:
+        return np.ascontiguousarray(matrix)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def top_k_indices(scores, top_k):
+    """argpartition O(n) rồi chỉ sort k phần tử đầu."""
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _to_python(value):
+    return value.item() if isinstance(value, np.generic) else value
 
 
 def find_top_matches(query_vector, gallery_items, top_k=10):
     """
-    So sánh query_vector với danh sách gallery_items
-    gallery_items: list các dict chứa {"id": ..., "vector": ...}
+    So sánh query_vector với gallery.
+    gallery_items: index có .search() — GalleryIndex (exact) hoặc ANN index trong src/ann_index.py
+                   (khuyên dùng, build 1 lần lúc startup)
+                   hoặc list các dict chứa {"id": ..., "imageVector": ...}
     """
-    results = []
-    q_vec = torch.tensor(query_vector)
-
-    for item in gallery_items:
-        i_vec = torch.tensor(item["imageVector"])
-        # Tính Cosine Similarity
-        score = util.cos_sim(q_vec, i_vec).item()
-        results.append({"id": item["id"], "score": score})
-
-    # Sắp xếp giảm dần theo điểm số
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:top_k]
+    if not hasattr(gallery_items, "search"):
+        gallery_items = GalleryIndex.from_items(gallery_items)
+    return gallery_items.search(query_vector, top_k=top_k)
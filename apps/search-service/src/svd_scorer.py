@@ -0,0 +1,136 @@
+# src/svd_scorer.py
+# Vectorized SVD scoring: lấy pu, qi, bu, bi, global mean từ model Surprise đã train vào NumPy
+# → điểm toàn bộ hotel cho 1 user = qi @ pu[u] + bi + bu[u] + mu (1 lần BLAS thay vì N lần algo.predict).
+# Giữ đúng ngữ nghĩa SVD.predict của Surprise: user/item lạ, model không bias, clip theo rating_scale.
+# User mới (sau lần train cuối): fold-in — giải ridge least squares cho (bu, pu) với qi, bi cố định.
+
+import numpy as np
+
+
+class SVDScorer:
+    def __init__(self, algo):
+        self.algo = algo
+        trainset = algo.trainset
+        self.pu = np.asarray(algo.pu, dtype=np.float64)
+        self.qi = np.asarray(algo.qi, dtype=np.float64)
+        self.bu = np.asarray(algo.bu, dtype=np.float64)
+        self.bi = np.asarray(algo.bi, dtype=np.float64)
+        self.biased = bool(getattr(algo, "biased", True))
+        self.global_mean = float(trainset.global_mean)
+        self.lower, self.upper = trainset.rating_scale
+        self.user_index = dict(trainset._raw2inner_id_users)
+        self.item_index = dict(trainset._raw2inner_id_items)
+        self.reg_bu = float(getattr(algo, "reg_bu", 0.02))
+        self.reg_pu = float(getattr(algo, "reg_pu", 0.02))
+        self.folded = {}  # user_id → (bu, pu) của user fold-in
+        self._rows_for = None
+        self._rows = None
+
+    def knows_user(self, user_id):
+        return user_id in self.user_index or user_id in self.folded
+
+    # ---------- Fold-in ----------
+    def fold_in(self, user_id, ratings):
+        """
+        Ước lượng vector ẩn cho user chưa có trong trainset từ [(hotel_id, rating), ...]:
+          min Σ_r [(r - mu - bi - bu - qi·pu)² + reg_bu·bu² + reg_pu·|pu|²]   (objective của SVD.fit:
+          SGD regularize ở MỖI rating → phạt nhân n) → (XᵀX + n·Λ) x = Xᵀy, x = [bu, pu], X = [1, qi].
+        Trả về False nếu không có hotel nào nằm trong trainset.
+        """
+        rows, values = [], []
+        for hotel_id, rating in ratings:
+            i = self.item_index.get(hotel_id)
+            if i is not None:
+                rows.append(i)
+                values.append(rating)
+        if not rows:
+            self.folded.pop(user_id, None)
+            return False
+        Q = self.qi[rows]
+        y = np.asarray(values, dtype=np.float64)
+        if self.biased:
+            X = np.hstack([np.ones((len(rows), 1)), Q])
+            y = y - self.global_mean - self.bi[rows]
+            reg = np.concatenate([[self.reg_bu], np.full(Q.shape[1], self.reg_pu)])
+        else:
+            X = Q
+            reg = np.full(Q.shape[1], self.reg_pu)
+        x = np.linalg.solve(X.T @ X + len(rows) * np.diag(reg), X.T @ y)
+        self.folded[user_id] = (float(x[0]), x[1:]) if self.biased else (0.0, x)
+        return True
+
+    def forget(self, user_id):
+        """Bỏ vector fold-in (user có event mới → fold-in lại ở request kế tiếp)."""
+        self.folded.pop(user_id, None)
+
+    def _user_factors(self, user_id):
+        """(bu, pu) của user: từ trainset, từ fold-in, hoặc None."""
+        u = self.user_index.get(user_id)
+        if u is not None:
+            return self.bu[u], self.pu[u]
+        return self.folded.get(user_id)
+
+    def item_rows(self, items):
+        """Chỉ số inner của từng hotel (-1 = không có trong trainset). Cache theo object list hotels."""
+        if self._rows_for is not items:
+            self._rows = np.fromiter(
+                (self.item_index.get(h.get("id"), -1) for h in items), dtype=np.int64, count=len(items)
+            )
+            self._rows_for = items
+        return self._rows
+
+    def score_all(self, user_id):
+        """Điểm (chưa clip) cho mọi item trong trainset, theo thứ tự inner id."""
+        factors = self._user_factors(user_id)
+        if not self.biased:
+            if factors is None:
+                return np.full(len(self.qi), self.global_mean)  # PredictionImpossible → default
+            return self.qi @ factors[1]
+        if factors is None:
+            return self.global_mean + self.bi
+        bu, pu = factors
+        return self.qi @ pu + self.bi + (bu + self.global_mean)
+
+    def score_items(self, user_id, items):
+        """
+        Tương đương [algo.predict(user_id, h['id']).est for h in items] (đã clip).
+        Hotel không có trong trainset: mu + bu (biased) hoặc global mean (không bias), như Surprise.
+        """
+        return self.score_inner(user_id, self.item_rows(items))
+
+    def score_inner(self, user_id, rows):
+        """Điểm đã clip cho các inner id `rows` (-1 = hotel ngoài trainset) — chỉ tính đúng các hàng qi cần."""
+        rows = np.asarray(rows, dtype=np.int64)
+        known = rows >= 0
+        factors = self._user_factors(user_id)
+        if self.biased:
+            unknown_score = self.global_mean + (factors[0] if factors is not None else 0.0)
+        else:
+            unknown_score = self.global_mean
+        scores = np.full(len(rows), unknown_score, dtype=np.float64)
+        inner = rows[known]
+        if factors is None:
+            scores[known] = self.global_mean + self.bi[inner] if self.biased else self.global_mean
+        elif self.biased:
+            scores[known] = self.qi[inner] @ factors[1] + self.bi[inner] + (factors[0] + self.global_mean)
+        else:
+            scores[known] = self.qi[inner] @ factors[1]
+        return np.clip(scores, self.lower, self.upper)
+
+    def score_items_many(self, user_ids, items):
+        """score_items cho nhiều user đã biết (trainset / fold-in) → ma trận (len(user_ids), len(items))."""
+        rows = self.item_rows(items)
+        known = rows >= 0
+        factors = [self._user_factors(u) for u in user_ids]
+        bu = np.array([f[0] for f in factors], dtype=np.float64)
+        P = np.vstack([f[1] for f in factors]) if factors else np.empty((0, self.qi.shape[1]))
+        Q = self.qi[rows[known]]
+
+        if self.biased:
+            scores = np.repeat((self.global_mean + bu)[:, None], len(rows), axis=1)
+            scores[:, known] = P @ Q.T + self.bi[rows[known]] + (bu + self.global_mean)[:, None]
+        else:
+            scores = np.full((len(factors), len(rows)), self.global_mean)
+            scores[:, known] = P @ Q.T
+        return np.clip(scores, self.lower, self.upper)
+
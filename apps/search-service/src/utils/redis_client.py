@@ -15,4 +15,20 @@ redis_client = redis.Redis(
 )
 
 def get_redis_client():
-    return redis_client
\ No newline at end of file
+    return redis_client
+
+# Client thứ 2 cho dữ liệu nhị phân (vector float16, numpy bytes): decode_responses=False
+_redis_binary_client = None
+
+def get_redis_binary_client():
+    global _redis_binary_client
+    if _redis_binary_client is None:
+        _redis_binary_client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            decode_responses=False,
+            socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5)),
+            socket_connect_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5)),
+        )
+    return _redis_binary_client
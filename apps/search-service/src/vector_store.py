@@ -0,0 +1,172 @@
+# src/vector_store.py
+# Binary Vector Store: ma trận float32/float16 (.npy) + mảng id + manifest.json
+# Service mở bằng np.load(mmap_mode="r") → các uvicorn worker dùng chung page cache của OS,
+# không phải json.load lại hàng MB số float mỗi lần khởi động.
+
+import os
+import json
+import numpy as np
+from datetime import datetime
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+STORE_DIR = "jsons/hotel_vectors"
+LEGACY_JSON_FILE = "jsons/__hotel_vectors.json"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+
+# Field trong __hotel_vectors.json → tên field trong store
+LEGACY_FIELDS = {
+    "imageVector": "image",
+    "policiesVector": "policies",
+}
+
+
+class VectorStore:
+    """
+    Store đã mở: mỗi field gồm 1 ma trận (n, dim) và 1 mảng id (n,) cùng thứ tự,
+    tùy chọn thêm 1 mảng label (n,) — vd: URL ảnh gallery của từng dòng.
+    Ma trận là np.memmap (read-only), chưa đọc trang nào cho tới khi được dùng.
+    """
+
+    def __init__(self, store_dir, manifest, fields):
+        self.store_dir = store_dir
+        self.manifest = manifest
+        self._fields = fields
+
+    @property
+    def normalized(self):
+        return bool(self.manifest.get("normalized"))
+
+    def field_names(self):
+        return list(self._fields.keys())
+
+    def has_field(self, name):
+        return name in self._fields
+
+    def matrix(self, name):
+        return self._fields[name][0]
+
+    def ids(self, name):
+        return self._fields[name][1]
+
+    def labels(self, name):
+        return self._fields[name][2]
+
+    def __len__(self):
+        return max((len(f[1]) for f in self._fields.values()), default=0)
+
+
+# ---------------------------------------------------------
+# WRITE
+# ---------------------------------------------------------
+def write_vector_store(store_dir, fields: dict, dtype="float32", normalize=True, source=None):
+    """
+    Ghi store ra đĩa.
+    fields: {name: (ids, matrix)} hoặc {name: (ids, matrix, labels)} — ids (n,), matrix (n, dim),
+            labels (n,) chuỗi tùy chọn (vd: URL ảnh). Nhiều dòng có thể chung 1 id (multi-vector).
+    normalize=True: chuẩn hóa L2 trước khi ghi để service dùng thẳng memmap không cần copy.
+    Mỗi file được ghi ra file tạm rồi os.replace → worker đang đọc không thấy file dở dang.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "dtype": dtype,
+        "normalized": normalize,
+        "source": source,
+        "fields": {},
+    }
+
+    for name, field in fields.items():
+        ids, matrix = field[0], field[1]
+        labels = field[2] if len(field) > 2 else None
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or len(ids) != len(matrix):
+            raise ValueError(f"Field '{name}': ids {ids.shape} và matrix {matrix.shape} không khớp")
+        if normalize and matrix.size:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+
+        matrix_file = f"{name}.npy"
+        ids_file = f"{name}_ids.npy"
+        _atomic_save(os.path.join(store_dir, matrix_file), matrix.astype(dtype))
+        _atomic_save(os.path.join(store_dir, ids_file), ids)
+        manifest["fields"][name] = {
+            "file": matrix_file,
+            "ids_file": ids_file,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]),
+            "unique_ids": int(len(np.unique(ids))),
+        }
+        if labels is not None:
+            labels_file = f"{name}_labels.npy"
+            _atomic_save(os.path.join(store_dir, labels_file), np.asarray(labels, dtype=str))
+            manifest["fields"][name]["labels_file"] = labels_file
+
+    # Manifest ghi sau cùng: có manifest nghĩa là các file .npy đã đầy đủ
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def _atomic_save(path, array):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------
+# READ
+# ---------------------------------------------------------
+def store_exists(store_dir=STORE_DIR):
+    return os.path.exists(os.path.join(store_dir, MANIFEST_FILE))
+
+
+def load_vector_store(store_dir=STORE_DIR):
+    """Mở store dạng memmap. Trả về None nếu chưa có store."""
+    if not store_exists(store_dir):
+        return None
+
+    with open(os.path.join(store_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    fields = {}
+    for name, meta in manifest.get("fields", {}).items():
+        matrix = np.load(os.path.join(store_dir, meta["file"]), mmap_mode="r")
+        ids = np.load(os.path.join(store_dir, meta["ids_file"]))
+        labels = None
+        if meta.get("labels_file"):
+            labels = np.load(os.path.join(store_dir, meta["labels_file"]))
+        fields[name] = (matrix, ids, labels)
+    return VectorStore(store_dir, manifest, fields)
+
+
+# ---------------------------------------------------------
+# CONVERTER: __hotel_vectors.json → store
+# ---------------------------------------------------------
+def records_to_fields(records):
+    """list[{"id", "imageVector", "policiesVector"}] → {name: (ids, matrix)}"""
+    fields = {}
+    for legacy_key, name in LEGACY_FIELDS.items():
+        rows = [(r["id"], r[legacy_key]) for r in records if r.get(legacy_key)]
+        if not rows:
+            continue
+        ids = [row[0] for row in rows]
+        matrix = np.array([row[1] for row in rows], dtype=np.float32)
+        fields[name] = (ids, matrix)
+    return fields
+
+
+def convert_json_to_store(json_path=LEGACY_JSON_FILE, store_dir=STORE_DIR, dtype="float32"):
+    with open(json_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    fields = records_to_fields(records)
+    return write_vector_store(store_dir, fields, dtype=dtype, source=os.path.basename(json_path))
@@ -0,0 +1,8 @@
+# tests/conftest.py
+# Chạy từ apps/search-service: python -m pytest -q
+# Test so sánh các đường vectorized với cài đặt tham chiếu (vòng lặp / dense / Surprise).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
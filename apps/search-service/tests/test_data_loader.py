@@ -0,0 +1,120 @@
+# tests/test_data_loader.py
+# Loader cột + merge_ratings phải cho đúng kết quả của vòng lặp dict cũ (train_svd.py / generate_recommendations.py).
+
+import json
+
+import numpy as np
+import pytest
+
+from src import data_loader
+from src.data_loader import load_interactions, load_reviews, merge_ratings, iter_records
+from src.interaction_store import SIGNAL_WEIGHTS, InteractionStore
+
+
+def _fixtures(seed=0):
+    rng = np.random.RandomState(seed)
+    types = list(SIGNAL_WEIGHTS) + ["SHARE"]  # "SHARE": type lạ → bị bỏ
+    interactions = [
+        {"id": f"e{j}", "userId": f"user_{rng.randint(15)}", "hotelId": int(rng.randint(1, 25)),
+         "type": types[rng.randint(len(types))], "rating": None, "timestamp": f"2024-03-{1 + j % 28:02d}T10:00:00"}
+        for j in range(400)
+    ]
+    reviews = [
+        {"userId": f"user_{rng.randint(15)}", "hotelId": int(rng.randint(1, 25)),
+         "rating": int(rng.randint(0, 6)), "createdAt": "2024-04-01T00:00:00"}
+        for _ in range(60)
+    ]
+    return interactions, reviews
+
+
+def _dict_merge(interactions, reviews):
+    """prepare_training_data trước khi dùng loader cột: implicit theo thứ tự, explicit ghi đè."""
+    rating_map = {}
+    for inter in interactions:
+        if inter["type"] in SIGNAL_WEIGHTS:
+            rating_map[(inter["userId"], inter["hotelId"])] = SIGNAL_WEIGHTS[inter["type"]]
+    for review in reviews:
+        rating_map[(review["userId"], review["hotelId"])] = float(review["rating"])
+    return rating_map
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loader, "DATA_CACHE_DIR", str(tmp_path / "cache"))
+    interactions, reviews = _fixtures()
+    inter_path, review_path = tmp_path / "__interactions.json", tmp_path / "__reviews.json"
+    inter_path.write_text(json.dumps(interactions, indent=2), encoding="utf-8")
+    review_path.write_text("\n".join(json.dumps(r) for r in reviews), encoding="utf-8")  # NDJSON
+    return interactions, reviews, str(inter_path), str(review_path)
+
+
+def test_merge_ratings_matches_dict_merge(files):
+    interactions, reviews, inter_path, review_path = files
+    expected = _dict_merge(interactions, reviews)
+    for _ in range(2):  # Lần 2 đọc từ cache .npz
+        users, hotels, scores, _ = merge_ratings(load_interactions(inter_path), load_reviews(review_path), SIGNAL_WEIGHTS)
+        got = list(zip(users.tolist(), hotels.tolist(), scores.tolist()))
+        assert got == [(u, h, s) for (u, h), s in expected.items()]  # Cùng thứ tự + giá trị
+
+
+def test_merge_ratings_skip_empty_rating(files):
+    interactions, reviews, inter_path, review_path = files
+    expected = _dict_merge(interactions, [r for r in reviews if r["rating"]])
+    users, hotels, scores, explicit = merge_ratings(
+        load_interactions(inter_path), load_reviews(review_path), SIGNAL_WEIGHTS, skip_empty_rating=True)
+    assert dict(zip(zip(users.tolist(), hotels.tolist()), scores.tolist())) == expected
+    assert not (explicit & (scores == 0)).any()
+
+
+def test_iter_records_small_chunks(files, monkeypatch):
+    interactions, reviews, inter_path, review_path = files
+    monkeypatch.setattr(data_loader, "READ_CHUNK", 7)  # Object cắt ngang nhiều chunk
+    assert list(iter_records(inter_path)) == interactions
+    assert list(iter_records(review_path)) == reviews
+
+
+def test_load_interactions_adds_pending_live_events(files, tmp_path):
+    interactions, reviews, inter_path, review_path = files
+    live_events = [
+        dict(interactions[0]),                                                               # Đã có trong export
+        {"id": "live-1", "userId": "user_new", "hotelId": 99, "type": "BOOK", "timestamp": "2024-05-01T00:00:00"},
+        {"id": "live-1", "userId": "user_new", "hotelId": 99, "type": "BOOK", "timestamp": "2024-05-01T00:00:00"},
+        {"id": "live-2", "userId": "user_1", "hotelId": 3, "type": "ADD_TO_WISHLIST", "timestamp": "2024-05-02T00:00:00"},
+    ]
+    live_path = tmp_path / "__interactions_live.ndjson"
+    live_path.write_text("\n".join(json.dumps(e) for e in live_events) + "\n{\"id\": \"torn", encoding="utf-8")
+
+    expected = _dict_merge(interactions + [live_events[1], live_events[3]], reviews)
+    users, hotels, scores, _ = merge_ratings(
+        load_interactions(inter_path, live_path=str(live_path)), load_reviews(review_path), SIGNAL_WEIGHTS)
+    assert dict(zip(zip(users.tolist(), hotels.tolist()), scores.tolist())) == expected
+    assert np.all(np.diff(load_interactions(inter_path, live_path=str(live_path)).dictionaries["hotel"]) > 0)
+
+
+def test_merge_ratings_drops_missing_review_ratings(files, tmp_path):
+    interactions, reviews, inter_path, _ = files
+    reviews = reviews + [
+        {"userId": "user_1", "hotelId": 3, "rating": None, "createdAt": "2024-04-02T00:00:00"},
+        {"userId": "user_2", "hotelId": 4, "createdAt": "2024-04-02T00:00:00"},
+    ]
+    review_path = tmp_path / "__reviews_missing.json"
+    review_path.write_text(json.dumps(reviews), encoding="utf-8")
+    expected = _dict_merge(interactions, [r for r in reviews if r.get("rating") is not None])
+    users, hotels, scores, _ = merge_ratings(load_interactions(inter_path), load_reviews(str(review_path)), SIGNAL_WEIGHTS)
+    assert not np.isnan(scores).any()
+    assert dict(zip(zip(users.tolist(), hotels.tolist()), scores.tolist())) == expected
+
+
+def test_interaction_store_from_columns_matches_dict_build(files):
+    interactions, _, inter_path, _ = files
+    expected = InteractionStore(interactions)
+    store = InteractionStore.from_columns(load_interactions(inter_path))
+    assert store.users == expected.users
+    assert store.types[:len(SIGNAL_WEIGHTS)] == expected.types[:len(SIGNAL_WEIGHTS)]
+    assert np.array_equal(store.hotel_ids, expected.hotel_ids)
+    assert np.array_equal(store.weights, expected.weights)
+    assert np.array_equal(store.timestamps, expected.timestamps)
+    assert dict(store.hotel_popularity) == dict(expected.hotel_popularity)
+    for uid in expected.users:
+        assert store.user_history(uid) == expected.user_history(uid)
+    assert len(InteractionStore.from_columns(None)) == 0
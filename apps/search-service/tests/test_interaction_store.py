@@ -0,0 +1,16 @@
+# tests/test_interaction_store.py
+
+from src.interaction_store import InteractionStore
+
+
+def test_rows_with_invalid_hotel_id_are_skipped():
+    store = InteractionStore([
+        {"userId": "a", "hotelId": 1, "type": "VIEW"},
+        {"userId": "b", "hotelId": None, "type": "BOOK"},
+        {"userId": "c", "hotelId": "not-a-number", "type": "BOOK"},
+        {"userId": "a", "hotelId": "2", "type": "BOOK"},
+    ])
+    assert len(store) == 2
+    assert store.users == ["a"]
+    assert [h for h, _, _ in store.user_history("a")] == [1, 2]
+    assert store.hotel_popularity[2] == 5.0
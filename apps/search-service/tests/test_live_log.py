@@ -0,0 +1,30 @@
+# tests/test_live_log.py
+
+import json
+from datetime import datetime, timedelta
+
+from src import live_log
+
+
+def _event(event_id, days_ago=0):
+    ts = (datetime.now() - timedelta(days=days_ago)).isoformat(timespec="seconds")
+    return {"id": event_id, "userId": "u", "hotelId": 1, "type": "VIEW", "timestamp": ts}
+
+
+def test_merge_skips_events_already_exported(tmp_path):
+    path = str(tmp_path / "live.ndjson")
+    live_log.append([_event("a"), _event("b"), _event("b"), {"userId": "u", "hotelId": 2, "type": "BOOK"}], path)
+    merged = live_log.merge([_event("a")], path)
+    assert [e.get("id") for e in merged] == ["a", "b", None]
+
+
+def test_compact_drops_exported_duplicate_and_expired_events(tmp_path):
+    path = str(tmp_path / "live.ndjson")
+    live_log.append([_event("a"), _event("b"), _event("b"), _event("old", days_ago=40), _event("c")], path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "torn')  # Dòng ghi dở
+    assert live_log.compact({"a"}, max_age_days=30, path=path) == (5, 2)
+    assert [e["id"] for e in live_log.read(path)] == ["b", "c"]
+    assert live_log.compact({"a"}, max_age_days=30, path=path) == (2, 2)
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == ["b", "c"]
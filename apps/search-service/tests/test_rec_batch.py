@@ -0,0 +1,42 @@
+# tests/test_rec_batch.py
+
+import threading
+
+import numpy as np
+
+from src.rec_batch import BatchRecommendations, _save
+
+
+def test_lookup_never_mixes_rows_of_two_builds(tmp_path):
+    # Build 1: user i → hotel 100 + i; build 2: thứ tự user đảo ngược, user i → hotel 200 + i
+    users = [f"u{i}" for i in range(50)]
+    _save(str(tmp_path), users, np.zeros(50, dtype=np.int64),
+          {"svd": np.arange(100, 150, dtype=np.int32)[:, None]}, 1, "v1")
+    batch = BatchRecommendations(str(tmp_path))
+    batch.reload()
+    assert batch.lookup("u7", "svd", 1, 0, "v1") == [107]
+
+    wrong = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            for i in range(0, 50, 7):
+                ids = batch.lookup(f"u{i}", "svd", 1, 0, batch._snapshot.manifest["model_version"])
+                if ids is not None and ids[0] % 100 != i:
+                    wrong.append((i, ids))
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for build in range(20):
+        order = users[::-1] if build % 2 == 0 else users
+        table = np.array([[200 + int(u[1:])] for u in order], dtype=np.int32)
+        _save(str(tmp_path), order, np.zeros(50, dtype=np.int64), {"svd": table}, 1, "v1")
+        batch.reload()
+    stop.set()
+    for t in threads:
+        t.join()
+    assert not wrong
+    assert batch.lookup("u7", "svd", 1, 0, "v1") == [207]
+    assert batch.stats()["users"] == 50
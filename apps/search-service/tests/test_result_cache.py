@@ -0,0 +1,53 @@
+# tests/test_result_cache.py
+
+from src.result_cache import ResultCache
+
+
+class _FakeRedis:
+    """Đủ lệnh cho ResultCache: get / set / incr / expire (+ pipeline chạy thẳng)."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+
+    def expire(self, key, ttl):
+        pass
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def execute(self):
+        pass
+
+
+def _worker(redis):
+    cache = ResultCache(max_items=10, ttl=60, use_redis=True)
+    cache._get_redis = lambda: redis
+    return cache
+
+
+def test_ingest_on_one_worker_changes_keys_on_every_worker():
+    redis = _FakeRedis()
+    a, b = _worker(redis), _worker(redis)
+    key_b = ResultCache.make_key("v1", "u", b.user_generation("u", 3), "svd", 5)
+    b.put(key_b, [{"id": 1}])
+    assert a.get(ResultCache.make_key("v1", "u", a.user_generation("u", 3), "svd", 5)) == [{"id": 1}]
+
+    a.bump_generations(["u", "u"])  # Worker A nhận event (stream tắt → B không thấy event)
+    assert b.get(ResultCache.make_key("v1", "u", b.user_generation("u", 3), "svd", 5)) is None
+    assert a.user_generation("u", 4) != b.user_generation("u", 3)
+    assert redis.data["recgen:u"] == "1"
+
+
+def test_without_redis_generation_is_local():
+    cache = ResultCache(max_items=10, ttl=60, use_redis=False)
+    assert cache.user_generation("u", 7) == "local.7"
+    cache.bump_generations(["u"])
@@ -0,0 +1,55 @@
+# tests/test_sgd_epochs.py
+# sgd_epochs (mini-batch vectorized) với batch = 1 phải đúng bằng vòng lặp SGD từng rating của SVD.fit.
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("surprise")
+train_svd = pytest.importorskip("train_svd")
+
+
+def _model(biased, seed=0):
+    rng = np.random.RandomState(seed)
+    n_users, n_items, n_factors = 12, 9, 4
+    return SimpleNamespace(
+        trainset=SimpleNamespace(global_mean=3.2), biased=biased,
+        pu=rng.normal(0, 0.1, (n_users, n_factors)), qi=rng.normal(0, 0.1, (n_items, n_factors)),
+        bu=rng.normal(0, 0.1, n_users), bi=rng.normal(0, 0.1, n_items),
+        lr_bu=0.01, lr_bi=0.02, lr_pu=0.015, lr_qi=0.005,
+        reg_bu=0.02, reg_bi=0.03, reg_pu=0.05, reg_qi=0.04,
+    )
+
+
+def _reference_sgd(algo, users, items, ratings, epochs, seed=42):
+    """Cập nhật của surprise.SVD.fit (prediction_algorithms/matrix_factorization.pyx), từng rating một."""
+    rng = np.random.RandomState(seed)
+    mu = algo.trainset.global_mean
+    for _ in range(epochs):
+        for j in rng.permutation(len(ratings)):
+            u, i, r = users[j], items[j], ratings[j]
+            dot = float(algo.qi[i] @ algo.pu[u])
+            err = r - (mu + algo.bu[u] + algo.bi[i] + dot if algo.biased else dot)
+            if algo.biased:
+                algo.bu[u] += algo.lr_bu * (err - algo.reg_bu * algo.bu[u])
+                algo.bi[i] += algo.lr_bi * (err - algo.reg_bi * algo.bi[i])
+            puf, qif = algo.pu[u].copy(), algo.qi[i].copy()
+            algo.pu[u] += algo.lr_pu * (err * qif - algo.reg_pu * puf)
+            algo.qi[i] += algo.lr_qi * (err * puf - algo.reg_qi * qif)
+
+
+@pytest.mark.parametrize("biased", [True, False])
+def test_batch_of_one_matches_sequential_sgd(monkeypatch, biased):
+    rng = np.random.RandomState(1)
+    users = rng.randint(0, 12, 80)
+    items = rng.randint(0, 9, 80)
+    ratings = rng.randint(1, 6, 80).astype(np.float64)
+
+    vectorized, reference = _model(biased), _model(biased)
+    monkeypatch.setattr(train_svd, "INCREMENTAL_BATCH", 1)
+    train_svd.sgd_epochs(vectorized, users, items, ratings, epochs=3)
+    _reference_sgd(reference, users, items, ratings, epochs=3)
+
+    for name in ("pu", "qi", "bu", "bi"):
+        np.testing.assert_allclose(getattr(vectorized, name), getattr(reference, name), rtol=0, atol=1e-12)
@@ -0,0 +1,53 @@
+# tests/test_svd_scorer.py
+# SVDScorer phải cho đúng điểm của algo.predict(...).est (cả user / hotel lạ, model không bias).
+
+import numpy as np
+import pytest
+
+surprise = pytest.importorskip("surprise")
+pd = pytest.importorskip("pandas")
+
+from src.svd_scorer import SVDScorer
+
+
+def _train(biased=True, seed=0):
+    rng = np.random.RandomState(seed)
+    rows = [(f"u{rng.randint(30)}", int(rng.randint(40)), float(rng.randint(1, 6))) for _ in range(600)]
+    df = pd.DataFrame(rows, columns=["userId", "hotelId", "score"]).drop_duplicates(["userId", "hotelId"])
+    data = surprise.Dataset.load_from_df(df, surprise.Reader(rating_scale=(1, 5)))
+    algo = surprise.SVD(n_factors=8, n_epochs=10, biased=biased, random_state=seed)
+    algo.fit(data.build_full_trainset())
+    return algo
+
+
+# Hotel 999 không có trong trainset; user "ghost" không có trong trainset
+HOTELS = [{"id": h} for h in list(range(40)) + [999]]
+USERS = ["u0", "u7", "u29", "ghost"]
+
+
+@pytest.mark.parametrize("biased", [True, False])
+def test_score_items_matches_predict(biased):
+    algo = _train(biased)
+    scorer = SVDScorer(algo)
+    for user_id in USERS:
+        expected = [algo.predict(user_id, h["id"]).est for h in HOTELS]
+        np.testing.assert_allclose(scorer.score_items(user_id, HOTELS), expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("biased", [True, False])
+def test_score_items_many_matches_score_items(biased):
+    algo = _train(biased)
+    scorer = SVDScorer(algo)
+    known = [u for u in USERS if scorer.knows_user(u)]
+    many = scorer.score_items_many(known, HOTELS)
+    for row, user_id in zip(many, known):
+        np.testing.assert_allclose(row, scorer.score_items(user_id, HOTELS), rtol=0, atol=1e-12)
+
+
+def test_score_inner_subset_matches_predict():
+    algo = _train()
+    scorer = SVDScorer(algo)
+    rows = scorer.item_rows(HOTELS)
+    subset = np.array([5, 0, len(HOTELS) - 1, 17])
+    expected = [algo.predict("u7", HOTELS[i]["id"]).est for i in subset]
+    np.testing.assert_allclose(scorer.score_inner("u7", rows[subset]), expected, rtol=0, atol=1e-9)
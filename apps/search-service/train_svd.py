@@ -4,13 +4,19 @@
 
 import os
 import json
+import hashlib
 import pickle
 import numpy as np
 import pandas as pd
-from surprise import Dataset, Reader, SVD, SVDpp
-from surprise.model_selection import GridSearchCV, cross_validate
+import time
+from itertools import product
+from surprise import Dataset, Reader, SVD, SVDpp, accuracy
+from surprise.model_selection import cross_validate, KFold
 from collections import defaultdict
 from datetime import datetime
+from src.data_loader import load_interactions, load_reviews, merge_ratings
+from src.live_log import LIVE_LOG_FILE
+from src import model_store
 
 # ---------------------------------------------------------
 # CONFIGURATION
@@ -22,16 +28,40 @@ INTERACTIONS_FILE = os.path.join(JSON_DIR, "__interactions.json")
 REVIEWS_FILE = os.path.join(JSON_DIR, "__reviews.json")
 MODEL_OUTPUT = os.path.join(JSON_DIR, "recsys_model.pkl")
 METRICS_OUTPUT = os.path.join(JSON_DIR, "svd_training_report.json")
+TRAIN_N_JOBS = int(os.getenv("TRAIN_N_JOBS", -1))  # retrain_worker.py giới hạn theo số core được cấp
+
+# Successive halving: mỗi rung giữ 1/ETA config tốt nhất, budget (dữ liệu + epoch) tăng ETA lần; rung cuối = CV đầy đủ
+TUNE_ETA = int(os.getenv("TUNE_ETA", 3))
+TUNE_MIN_FRACTION = float(os.getenv("TUNE_MIN_FRACTION", 1 / 9))  # Tỉ lệ dữ liệu ở rung đầu
+TUNE_MIN_EPOCH_FRACTION = float(os.getenv("TUNE_MIN_EPOCH_FRACTION", 1 / 3))  # Tỉ lệ n_epochs ở rung đầu (1 = đủ)
+TUNE_CV_FOLDS = 3                                                # CV rung cuối — evaluate_models dùng lại kết quả
+TUNE_HOLDOUT = 0.2                                               # Tập test cố định cho các rung dữ liệu con
+TUNE_TIME_BUDGET_S = float(os.getenv("TUNE_TIME_BUDGET_S", 1800))  # Hết budget → dừng, lấy config tốt nhất hiện có
+TUNE_DRIFT_THRESHOLD = float(os.getenv("TUNE_DRIFT_THRESHOLD", 0.05))  # Dữ liệu đổi < 5% → dùng lại params cũ
+TUNE_FORCE = os.getenv("TUNE_FORCE", "0") == "1"
+EVAL_CV_FOLDS = int(os.getenv("EVAL_CV_FOLDS", TUNE_CV_FOLDS))  # Khi không có CV từ tuning (bỏ qua / hết budget)
+
+# Incremental: khởi tạo từ model đang chạy (model_store.target_version — sau rollback là version đã rollback về),
+# SGD vài epoch trên rating mới / đổi + mẫu replay rating cũ
+TRAIN_MODE = os.getenv("TRAIN_MODE", "auto")  # auto | full | incremental
+FULL_RETRAIN_DAYS = float(os.getenv("FULL_RETRAIN_DAYS", 7))            # Retrain từ đầu mỗi tuần
+INCREMENTAL_EPOCHS = int(os.getenv("INCREMENTAL_EPOCHS", 5))
+INCREMENTAL_REPLAY_RATIO = float(os.getenv("INCREMENTAL_REPLAY_RATIO", 1.0))  # Số rating cũ replay / rating mới
+INCREMENTAL_MAX_NEW_SHARE = float(os.getenv("INCREMENTAL_MAX_NEW_SHARE", 0.3))  # Mới > 30% dữ liệu → train full
+INCREMENTAL_HOLDOUT = 0.1   # Phần rating mới giữ lại để so model incremental với model cũ
+INCREMENTAL_BATCH = 256
+
+# Search space
+PARAM_GRID = {
+    'n_factors': [50, 100, 150],
+    'n_epochs': [20, 30],
+    'lr_all': [0.005, 0.01],
+    'reg_all': [0.02, 0.1]
+}
 
 # ---------------------------------------------------------
 # 1. LOAD DATA
 # ---------------------------------------------------------
-def load_json(filepath):
-    if not os.path.exists(filepath):
-        return None
-    with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
-
 def prepare_training_data():
     """
     Convert interactions + reviews into unified rating DataFrame.
@@ -39,10 +69,12 @@ def prepare_training_data():
     """
     print("\n[1/5] Loading data...")
     
-    interactions_raw = load_json(INTERACTIONS_FILE)
-    reviews_raw = load_json(REVIEWS_FILE)
+    # Cột typed từ loader dùng chung (cache .npz theo hash file → lần sau không parse lại)
+    # + event realtime trong log live chưa có trong export (dedupe theo id)
+    interactions = load_interactions(INTERACTIONS_FILE, live_path=LIVE_LOG_FILE)
+    reviews = load_reviews(REVIEWS_FILE)
     
-    if not interactions_raw:
+    if interactions is None or len(interactions) == 0:
         print("❌ No interactions file found!")
         return None
     
@@ -56,47 +88,11 @@ def prepare_training_data():
         "RATE_NEGATIVE": -3.0,
     }
     
-    # Collect implicit scores
-    implicit_records = []
-    for inter in interactions_raw:
-        signal_type = inter.get("type")
-        if signal_type not in signal_weights:
-            continue
-        implicit_records.append({
-            "userId": inter["userId"],
-            "hotelId": inter["hotelId"],
-            "score": signal_weights[signal_type],
-            "source": "implicit"
-        })
-    
-    # Collect explicit ratings (override implicit if same user-hotel pair)
-    explicit_records = []
-    if reviews_raw:
-        for review in reviews_raw:
-            explicit_records.append({
-                "userId": review["userId"],
-                "hotelId": review["hotelId"],
-                "score": float(review["rating"]),
-                "source": "explicit"
-            })
-    
     # Merge: explicit ratings override implicit for same (user, hotel) pair
-    rating_map = {}  # (userId, hotelId) -> score
-    
-    for rec in implicit_records:
-        key = (rec["userId"], rec["hotelId"])
-        rating_map[key] = rec["score"]
-    
-    for rec in explicit_records:
-        key = (rec["userId"], rec["hotelId"])
-        # Explicit ratings take precedence
-        rating_map[key] = rec["score"]
+    users, hotels, scores, _ = merge_ratings(interactions, reviews, signal_weights)
+    df = pd.DataFrame({"userId": users.tolist(), "hotelId": hotels, "score": scores})
     
-    # Build final DataFrame
-    records = [{"userId": k[0], "hotelId": k[1], "score": v} for k, v in rating_map.items()]
-    df = pd.DataFrame(records)
-    
-    print(f"   ✅ Loaded {len(interactions_raw)} interactions, {len(explicit_records)} explicit ratings")
+    print(f"   ✅ Loaded {len(interactions)} interactions, {len(reviews) if reviews is not None else 0} explicit ratings")
     print(f"   ✅ Merged into {len(df)} unique (user, hotel) pairs")
     
     # Rating distribution
@@ -109,51 +105,157 @@ def prepare_training_data():
     return df
 
 # ---------------------------------------------------------
-# 2. GRID SEARCH CV (Hyperparameter Tuning)
+# 2. HYPERPARAMETER TUNING (Successive halving, warm start)
 # ---------------------------------------------------------
-def tune_hyperparameters(df):
+def compute_data_stats(df):
+    return {
+        "total_ratings": len(df),
+        "unique_users": df['userId'].nunique(),
+        "unique_hotels": df['hotelId'].nunique(),
+        "score_distribution": {
+            str(k): int(v) for k, v in df['score'].round(0).value_counts().sort_index().items()
+        }
+    }
+
+def data_drift(current_stats, previous_stats):
     """
-    Run GridSearchCV to find optimal SVD hyperparameters.
+    Mức thay đổi dữ liệu so với lần train trước (0 = y hệt):
+    max(thay đổi tương đối số rating / user / hotel, total variation của phân bố điểm).
     """
-    print("\n[2/5] Hyperparameter tuning (GridSearchCV)...")
-    
+    changes = []
+    for key in ("total_ratings", "unique_users", "unique_hotels"):
+        prev = previous_stats.get(key) or 0
+        changes.append(abs(current_stats[key] - prev) / prev if prev else 1.0)
+
+    cur_dist = current_stats["score_distribution"]
+    prev_dist = previous_stats.get("score_distribution") or {}
+    cur_total = sum(cur_dist.values()) or 1
+    prev_total = sum(prev_dist.values()) or 1
+    keys = set(cur_dist) | set(prev_dist)
+    changes.append(0.5 * sum(abs(cur_dist.get(k, 0) / cur_total - prev_dist.get(k, 0) / prev_total) for k in keys))
+    return max(changes)
+
+def load_previous_report():
+    """Report của version đang chạy (warm start tuning)."""
+    return model_store.load_report(model_store.target_version()) or {}
+
+def _candidate_params(previous_params=None):
+    """Grid đầy đủ; params tốt nhất lần trước đứng đầu (thắng khi bằng điểm)."""
+    keys = list(PARAM_GRID)
+    candidates = [dict(zip(keys, values)) for values in product(*(PARAM_GRID[k] for k in keys))]
+    if previous_params and all(k in previous_params for k in keys):
+        warm = {k: previous_params[k] for k in keys}
+        candidates = [warm] + [c for c in candidates if c != warm]
+    return candidates
+
+def _holdout_rmse(params, train_df, test_rows, epoch_fraction=1.0):
+    reader = Reader(rating_scale=(1, 5))
+    trainset = Dataset.load_from_df(train_df[['userId', 'hotelId', 'score']], reader).build_full_trainset()
+    n_epochs = max(1, int(round(params.get('n_epochs', 20) * epoch_fraction)))
+    algo = SVD(**{**params, 'n_epochs': n_epochs}, random_state=42)
+    algo.fit(trainset)
+    return accuracy.rmse(algo.test(test_rows), verbose=False)
+
+def _cv_scores(params, data, folds):
+    """(RMSE, MAE) trung bình k-fold; KFold seed cố định → mọi config / baseline chấm trên cùng các fold."""
+    cv = cross_validate(SVD(**params, random_state=42), data, measures=['rmse', 'mae'],
+                        cv=KFold(n_splits=folds, random_state=42), n_jobs=TRAIN_N_JOBS, verbose=False)
+    return float(np.mean(cv['test_rmse'])), float(np.mean(cv['test_mae']))
+
+def _data_hash(df):
+    """Định danh nội dung dữ liệu train (user, hotel, score) → dùng lại CV baseline khi dữ liệu không đổi."""
+    rows = pd.util.hash_pandas_object(df[['userId', 'hotelId', 'score']], index=False).values
+    return hashlib.blake2b(rows.tobytes(), digest_size=16).hexdigest()
+
+def successive_halving(df, candidates, time_budget_s=TUNE_TIME_BUDGET_S):
+    """
+    Rung i: train trên TUNE_MIN_FRACTION·ETA^i dữ liệu (tập con lồng nhau) với TUNE_MIN_EPOCH_FRACTION·ETA^i
+    số epoch của từng config (tối đa đủ epoch), chấm RMSE trên holdout cố định, giữ 1/ETA config tốt nhất.
+    Rung cuối (≤ ETA config): TUNE_CV_FOLDS-fold CV trên toàn bộ dữ liệu, đủ epoch.
+    Trả về (best_params, best_rmse, best_mae, log các rung).
+    """
+    start = time.perf_counter()
+    shuffled = df.sample(frac=1.0, random_state=42).reset_index(drop=True)
+    n_test = int(len(shuffled) * TUNE_HOLDOUT)
+    test_rows = list(shuffled.iloc[:n_test][['userId', 'hotelId', 'score']].itertuples(index=False, name=None))
+    train_pool = shuffled.iloc[n_test:]
+
+    rungs = []
+    fraction, epoch_fraction = TUNE_MIN_FRACTION, min(1.0, TUNE_MIN_EPOCH_FRACTION)
+    while len(candidates) > TUNE_ETA and fraction < 1.0:
+        subset = train_pool.iloc[:max(1, int(len(train_pool) * fraction))]
+        scored = [(_holdout_rmse(params, subset, test_rows, epoch_fraction), i, params)
+                  for i, params in enumerate(candidates)]
+        scored.sort(key=lambda x: (x[0], x[1]))
+        keep = max(TUNE_ETA, len(candidates) // TUNE_ETA)
+        rungs.append({"fraction": round(fraction, 4), "epoch_fraction": round(epoch_fraction, 4),
+                      "configs": len(candidates), "best_rmse": scored[0][0], "best_params": scored[0][2]})
+        print(f"   🪜 Rung {len(rungs)}: {len(candidates)} configs on {len(subset)} ratings, "
+              f"{epoch_fraction:.0%} epochs → keep {min(keep, len(candidates))} "
+              f"(best holdout RMSE={scored[0][0]:.4f})")
+        candidates = [params for _, _, params in scored[:keep]]
+        fraction *= TUNE_ETA
+        epoch_fraction = min(1.0, epoch_fraction * TUNE_ETA)
+        if time.perf_counter() - start > time_budget_s:
+            print(f"   ⏱️ Time budget {time_budget_s:.0f}s exhausted → stop at rung {len(rungs)}")
+            best = scored[0]
+            return best[2], best[0], None, rungs
+
+    # Rung cuối: CV đầy đủ
     reader = Reader(rating_scale=(1, 5))
     data = Dataset.load_from_df(df[['userId', 'hotelId', 'score']], reader)
-    
-    # Search space
-    param_grid = {
-        'n_factors': [50, 100, 150],
-        'n_epochs': [20, 30],
-        'lr_all': [0.005, 0.01],
-        'reg_all': [0.02, 0.1]
-    }
-    
-    print(f"   🔍 Testing {2*2*2*3} combinations with 3-fold CV...")
-    
-    gs = GridSearchCV(SVD, param_grid, measures=['rmse', 'mae'], cv=3, n_jobs=-1)
-    gs.fit(data)
-    
-    # Results
-    best_rmse = gs.best_score['rmse']
-    best_mae = gs.best_score['mae']
-    best_params_rmse = gs.best_params['rmse']
-    best_params_mae = gs.best_params['mae']
-    
+    results = []
+    for i, params in enumerate(candidates):
+        rmse, mae = _cv_scores(params, data, TUNE_CV_FOLDS)
+        results.append((rmse, i, mae, params))
+    results.sort(key=lambda x: (x[0], x[1]))
+    rungs.append({"fraction": 1.0, "epoch_fraction": 1.0, "configs": len(candidates), "cv": TUNE_CV_FOLDS,
+                  "best_rmse": results[0][0], "best_mae": results[0][2], "best_params": results[0][3]})
+
+    print(f"\n   📊 Final rung ({TUNE_CV_FOLDS}-fold CV):")
+    for rmse, _, mae, params in results:
+        print(f"      RMSE={rmse:.4f} | MAE={mae:.4f} | n_factors={params['n_factors']} | "
+              f"epochs={params['n_epochs']} | lr={params['lr_all']} | reg={params['reg_all']}")
+    best_rmse, _, best_mae, best_params = results[0]
+    return best_params, best_rmse, best_mae, rungs
+
+def tune_hyperparameters(df, previous_report=None):
+    """
+    Tìm hyperparameters SVD tốt nhất bằng successive halving, warm start từ params của lần train trước.
+    Dữ liệu gần như không đổi so với lần trước (drift < TUNE_DRIFT_THRESHOLD) → bỏ qua tuning, dùng lại params.
+    """
+    print("\n[2/5] Hyperparameter tuning (successive halving)...")
+    start = time.perf_counter()
+    previous_report = previous_report or {}
+    previous_params = previous_report.get("best_params")
+
+    # Drift tính so với dữ liệu lúc tune gần nhất (không phải lần train gần nhất) → thay đổi nhỏ mỗi đêm
+    # cộng dồn đủ ngưỡng vẫn kích hoạt tune lại
+    current_stats = compute_data_stats(df)
+    reference_stats = (previous_report.get("tuning") or {}).get("tuned_data_stats") or previous_report.get("data_stats")
+    drift = None
+    if reference_stats:
+        drift = data_drift(current_stats, reference_stats)
+        print(f"   📈 Data drift since last tuning: {drift:.2%}")
+    if not TUNE_FORCE and previous_params and drift is not None and drift < TUNE_DRIFT_THRESHOLD:
+        print(f"   ⏭️ Drift < {TUNE_DRIFT_THRESHOLD:.0%} → reuse previous params: {previous_params}")
+        return previous_params, {"mode": "skipped", "drift": drift, "duration_s": 0.0,
+                                 "tuned_data_stats": reference_stats}
+
+    candidates = _candidate_params(previous_params)
+    print(f"   🔍 Successive halving over {len(candidates)} configs (eta={TUNE_ETA})...")
+    best_params, best_rmse, best_mae, rungs = successive_halving(df, candidates)
+
     print(f"\n   🏆 Best RMSE: {best_rmse:.4f}")
-    print(f"      Params: {best_params_rmse}")
-    print(f"   🏆 Best MAE:  {best_mae:.4f}")
-    print(f"      Params: {best_params_mae}")
-    
-    # Show top 5 configurations
-    results_df = pd.DataFrame.from_dict(gs.cv_results)
-    results_df = results_df.sort_values('mean_test_rmse').head(5)
-    print("\n   📊 Top 5 configurations:")
-    for i, row in results_df.iterrows():
-        print(f"      RMSE={row['mean_test_rmse']:.4f} | MAE={row['mean_test_mae']:.4f} | "
-              f"n_factors={row['param_n_factors']} | epochs={row['param_n_epochs']} | "
-              f"lr={row['param_lr_all']} | reg={row['param_reg_all']}")
-    
-    return best_params_rmse, best_rmse, best_mae
+    print(f"      Params: {best_params}")
+    return best_params, {
+        "mode": "successive_halving",
+        "drift": drift,
+        "warm_start": previous_params,
+        "rungs": rungs,
+        "duration_s": round(time.perf_counter() - start, 1),
+        "tuned_data_stats": current_stats,
+    }
 
 # ---------------------------------------------------------
 # 3. TRAIN FINAL MODEL
@@ -187,33 +289,206 @@ def train_final_model(df, best_params):
     
     return algo_optimized, algo_baseline
 
+# ---------------------------------------------------------
+# 3b. INCREMENTAL (warm start từ model trước)
+# ---------------------------------------------------------
+def load_previous_model():
+    version = model_store.target_version()
+    if version is None:
+        return None
+    try:
+        return model_store.load_model(version)
+    except Exception as e:
+        print(f"   ⚠️ Cannot load previous model: {e}")
+        return None
+
+def choose_training_mode(previous_report, previous_model, best_params, new_share):
+    """'full' hoặc 'incremental' + lý do."""
+    if TRAIN_MODE == "full":
+        return "full", "TRAIN_MODE=full"
+    if previous_model is None or getattr(previous_model, "trainset", None) is None:
+        return "full", "no previous model"
+    if TRAIN_MODE != "incremental":
+        if best_params != previous_report.get("best_params"):
+            return "full", "hyperparameters changed"
+        last_full = (previous_report.get("training") or {}).get("last_full_at") or previous_report.get("timestamp")
+        if not last_full or (datetime.now() - datetime.fromisoformat(last_full)).total_seconds() > FULL_RETRAIN_DAYS * 86400:
+            return "full", f"last full retrain older than {FULL_RETRAIN_DAYS:g} days"
+        if new_share > INCREMENTAL_MAX_NEW_SHARE:
+            return "full", f"{new_share:.0%} of ratings are new"
+    return "incremental", f"{new_share:.0%} of ratings are new"
+
+def new_rating_mask(df, previous_model):
+    """Rating (user, hotel) chưa có trong trainset của model trước hoặc đã đổi điểm."""
+    trainset = previous_model.trainset
+    old = {}
+    for u, ratings in trainset.ur.items():
+        raw_u = trainset.to_raw_uid(u)
+        for i, r in ratings:
+            old[(raw_u, trainset.to_raw_iid(i))] = r
+    return np.array([old.get((u, h)) != r for u, h, r in df[['userId', 'hotelId', 'score']].itertuples(index=False)])
+
+def warm_start_svd(trainset, previous_model):
+    """SVD trên trainset mới, factor lấy từ model trước; user / hotel mới khởi tạo như SVD.fit."""
+    n_factors = previous_model.n_factors
+    rng = np.random.RandomState(getattr(previous_model, "random_state", None) or 42)
+    init_mean, init_std = previous_model.init_mean, previous_model.init_std_dev
+
+    algo = SVD(n_factors=n_factors, n_epochs=INCREMENTAL_EPOCHS, biased=previous_model.biased,
+               init_mean=init_mean, init_std_dev=init_std,
+               lr_bu=previous_model.lr_bu, lr_bi=previous_model.lr_bi,
+               lr_pu=previous_model.lr_pu, lr_qi=previous_model.lr_qi,
+               reg_bu=previous_model.reg_bu, reg_bi=previous_model.reg_bi,
+               reg_pu=previous_model.reg_pu, reg_qi=previous_model.reg_qi, random_state=42)
+    algo.trainset = trainset
+    algo.pu = rng.normal(init_mean, init_std, (trainset.n_users, n_factors))
+    algo.qi = rng.normal(init_mean, init_std, (trainset.n_items, n_factors))
+    algo.bu = np.zeros(trainset.n_users)
+    algo.bi = np.zeros(trainset.n_items)
+
+    old = previous_model.trainset
+    users = [(u, old._raw2inner_id_users[trainset.to_raw_uid(u)]) for u in trainset.all_users()
+             if trainset.to_raw_uid(u) in old._raw2inner_id_users]
+    items = [(i, old._raw2inner_id_items[trainset.to_raw_iid(i)]) for i in trainset.all_items()
+             if trainset.to_raw_iid(i) in old._raw2inner_id_items]
+    if users:
+        new, prev = map(list, zip(*users))
+        algo.pu[new] = previous_model.pu[prev]
+        algo.bu[new] = previous_model.bu[prev]
+    if items:
+        new, prev = map(list, zip(*items))
+        algo.qi[new] = previous_model.qi[prev]
+        algo.bi[new] = previous_model.bi[prev]
+    return algo, len(users), len(items)
+
+def sgd_epochs(algo, users, items, ratings, epochs, seed=42):
+    """
+    SGD giống SVD.fit (cùng lr / reg từng tham số) nhưng theo mini-batch vectorized,
+    chỉ trên các rating được đưa vào (inner ids).
+    """
+    rng = np.random.RandomState(seed)
+    mu = algo.trainset.global_mean
+    for _ in range(epochs):
+        order = rng.permutation(len(ratings))
+        for lo in range(0, len(order), INCREMENTAL_BATCH):
+            b = order[lo:lo + INCREMENTAL_BATCH]
+            u, i, r = users[b], items[b], ratings[b]
+            pu, qi = algo.pu[u], algo.qi[i]
+            est = np.einsum("ij,ij->i", pu, qi)
+            if algo.biased:
+                est += mu + algo.bu[u] + algo.bi[i]
+            err = r - est
+            if algo.biased:
+                np.add.at(algo.bu, u, algo.lr_bu * (err - algo.reg_bu * algo.bu[u]))
+                np.add.at(algo.bi, i, algo.lr_bi * (err - algo.reg_bi * algo.bi[i]))
+            np.add.at(algo.pu, u, algo.lr_pu * (err[:, None] * qi - algo.reg_pu * pu))
+            np.add.at(algo.qi, i, algo.lr_qi * (err[:, None] * pu - algo.reg_qi * qi))
+
+def _rmse(algo, users, items, ratings):
+    if len(ratings) == 0:
+        return None
+    est = np.einsum("ij,ij->i", algo.pu[users], algo.qi[items])
+    if algo.biased:
+        est += algo.trainset.global_mean + algo.bu[users] + algo.bi[items]
+    lower, upper = algo.trainset.rating_scale
+    return float(np.sqrt(np.mean((ratings - np.clip(est, lower, upper)) ** 2)))
+
+def train_incremental(df, previous_model, new_mask):
+    """
+    Warm start từ model trước → SGD INCREMENTAL_EPOCHS epoch trên rating mới + mẫu replay rating cũ.
+    Đánh giá: model trước vs model incremental (train KHÔNG có holdout) trên holdout của rating mới.
+    Trả về (algo, eval_results, info).
+    """
+    print("\n[3/5] Incremental SVD training (warm start from previous model)...")
+    reader = Reader(rating_scale=(1, 5))
+    trainset = Dataset.load_from_df(df[['userId', 'hotelId', 'score']], reader).build_full_trainset()
+    users = np.array([trainset.to_inner_uid(u) for u in df['userId']], dtype=np.int64)
+    items = np.array([trainset.to_inner_iid(h) for h in df['hotelId']], dtype=np.int64)
+    ratings = df['score'].to_numpy(dtype=np.float64)
+
+    rng = np.random.RandomState(42)
+    new_rows = np.nonzero(new_mask)[0]
+    old_rows = np.nonzero(~new_mask)[0]
+    n_replay = min(len(old_rows), int(len(new_rows) * INCREMENTAL_REPLAY_RATIO))
+    replay_rows = rng.choice(old_rows, n_replay, replace=False) if n_replay else old_rows[:0]
+    shuffled_new = rng.permutation(new_rows)
+    n_holdout = int(len(shuffled_new) * INCREMENTAL_HOLDOUT)
+    holdout, fit_new = shuffled_new[:n_holdout], shuffled_new[n_holdout:]
+
+    def fit(rows):
+        algo, kept_users, kept_items = warm_start_svd(trainset, previous_model)
+        sgd_epochs(algo, users[rows], items[rows], ratings[rows], INCREMENTAL_EPOCHS)
+        return algo, kept_users, kept_items
+
+    # 1) Đánh giá: model trước (chỉ warm start, không SGD) vs incremental không thấy holdout
+    h = (users[holdout], items[holdout], ratings[holdout])
+    previous_rmse = _rmse(warm_start_svd(trainset, previous_model)[0], *h)
+    probe_rmse = _rmse(fit(np.concatenate([fit_new, replay_rows]))[0], *h)
+
+    # 2) Model cuối: toàn bộ rating mới + replay
+    algo, kept_users, kept_items = fit(np.concatenate([new_rows, replay_rows]))
+    print(f"   ✅ Incremental SVD: {len(new_rows)} new + {n_replay} replay ratings × {INCREMENTAL_EPOCHS} epochs "
+          f"(kept {kept_users}/{trainset.n_users} users, {kept_items}/{trainset.n_items} hotels)")
+
+    eval_results = None
+    if probe_rmse is not None:
+        print(f"   📊 Holdout of new ratings: previous model RMSE={previous_rmse:.4f} → incremental RMSE={probe_rmse:.4f}")
+        eval_results = {
+            "method": "incremental_holdout",
+            "holdout_ratings": int(n_holdout),
+            "optimized_rmse": probe_rmse,
+            "baseline_rmse": previous_rmse,
+            "rmse_improvement_pct": (previous_rmse - probe_rmse) / previous_rmse * 100 if previous_rmse else 0.0,
+        }
+    info = {
+        "new_ratings": int(len(new_rows)),
+        "replay_ratings": int(n_replay),
+        "epochs": INCREMENTAL_EPOCHS,
+        "kept_users": kept_users,
+        "kept_hotels": kept_items,
+    }
+    return algo, eval_results, info
+
 # ---------------------------------------------------------
 # 4. EVALUATE (Cross-validation)
 # ---------------------------------------------------------
-def evaluate_models(df, algo_optimized, algo_baseline, best_params):
+def evaluate_models(df, algo_optimized, algo_baseline, best_params, tuning=None, previous_eval=None):
     """
     Run cross-validation on both models to compare.
+    Optimized: dùng lại CV của rung cuối successive halving (cùng params, cùng dữ liệu) nếu tuning vừa chạy đủ.
+    Baseline: dùng lại số đo của lần trước nếu dữ liệu (hash) và số fold không đổi.
+    CV dùng KFold seed cố định → baseline và optimized chấm trên cùng các fold.
     """
     print("\n[4/5] Evaluating models (cross-validation)...")
     
     reader = Reader(rating_scale=(1, 5))
     data = Dataset.load_from_df(df[['userId', 'hotelId', 'score']], reader)
-    
-    # Cross-validate optimized
-    cv_optimized = cross_validate(algo_optimized, data, measures=['rmse', 'mae'], cv=5, verbose=False)
+    data_hash = _data_hash(df)
+    
+    # Cross-validate optimized (bản sao chưa fit: cross_validate fit lại algo trên từng fold
+    # → không được ghi đè model cuối train trên toàn bộ dữ liệu)
+    final_rung = ((tuning or {}).get("rungs") or [{}])[-1]
+    if final_rung.get("cv") and final_rung.get("best_mae") is not None and final_rung.get("best_params") == best_params:
+        folds = final_rung["cv"]
+        opt_rmse, opt_mae = final_rung["best_rmse"], final_rung["best_mae"]
+        print(f"   ♻️ Optimized: reuse {folds}-fold CV from tuning")
+    else:
+        folds = EVAL_CV_FOLDS
+        opt_rmse, opt_mae = _cv_scores(best_params, data, folds)
     
     # Cross-validate baseline
-    cv_baseline = cross_validate(algo_baseline, data, measures=['rmse', 'mae'], cv=5, verbose=False)
-    
-    opt_rmse = np.mean(cv_optimized['test_rmse'])
-    opt_mae = np.mean(cv_optimized['test_mae'])
-    base_rmse = np.mean(cv_baseline['test_rmse'])
-    base_mae = np.mean(cv_baseline['test_mae'])
+    previous_eval = previous_eval or {}
+    if previous_eval.get("data_hash") == data_hash and previous_eval.get("cv_folds") == folds \
+            and previous_eval.get("baseline_rmse") is not None:
+        base_rmse, base_mae = previous_eval["baseline_rmse"], previous_eval["baseline_mae"]
+        print(f"   ♻️ Baseline: data unchanged → reuse previous {folds}-fold CV")
+    else:
+        base_rmse, base_mae = _cv_scores({}, data, folds)
     
     rmse_improvement = (base_rmse - opt_rmse) / base_rmse * 100
     mae_improvement = (base_mae - opt_mae) / base_mae * 100
     
-    print(f"\n   📊 5-Fold Cross-Validation Results:")
+    print(f"\n   📊 {folds}-Fold Cross-Validation Results:")
     print(f"   ┌─────────────────────────────────────────────────┐")
     print(f"   │ Model              │ RMSE     │ MAE      │")
     print(f"   ├─────────────────────────────────────────────────┤")
@@ -228,13 +503,15 @@ def evaluate_models(df, algo_optimized, algo_baseline, best_params):
         "baseline_rmse": base_rmse,
         "baseline_mae": base_mae,
         "rmse_improvement_pct": rmse_improvement,
-        "mae_improvement_pct": mae_improvement
+        "mae_improvement_pct": mae_improvement,
+        "cv_folds": folds,
+        "data_hash": data_hash,
     }
 
 # ---------------------------------------------------------
 # 5. SAVE
 # ---------------------------------------------------------
-def save_model_and_report(algo_optimized, best_params, eval_results, df):
+def save_model_and_report(algo_optimized, best_params, eval_results, df, tuning=None, training=None):
     """
     Save trained model and training report.
     """
@@ -248,16 +525,11 @@ def save_model_and_report(algo_optimized, best_params, eval_results, df):
     # Save report
     report = {
         "timestamp": datetime.now().isoformat(),
-        "model_type": "SVD (Optimized)",
+        "model_type": "SVD (Optimized)" if not training or training.get("mode") != "incremental" else "SVD (Incremental)",
         "best_params": best_params,
-        "data_stats": {
-            "total_ratings": len(df),
-            "unique_users": df['userId'].nunique(),
-            "unique_hotels": df['hotelId'].nunique(),
-            "score_distribution": {
-                str(k): int(v) for k, v in df['score'].round(0).value_counts().sort_index().items()
-            }
-        },
+        "data_stats": compute_data_stats(df),
+        "tuning": tuning,
+        "training": training,
         "evaluation": eval_results
     }
     
@@ -280,16 +552,32 @@ def main():
         return
     
     # 2. Tune hyperparameters
-    best_params, best_cv_rmse, best_cv_mae = tune_hyperparameters(df)
-    
-    # 3. Train final model
-    algo_optimized, algo_baseline = train_final_model(df, best_params)
-    
-    # 4. Evaluate
-    eval_results = evaluate_models(df, algo_optimized, algo_baseline, best_params)
+    previous_report = load_previous_report()
+    best_params, tuning = tune_hyperparameters(df, previous_report)
+    
+    # 3. Train final model: incremental từ model trước, full retrain mỗi FULL_RETRAIN_DAYS
+    previous_model = load_previous_model() if TRAIN_MODE != "full" else None
+    new_mask = new_rating_mask(df, previous_model) if previous_model is not None else np.ones(len(df), dtype=bool)
+    mode, reason = choose_training_mode(previous_report, previous_model, best_params, float(new_mask.mean()))
+    print(f"\n   🧭 Training mode: {mode} ({reason})")
+
+    if mode == "incremental":
+        algo_optimized, eval_results, training = train_incremental(df, previous_model, new_mask)
+        if eval_results is None:
+            # Không có rating mới → dữ liệu như lần trước, giữ số đo cũ
+            eval_results = previous_report.get("evaluation")
+        training["last_full_at"] = ((previous_report.get("training") or {}).get("last_full_at")
+                                    or previous_report.get("timestamp"))
+    else:
+        algo_optimized, algo_baseline = train_final_model(df, best_params)
+        # 4. Evaluate
+        eval_results = evaluate_models(df, algo_optimized, algo_baseline, best_params, tuning,
+                                       previous_report.get("evaluation"))
+        training = {"last_full_at": datetime.now().isoformat()}
+    training.update({"mode": mode, "reason": reason})
     
     # 5. Save
-    save_model_and_report(algo_optimized, best_params, eval_results, df)
+    save_model_and_report(algo_optimized, best_params, eval_results, df, tuning, training)
     
     print("\n" + "=" * 60)
     print("✅ SVD TRAINING COMPLETED")
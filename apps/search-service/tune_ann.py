@@ -0,0 +1,72 @@
+# tune_ann.py
+# Đo recall@10 và latency của ANN index so với exact scan để chọn nprobe / ef
+# Usage:
+#   uv run tune_ann.py --backend ivf
+#   uv run tune_ann.py --backend hnsw --field policies --queries 500
+
+import time
+import argparse
+import numpy as np
+from src.search import GalleryIndex
+from src.vector_store import load_vector_store, STORE_DIR
+from src.ann_index import IVFFlatIndex, HNSWIndex, recall_at_k
+
+IVF_NPROBE_GRID = [1, 2, 4, 8, 16, 32, 64]
+HNSW_EF_GRID = [10, 16, 32, 64, 128, 256]
+
+
+def make_queries(exact: GalleryIndex, n_queries, noise, seed=42):
+    """Query giả lập = vector trong gallery + nhiễu Gaussian (gần với ảnh chụp lại cùng chỗ nghỉ)."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(exact), size=min(n_queries, len(exact)), replace=False)
+    base = np.asarray(exact.matrix[rows], dtype=np.float32)
+    return base + rng.normal(0, noise, size=base.shape).astype(np.float32)
+
+
+def avg_latency_ms(index, queries, k):
+    start = time.perf_counter()
+    for q in queries:
+        index.search_rows(q, k)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune ANN index recall/latency")
+    parser.add_argument("--backend", default="ivf", choices=["ivf", "hnsw"])
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--field", default="image")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    store = load_vector_store(args.store)
+    if store is None or not store.has_field(args.field):
+        print(f"❌ Không có field '{args.field}' trong store {args.store}. Chạy convert_vectors.py trước.")
+        return
+
+    exact = GalleryIndex.from_store(store, args.field)
+    queries = make_queries(exact, args.queries, args.noise)
+    print(f"📐 Gallery: {len(exact)} vectors | {len(queries)} queries | k={args.k}")
+
+    exact_ms = avg_latency_ms(exact, queries, args.k)
+    print(f"   Exact scan: {exact_ms:.3f} ms/query")
+
+    if args.backend == "ivf":
+        index = IVFFlatIndex.build(exact)
+        print(f"   IVF nlist={index.nlist}")
+        knob, grid = "nprobe", [p for p in IVF_NPROBE_GRID if p <= index.nlist]
+    else:
+        index = HNSWIndex.build(exact)
+        knob, grid = "ef", HNSW_EF_GRID
+
+    print(f"\n   {knob:>8} | recall@{args.k} | ms/query")
+    for value in grid:
+        setattr(index, knob, value)
+        recall = recall_at_k(index, exact, queries, k=args.k)
+        ms = avg_latency_ms(index, queries, args.k)
+        print(f"   {value:>8} | {recall:9.4f} | {ms:.3f}")
+
+
+if __name__ == "__main__":
+    main()